@@ -6,7 +6,8 @@ Should be used in replay and undo features.
 
 from dataclasses import dataclass, field
 from layer_util import Layer
-from grid import Grid
+from grid import Grid, SpecialCheckpoint
+from brush import BrushStencil
 
 @dataclass
 class PaintStep:
@@ -28,20 +29,72 @@ class PaintAction:
 
     steps: list[PaintStep] = field(default_factory=list)
     is_special: bool = False
+    # The brush stamps (stencil, x, y) that painted the steps, in order, if known.
+    # Only a hint for compact encoding (see action_codec): the steps are what gets applied.
+    stamps: list[tuple[BrushStencil, int, int]] = field(default_factory=list, compare=False, repr=False)
+    # For a special, the squares it changed when last applied, so it can be undone exactly
+    # (and redone) without going through the whole grid again. See Grid.restore_special.
+    checkpoint: SpecialCheckpoint|None = field(default=None, compare=False, repr=False)
 
     def undo_apply(self, grid: Grid):
         if self.is_special:
-            grid.special()
+            # Another special is no inverse, so a special can only be undone from its checkpoint.
+            if self.checkpoint is None:
+                raise ValueError("A special can only be undone once applied (or given its checkpoint)")
+            grid.restore_special(self.checkpoint, undo=True)
             return
         for step in self.steps:
             step.undo_apply(grid)
 
     def redo_apply(self, grid: Grid):
         if self.is_special:
-            grid.special()
+            if self.checkpoint is None:
+                self.checkpoint = grid.special()
+            else:
+                grid.restore_special(self.checkpoint, undo=False)
             return
         for step in self.steps:
             step.redo_apply(grid)
 
     def add_step(self, step: PaintStep):
         self.steps.append(step)
+
+    def __getstate__(self) -> dict:
+        # Checkpoints only apply to the grid they were taken from, and can be taken again: don't save them.
+        return {**self.__dict__, "checkpoint": None}
+
+
+@dataclass
+class PaintStroke:
+    """
+    A whole mouse drag (press to release), accumulated into a single PaintAction.
+
+    Touched squares are remembered in a bitmap, so each square is painted
+    (and recorded as a step) at most once per stroke, no matter how many
+    overlapping brush stamps land on it.
+    """
+
+    layer: Layer
+    width: int
+    height: int
+    action: PaintAction = field(default_factory=PaintAction)
+    touched: bytearray = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.touched = bytearray((self.width * self.height + 7) // 8)
+
+    def touch(self, x: int, y: int) -> bool:
+        """
+        Mark a square as painted by this stroke.
+        Returns true if the square had not been touched yet (and records the step).
+        """
+        bit = x * self.height + y
+        mask = 1 << (bit & 7)
+        if self.touched[bit >> 3] & mask:
+            return False
+        self.touched[bit >> 3] |= mask
+        self.action.add_step(PaintStep((x, y), self.layer))
+        return True
+
+    def is_empty(self) -> bool:
+        return len(self.action.steps) == 0
@@ -0,0 +1,369 @@
+"""
+Compact coding of PaintAction streams.
+
+Brush actions are very repetitive: the same stencil of squares, in the same
+layer, shifted a little from one action to the next. Each action is coded as:
+
+    flags (undo, special, which sections follow, ...)
+    time since the previous action, in microseconds
+    stamps: the brush stamps that painted it, if the action says so (see
+        PaintAction.stamps), as a stencil id and then the move of the centre
+        from each stamp to the next; a move to a neighbouring square (as
+        strokes do) takes one byte. The decoder stamps the stencil again,
+        skipping squares already painted, exactly as a stroke does.
+    runs: any remaining steps, as runs of vertically adjacent squares, each
+        relative to the last. A run pattern seen before is coded as its id.
+
+All numbers are zigzag varints, so small offsets take a single byte. Stencils
+and run patterns are remembered in dictionaries that grow with the stream.
+The encoder and decoder keep the same state, so a stream must be decoded from
+where the encoder was last reset.
+
+The coded bytes are then compressed: journals use zlib, sync-flushed after
+every action so each record can be written (and read back) as it happens,
+while pack_actions compresses a whole stream with zlib or lzma.
+"""
+
+from __future__ import annotations
+import lzma
+import zlib
+
+from action import PaintAction, PaintStep
+from brush import BRUSH_SHAPES, BrushStencil, get_stencil
+from layer_util import get_layers
+
+FLAG_UNDO = 1
+FLAG_SPECIAL = 2
+FLAG_STAMPS = 4
+FLAG_RUNS = 8
+FLAG_SHAPE = 16
+FLAG_MIXED = 32
+
+# Run patterns remembered between resets; later new patterns are coded in full every time.
+MAX_SHAPES = 4096
+
+PACK_ZLIB = b"Z"
+PACK_LZMA = b"X"
+PACK_CODECS = {
+    "zlib": PACK_ZLIB,
+    "lzma": PACK_LZMA,
+}
+
+
+def write_varint(out: bytearray, value: int) -> None:
+    """Append a non-negative int as a little-endian base 128 varint."""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def write_signed(out: bytearray, value: int) -> None:
+    """Append an int as a zigzag varint, so small negative values are small too."""
+    write_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+
+
+class _Reader:
+
+    def __init__(self, data) -> None:
+        self.data = data
+        self.pos = 0
+
+    def byte(self) -> int:
+        self.pos += 1
+        return self.data[self.pos - 1]
+
+    def varint(self) -> int:
+        value = 0
+        shift = 0
+        while True:
+            b = self.data[self.pos]
+            self.pos += 1
+            value |= (b & 0x7F) << shift
+            if b < 0x80:
+                return value
+            shift += 7
+
+    def signed(self) -> int:
+        value = self.varint()
+        return value >> 1 if value % 2 == 0 else -(value >> 1) - 1
+
+    def move(self) -> tuple[int, int]:
+        code = self.byte()
+        if code == 9:
+            return self.signed(), self.signed()
+        return code // 3 - 1, code % 3 - 1
+
+
+def write_move(out: bytearray, dx: int, dy: int) -> None:
+    """Append a move between stamp centres: one byte for a move to a neighbouring square (or none)."""
+    if -1 <= dx <= 1 and -1 <= dy <= 1:
+        out.append((dx + 1) * 3 + dy + 1)
+    else:
+        out.append(9)
+        write_signed(out, dx)
+        write_signed(out, dy)
+
+
+def _runs(steps: list[PaintStep]) -> list[list[int]]:
+    """Steps as runs [x, y, length, layer index] of vertically adjacent squares."""
+    runs = []
+    for step in steps:
+        x, y = step.affected_grid_square
+        layer = step.affected_layer.index
+        if runs:
+            last = runs[-1]
+            if last[0] == x and last[1] + last[2] == y and last[3] == layer:
+                last[2] += 1
+                continue
+        runs.append([x, y, 1, layer])
+    return runs
+
+
+class ActionEncoder:
+    """Codes actions one at a time, each relative to the ones before it since the last reset."""
+
+    def __init__(self, width: int, height: int) -> None:
+        """width and height are those of the grid, which clips brush stamps."""
+        self.width = width
+        self.height = height
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all state, so the next action can be decoded on its own."""
+        self.stencils: dict[BrushStencil, int] = {}
+        self.shapes: dict[tuple, int] = {}
+        self.centre = (0, 0)
+        self.anchor = (0, 0)
+        self.time_us = 0
+
+    def _stamped(self, action: PaintAction) -> tuple[list[tuple[BrushStencil, int, int]], int]:
+        """
+        The stamps of the action that paint a prefix of its steps (each painting at least one new square),
+        and the number of steps they paint.
+        Stamps are only a hint, so we stop at the first one that does not match the steps,
+        or that uses a different stencil (changing brushes part way through a stroke is rare).
+        """
+        stamps = []
+        steps = action.steps
+        layer = steps[0].affected_layer
+        painted = set()
+        i = 0
+        for stencil, px, py in action.stamps:
+            if stencil is not action.stamps[0][0]:
+                break
+            new = [cell for cell in stencil.cells(px, py, self.width, self.height) if cell not in painted]
+            if not new:
+                continue
+            if i + len(new) > len(steps) or any(
+                steps[i + j].affected_grid_square != cell or steps[i + j].affected_layer is not layer
+                for j, cell in enumerate(new)
+            ):
+                break
+            painted.update(new)
+            stamps.append((stencil, px, py))
+            i += len(new)
+        return stamps, i
+
+    def encode(self, action: PaintAction, is_undo: bool = False, timestamp: float = 0) -> bytes:
+        """Code an action. Timestamps are kept to the microsecond."""
+        flags = (FLAG_UNDO if is_undo else 0) | (FLAG_SPECIAL if action.is_special else 0)
+        time_us = round(timestamp * 1_000_000)
+        body = bytearray()
+
+        stamps, stamped = self._stamped(action) if action.steps and action.stamps else ([], 0)
+        if stamps:
+            flags |= FLAG_STAMPS
+            body.append(action.steps[0].affected_layer.index)
+            stencil = stamps[0][0]
+            stencil_id = self.stencils.get(stencil)
+            if stencil_id is None:
+                # A new stencil is introduced by the next free id, followed by what it is.
+                stencil_id = self.stencils[stencil] = len(self.stencils)
+                write_varint(body, stencil_id)
+                body.append(BRUSH_SHAPES.index(stencil.shape))
+                write_varint(body, stencil.size)
+            else:
+                write_varint(body, stencil_id)
+            write_varint(body, len(stamps))
+            for _, px, py in stamps:
+                write_move(body, px - self.centre[0], py - self.centre[1])
+                self.centre = (px, py)
+
+        runs = _runs(action.steps[stamped:])
+        if runs:
+            flags |= FLAG_RUNS
+            ax, ay = runs[0][0], runs[0][1]
+            mixed = any(run[3] != runs[0][3] for run in runs)
+            # Runs relative to the previous run, and (if they mix) with their layers.
+            shape = []
+            px, py = ax, ay
+            for x, y, length, layer in runs:
+                shape.append((x - px, y - py, length, layer if mixed else -1))
+                px, py = x, y
+            shape = tuple(shape)
+            shape_id = self.shapes.get(shape)
+            flags |= (FLAG_MIXED if mixed else 0) | (FLAG_SHAPE if shape_id is not None else 0)
+
+            write_signed(body, ax - self.anchor[0])
+            write_signed(body, ay - self.anchor[1])
+            self.anchor = (ax, ay)
+            if not mixed:
+                body.append(runs[0][3])
+            if shape_id is not None:
+                write_varint(body, shape_id)
+            else:
+                write_varint(body, len(shape))
+                for dx, dy, length, layer in shape:
+                    write_signed(body, dx)
+                    write_signed(body, dy)
+                    write_varint(body, length - 1)
+                    if mixed:
+                        body.append(layer)
+                if len(self.shapes) < MAX_SHAPES:
+                    self.shapes[shape] = len(self.shapes)
+
+        out = bytearray((flags,))
+        write_signed(out, time_us - self.time_us)
+        self.time_us = time_us
+        return bytes(out + body)
+
+
+class ActionDecoder:
+    """Decodes what an ActionEncoder coded, in the same order and with resets in the same places."""
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        self.layers = get_layers()
+        self.reset()
+
+    def reset(self) -> None:
+        self.stencils: list[BrushStencil] = []
+        self.shapes: list[tuple] = []
+        self.centre = (0, 0)
+        self.anchor = (0, 0)
+        self.time_us = 0
+
+    def decode(self, data) -> tuple[PaintAction, bool, float]:
+        """
+        Decode one coded action into (action, is_undo, timestamp).
+        The action's stamps are those it was coded with, so coding it again gives the same bytes.
+        """
+        reader = _Reader(data)
+        flags = reader.byte()
+        self.time_us += reader.signed()
+        action = PaintAction([], bool(flags & FLAG_SPECIAL))
+        steps = action.steps
+        layers = self.layers
+
+        if flags & FLAG_STAMPS:
+            layer = layers[reader.byte()]
+            stencil_id = reader.varint()
+            if stencil_id == len(self.stencils):
+                shape = BRUSH_SHAPES[reader.byte()]
+                self.stencils.append(get_stencil(shape, reader.varint()))
+            stencil = self.stencils[stencil_id]
+            painted = set()
+            for _ in range(reader.varint()):
+                dx, dy = reader.move()
+                px = self.centre[0] + dx
+                py = self.centre[1] + dy
+                self.centre = (px, py)
+                action.stamps.append((stencil, px, py))
+                for cell in stencil.cells(px, py, self.width, self.height):
+                    if cell not in painted:
+                        painted.add(cell)
+                        steps.append(PaintStep(cell, layer))
+
+        if flags & FLAG_RUNS:
+            ax = self.anchor[0] + reader.signed()
+            ay = self.anchor[1] + reader.signed()
+            self.anchor = (ax, ay)
+            mixed = flags & FLAG_MIXED
+            layer_index = -1 if mixed else reader.byte()
+            if flags & FLAG_SHAPE:
+                shape = self.shapes[reader.varint()]
+            else:
+                shape = []
+                for _ in range(reader.varint()):
+                    dx = reader.signed()
+                    dy = reader.signed()
+                    length = reader.varint() + 1
+                    shape.append((dx, dy, length, reader.byte() if mixed else -1))
+                shape = tuple(shape)
+                if len(self.shapes) < MAX_SHAPES:
+                    self.shapes.append(shape)
+            x, y = ax, ay
+            for dx, dy, length, run_layer in shape:
+                x += dx
+                y += dy
+                layer = layers[run_layer if mixed else layer_index]
+                for i in range(length):
+                    steps.append(PaintStep((x, y + i), layer))
+
+        return action, bool(flags & FLAG_UNDO), self.time_us / 1_000_000
+
+
+def pack_actions(actions, width: int, height: int, codec: str = "lzma") -> bytes:
+    """
+    Code and compress a whole stream of (action, is_undo) or (action, is_undo, timestamp) tuples
+    painted on a width x height grid, e.g. a replay or undo history to store.
+
+    Raises:
+    - ValueError: if codec is not one of PACK_CODECS.
+    """
+    if codec not in PACK_CODECS:
+        raise ValueError(f"Invalid codec {codec!r}, must be one of {tuple(PACK_CODECS)}")
+    compressor = zlib.compressobj(9) if codec == "zlib" else lzma.LZMACompressor(preset=9)
+    encoder = ActionEncoder(width, height)
+    header = bytearray(PACK_CODECS[codec])
+    write_varint(header, width)
+    write_varint(header, height)
+    parts = [bytes(header)]
+    for entry in actions:
+        coded = encoder.encode(*entry)
+        prefix = bytearray()
+        write_varint(prefix, len(coded))
+        parts.append(compressor.compress(bytes(prefix) + coded))
+    parts.append(compressor.flush())
+    return b"".join(parts)
+
+
+def unpack_actions(data, chunk_size: int = 1 << 16):
+    """
+    Yield the (action, is_undo, timestamp) of a packed stream, decompressing it a chunk at a time,
+    so a long stream is never held in memory decompressed.
+
+    Raises:
+    - ValueError: if data was not made by pack_actions, or is cut short.
+    """
+    codec = bytes(data[:1])
+    if codec == PACK_ZLIB:
+        decompressor = zlib.decompressobj()
+    elif codec == PACK_LZMA:
+        decompressor = lzma.LZMADecompressor()
+    else:
+        raise ValueError("Not a packed action stream")
+    header = _Reader(data)
+    header.pos = 1
+    decoder = ActionDecoder(header.varint(), header.varint())
+    pending = b""
+    for start in range(header.pos, len(data), chunk_size):
+        pending += decompressor.decompress(data[start:start + chunk_size])
+        reader = _Reader(pending)
+        while True:
+            begin = reader.pos
+            try:
+                length = reader.varint()
+            except IndexError:
+                reader.pos = begin
+                break
+            if reader.pos + length > len(pending):
+                reader.pos = begin
+                break
+            yield decoder.decode(pending[reader.pos:reader.pos + length])
+            reader.pos += length
+        pending = pending[reader.pos:]
+    if pending or not decompressor.eof:
+        raise ValueError("Packed action stream is cut short")
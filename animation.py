@@ -0,0 +1,345 @@
+"""
+Frame-differenced animated GIF and APNG writers.
+
+Between two frames of a replay, usually only a few squares change colour:
+the squares painted since the last frame (published by the grid's change
+bus), and
+the squares an animated layer (rainbow, sparkle) is applied to. FrameDiffer
+only recolours those, and reports the rectangle of pixels that actually
+changed; the writers then store just that rectangle, drawn over the previous
+frame, with the pixels in it that did not change left transparent. So the size of a file, and the time spent encoding it, follow the
+amount of change rather than the area of the canvas.
+
+APNG is written here directly. GIF frames are quantised and LZW-encoded by
+Pillow, each with its own (small) colour table.
+"""
+
+from __future__ import annotations
+import struct
+import zlib
+
+from change_bus import GridChanges
+from grid import Grid
+
+# As MyWindow.BG.
+BACKGROUND = (255, 255, 255)
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Width, height, bit depth, colour type, compression, filter and interlace methods.
+IHDR = struct.Struct(">IIBBBBB")
+PNG_RGBA = 6
+# Number of frames, number of plays (0 forever).
+ACTL = struct.Struct(">II")
+# Sequence number, width, height, x and y offsets, delay (numerator, denominator), dispose and blend ops.
+FCTL = struct.Struct(">IIIIIHHBB")
+APNG_DISPOSE_NONE = 0
+APNG_BLEND_SOURCE = 0
+APNG_BLEND_OVER = 1
+# Frames are small and written once, so favour speed a little over the last few bytes.
+ZLIB_LEVEL = 6
+# Leave the frame in place, for the next frame to be drawn over.
+GIF_DISPOSE_NONE = 1
+GIF_COLORS = 256
+
+
+class FrameDiffer:
+    """
+    The pixels of the canvas (one RGB triple per square, top row first, as render in export.py),
+    kept up to date frame by frame from the changes published by the grid (see change_bus.py).
+    """
+
+    def __init__(self, grid: Grid, background=BACKGROUND) -> None:
+        self.grid = grid
+        self.width = grid.x
+        self.height = grid.y
+        self.background = background
+        self.pixels = bytearray(grid.x * grid.y * 3)
+        # Squares an animated layer is applied to: these are recoloured every frame, changed or not
+        # (unless the timestamp is the same as the last frame's, as colours only change with it).
+        self.live: set[tuple[int, int]] = set()
+        self.timestamp: float|None = None
+        # The pixels (as indices into pixels) that changed in the last update.
+        self.changed: set[int] = set()
+        # How many squares had their colour worked out (with get_color) in the last update.
+        self.recoloured = 0
+        # The squares published as changed since the last update; everything until the first one.
+        self.dirty: set[tuple[int, int]] = set()
+        self.everything = True
+        self.started = False
+        grid.changes.subscribe(self.on_changes)
+
+    def on_changes(self, changes: GridChanges) -> None:
+        if changes.everything:
+            self.everything = True
+            self.dirty = set()
+        elif not self.everything:
+            self.dirty |= changes.squares
+
+    def close(self) -> None:
+        """Stop following the grid's changes."""
+        self.grid.changes.unsubscribe(self.on_changes)
+
+    def update(self, grid: Grid, timestamp: float) -> tuple[int, int, int, int] | None:
+        """
+        Bring the pixels up to date with the grid at timestamp, from the changes published since the last update
+        (so the grid's changes should be published first).
+        Returns the rectangle (left, top, right, bottom; right and bottom exclusive) of pixels that changed,
+        or None if nothing did. The first update draws, and returns, the whole canvas.
+
+        :complexity: O(d + a) squares recoloured, where d changed and a are animated (O(d) if timestamp
+            is the same as last update's); O(xy) for the first update, or after a change to every square.
+        """
+        if self.everything:
+            dirty = {(x, y) for x in range(self.width) for y in range(self.height)}
+        else:
+            dirty = self.dirty
+        self.dirty = set()
+        self.everything = False
+        for x, y in dirty:
+            if grid[x][y].is_animated():
+                self.live.add((x, y))
+            else:
+                self.live.discard((x, y))
+
+        self.changed = set()
+        left, top, right, bottom = self.width, self.height, 0, 0
+        recolour = dirty | self.live if timestamp != self.timestamp else dirty
+        self.timestamp = timestamp
+        self.recoloured = len(recolour)
+        for x, y in recolour:
+            color = bytes(grid[x][y].get_color(self.background, timestamp, x, y))
+            row = self.height - 1 - y
+            i = (row * self.width + x) * 3
+            if self.started and self.pixels[i:i + 3] == color:
+                continue
+            self.pixels[i:i + 3] = color
+            self.changed.add(i)
+            left, right = min(left, x), max(right, x + 1)
+            top, bottom = min(top, row), max(bottom, row + 1)
+
+        if not self.started:
+            self.started = True
+            return 0, 0, self.width, self.height
+        if left >= right:
+            return None
+        return left, top, right, bottom
+
+    def crop(self, rect: tuple[int, int, int, int]) -> bytes:
+        """
+        The pixels inside rect, row by row, as RGBA: the pixels that changed in the last update are opaque,
+        the others are left transparent (0, 0, 0, 0), to be drawn over the previous frame.
+        """
+        return crop(self.pixels, self.changed, self.width, rect)
+
+
+class PixelDiffer:
+    """
+    As FrameDiffer, for frames rendered elsewhere (see export.render): each update compares
+    the whole frame with the last one, rather than following the grid's changes.
+    """
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        self.pixels: bytes|None = None
+        self.changed: set[int] = set()
+
+    def update(self, pixels: bytes) -> tuple[int, int, int, int] | None:
+        """
+        Take the next frame's pixels (RGB, top row first). Returns the rectangle that changed,
+        as FrameDiffer.update: the whole canvas for the first frame, None if nothing changed.
+
+        :complexity: O(xy) to compare the rows (in C), plus O(w) for each row that changed, of width w.
+        """
+        row_size = self.width * 3
+        if self.pixels is None:
+            self.pixels = pixels
+            self.changed = set(range(0, len(pixels), 3))
+            return 0, 0, self.width, self.height
+        previous, self.pixels = self.pixels, pixels
+        self.changed = set()
+        left, top, right, bottom = self.width, self.height, 0, 0
+        for row in range(self.height):
+            start = row * row_size
+            if previous[start:start + row_size] == pixels[start:start + row_size]:
+                continue
+            for x in range(self.width):
+                i = start + x * 3
+                if previous[i:i + 3] != pixels[i:i + 3]:
+                    self.changed.add(i)
+                    left, right = min(left, x), max(right, x + 1)
+            top, bottom = min(top, row), row + 1
+        if left >= right:
+            return None
+        return left, top, right, bottom
+
+    def crop(self, rect: tuple[int, int, int, int]) -> bytes:
+        """As FrameDiffer.crop."""
+        return crop(self.pixels, self.changed, self.width, rect)
+
+
+def crop(pixels: bytes, changed: set[int], width: int, rect: tuple[int, int, int, int]) -> bytes:
+    """
+    The pixels (RGB, width wide) inside rect, row by row, as RGBA: those in changed (as indices into pixels)
+    are opaque, the others transparent (0, 0, 0, 0).
+    """
+    left, top, right, bottom = rect
+    out = bytearray((right - left) * (bottom - top) * 4)
+    j = 0
+    for row in range(top, bottom):
+        for i in range((row * width + left) * 3, (row * width + right) * 3, 3):
+            if i in changed:
+                out[j:j + 4] = pixels[i:i + 3] + b"\xff"
+            j += 4
+    return bytes(out)
+
+
+def scale_rows(pixels: bytes, width: int, height: int, scale: int, channels: int = 4) -> list[bytes]:
+    """The rows of an image scaled up (nearest neighbour) so that each pixel is scale x scale."""
+    rows = []
+    size = width * channels
+    for row in range(height):
+        line = pixels[row * size:(row + 1) * size]
+        if scale != 1:
+            line = b"".join(line[i:i + channels] * scale for i in range(0, size, channels))
+        rows.extend([line] * scale)
+    return rows
+
+
+class APNGWriter:
+    """
+    Writes an animated PNG of a canvas, frame by frame. Each frame is a rectangle of squares
+    blended over the previous frame, with every square scaled up to scale x scale pixels.
+    The number of frames has to be known up front (it is in the header).
+    """
+
+    def __init__(self, path: str, width: int, height: int, scale: int, frame_count: int, loop: int = 0) -> None:
+        self.file = open(path, "wb")
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.frame_count = frame_count
+        self.frames = 0
+        self.sequence = 0
+        self.file.write(PNG_SIGNATURE)
+        self._chunk(b"IHDR", IHDR.pack(width * scale, height * scale, 8, PNG_RGBA, 0, 0, 0))
+        self._chunk(b"acTL", ACTL.pack(frame_count, loop))
+
+    def _chunk(self, kind: bytes, data: bytes) -> None:
+        self.file.write(struct.pack(">I", len(data)) + kind + data)
+        self.file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+    def add_frame(self, rect: tuple[int, int, int, int], pixels: bytes, duration_ms: int) -> None:
+        """
+        Add a frame of RGBA pixels (as FrameDiffer.crop) covering rect (left, top, right, bottom) in squares,
+        shown for duration_ms.
+
+        :raises ValueError: if there are already frame_count frames, or the first frame is not the whole canvas.
+        """
+        if self.frames >= self.frame_count:
+            raise ValueError(f"the animation only has {self.frame_count} frames")
+        left, top, right, bottom = rect
+        if self.frames == 0 and rect != (0, 0, self.width, self.height):
+            # The first frame is also the still image, so it has to cover the whole canvas.
+            raise ValueError("the first frame must cover the whole canvas")
+        rows = scale_rows(pixels, right - left, bottom - top, self.scale)
+        self._chunk(b"fcTL", FCTL.pack(
+            self.sequence, (right - left) * self.scale, len(rows), left * self.scale, top * self.scale,
+            duration_ms, 1000, APNG_DISPOSE_NONE, APNG_BLEND_SOURCE if self.frames == 0 else APNG_BLEND_OVER,
+        ))
+        self.sequence += 1
+        # Every row with filter type 0 (none): frames are mostly runs of flat colour or transparency,
+        # which deflate handles well on its own.
+        data = zlib.compress(b"".join(b"\x00" + row for row in rows), ZLIB_LEVEL)
+        if self.frames == 0:
+            self._chunk(b"IDAT", data)
+        else:
+            self._chunk(b"fdAT", struct.pack(">I", self.sequence) + data)
+            self.sequence += 1
+        self.frames += 1
+
+    def close(self) -> None:
+        """
+        Finish the file.
+
+        :raises ValueError: if fewer than frame_count frames were added.
+        """
+        if self.file.closed:
+            return
+        if self.frames != self.frame_count:
+            self.file.close()
+            raise ValueError(f"{self.frames} frames were added, but the animation has {self.frame_count}")
+        self._chunk(b"IEND", b"")
+        self.file.close()
+
+    def __enter__(self) -> APNGWriter:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if exc[0] is None:
+            self.close()
+        else:
+            self.file.close()
+
+
+class GIFWriter:
+    """
+    Writes an animated GIF of a canvas, frame by frame, as APNGWriter.
+    Each frame has its own colour table of just the colours it uses, plus a transparent entry
+    (colours are quantised if there are more than 255).
+    """
+
+    def __init__(self, path: str, width: int, height: int, scale: int, frame_count: int = 0, loop: int = 0) -> None:
+        # frame_count is not needed in a GIF, it is taken to match APNGWriter.
+        self.file = open(path, "wb")
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.frames = 0
+        # Header, logical screen (no global colour table), then the looping extension.
+        self.file.write(b"GIF89a" + struct.pack("<HHBBB", width * scale, height * scale, 0, 0, 0))
+        self.file.write(b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\x00")
+
+    def add_frame(self, rect: tuple[int, int, int, int], pixels: bytes, duration_ms: int) -> None:
+        """
+        Add a frame of RGBA pixels (as FrameDiffer.crop) covering rect (left, top, right, bottom) in squares,
+        shown for duration_ms (rounded to hundredths of a second).
+        """
+        from PIL import GifImagePlugin, Image
+        left, top, right, bottom = rect
+        size = (right - left, bottom - top)
+        palette: dict[bytes, int] = {}
+        indices = bytearray(size[0] * size[1])
+        for k in range(len(indices)):
+            if pixels[k * 4 + 3]:
+                indices[k] = palette.setdefault(pixels[k * 4:k * 4 + 3], len(palette))
+        if len(palette) < GIF_COLORS:
+            transparent = len(palette)
+            colors = b"".join(palette) + b"\x00\x00\x00"
+            indices = bytes(index if pixels[k * 4 + 3] else transparent for k, index in enumerate(indices))
+            image = Image.frombytes("P", size, indices)
+            image.putpalette(colors)
+        else:
+            # Too many colours for one table: leave a slot for transparency and quantise the rest.
+            image = Image.frombytes("RGBA", size, pixels).convert("RGB").quantize(GIF_COLORS - 1)
+            transparent = GIF_COLORS - 1
+            image.putdata([index if pixels[k * 4 + 3] else transparent for k, index in enumerate(image.getdata())])
+        if self.scale != 1:
+            image = image.resize((size[0] * self.scale, size[1] * self.scale), getattr(Image, "Resampling", Image).NEAREST)
+        # Graphic control extension: disposal, transparency flag, delay, transparent index.
+        flags = GIF_DISPOSE_NONE << 2 | 1
+        self.file.write(b"!\xf9\x04" + struct.pack("<BHB", flags, round(duration_ms / 10), transparent) + b"\x00")
+        for data in GifImagePlugin.getdata(image, (left * self.scale, top * self.scale), include_color_table=True):
+            self.file.write(data)
+        self.frames += 1
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.file.write(b";")
+            self.file.close()
+
+    def __enter__(self) -> GIFWriter:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,326 @@
+"""
+Incremental autosave in the background.
+
+An Autosaver keeps a file up to date with the current grid and the replay
+history, without the window waiting on the disk. It subscribes to the grid's
+ChangeBus and collects the chunks (see change_bus.CHUNK_SIZE) changed since
+the last save. Every interval seconds, tick() (called from on_update) copies
+the layer stores of those chunks, and the replay actions recorded since the
+last save, into a buffer and hands it to a writer thread. That thread
+pickles, compresses and appends it to the file as one record, and syncs it
+to disk, while the window carries on filling the next buffer. If the writer
+is still busy with the last buffer when the next save is due, tick() does
+not wait: the changes keep collecting and go out with the save after.
+
+File layout:
+    header:  magic, draw style, grid width, grid height, chunk size
+    records: payload length (varint), CRC32 of payload, payload (as journal records)
+
+Each payload is a zlib-compressed pickle of the chunks it saves and the
+replay actions it adds. Loading starts from an empty grid and applies the
+records in order; a record cut short by a crash (or failing its CRC) marks
+the end of the file, so an interrupted save only loses itself. Once the file
+has grown to COMPACT_RATIO times the size of the last full save, the writer
+rewrites it as a single full record, into a temporary file that then
+replaces it.
+
+When the replay tracker records to a journal, the journal already keeps the
+history, and only the grid is autosaved.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+from action import PaintAction
+from change_bus import GridChanges
+from grid import Grid
+from journal import frame, scan_frames
+from replay import ReplayTracker
+
+MAGIC = b"PAS1"
+HEADER = struct.Struct("<4sBIIH")
+AUTOSAVE_INTERVAL = 5.0
+# Rewrite the file as a single record once it is this many times the size of the last one.
+COMPACT_RATIO = 4
+ZLIB_LEVEL = 6
+
+
+class AutosaveError(Exception):
+    """Raised when a file is not an autosave."""
+
+
+@dataclass
+class AutosaveMetrics:
+    """What an Autosaver has done so far. Latencies are in seconds."""
+
+    saves: int = 0
+    chunks_written: int = 0
+    actions_written: int = 0
+    bytes_written: int = 0
+    compactions: int = 0
+    # Saves put off because the writer was still busy with the one before.
+    busy_skips: int = 0
+    errors: int = 0
+    # Time tick() spent copying a save into the buffer, on the window's thread.
+    last_capture: float = 0.0
+    max_capture: float = 0.0
+    # Time from a save being handed to the writer to it being on disk.
+    last_latency: float = 0.0
+    max_latency: float = 0.0
+    total_latency: float = 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.saves if self.saves else 0.0
+
+
+@dataclass
+class AutosaveBuffer:
+    """One save: the layer stores of some chunks, and replay actions to append to the history."""
+
+    # {(chunk x, chunk y): columns of copied layer stores}
+    chunks: dict[tuple[int, int], list[list]] = field(default_factory=dict)
+    actions: list[tuple[PaintAction, bool]] = field(default_factory=list)
+    # The history starts over with these actions, rather than adding to it.
+    restart: bool = False
+    handed_over: float = 0.0
+
+
+class Autosaver:
+    """Saves a grid and its replay history to path in the background, a few chunks at a time."""
+
+    def __init__(self, path: str, grid: Grid, history: ReplayTracker|None = None,
+                 interval: float = AUTOSAVE_INTERVAL, clock=time.monotonic) -> None:
+        self.path = path
+        self.interval = interval
+        self.clock = clock
+        self.metrics = AutosaveMetrics()
+        self.error: Exception|None = None
+        self.chunk_size = grid.changes.chunk_size
+        self.header = self._header(grid)
+        self.grid: Grid|None = None
+        self.dirty: set[tuple[int, int]] = set()
+        self.attach(grid)
+        self.history = history
+        self.history_saved = 0
+        self.history_restart = True
+        self.last_save = clock()
+
+        # The buffer handed to the writer, None while it is idle; guarded by lock.
+        self.lock = threading.Condition()
+        self.pending: AutosaveBuffer|None = None
+        self.closing = False
+        # The writer's copy of what is in the file, to compact it from.
+        self.saved_chunks: dict[tuple[int, int], list[list]] = {}
+        self.saved_actions: list[tuple[PaintAction, bool]] = []
+        self.file_size = 0
+        self.compact_size = 0
+        self.thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self.thread.start()
+
+    def attach(self, grid: Grid) -> None:
+        """
+        Save grid from now on, in place of the grid before (e.g. after a replay replaced it).
+        All of it is saved with the next save.
+
+        :raises ValueError: if it doesn't have the draw style and dimensions the file was started with.
+        """
+        if self._header(grid) != self.header:
+            raise ValueError("can only autosave grids with the same draw style and dimensions")
+        if self.grid is not None:
+            self.grid.changes.unsubscribe(self.on_changes)
+        self.grid = grid
+        grid.changes.subscribe(self.on_changes)
+        self._dirty_everything()
+
+    def _header(self, grid: Grid) -> bytes:
+        return HEADER.pack(MAGIC, Grid.DRAW_STYLE_OPTIONS.index(grid.draw_style), grid.x, grid.y, self.chunk_size)
+
+    def on_changes(self, changes: GridChanges) -> None:
+        """Collect the chunks in a batch of changes. :complexity: O(c), where c is the number of changed squares."""
+        if changes.everything:
+            self._dirty_everything()
+        else:
+            size = self.chunk_size
+            self.dirty.update((x // size, y // size) for x, y in changes.squares)
+
+    def _dirty_everything(self) -> None:
+        size = self.chunk_size
+        self.dirty = {(cx, cy) for cx in range(-(-self.grid.x // size)) for cy in range(-(-self.grid.y // size))}
+
+    def _new_actions(self) -> bool:
+        if self.history is None or self.history.journal is not None:
+            return False
+        return self.history.action_count != self.history_saved or self.history_restart
+
+    def tick(self, now: float|None = None) -> bool:
+        """
+        Hand a save to the writer if one is due, and it isn't busy. Never waits for the disk.
+        Returns whether a save was handed over.
+
+        :complexity: O(1) if no save is due, otherwise O(k * s + a), where k is the number of changed chunks,
+            s the number of squares in a chunk, and a the number of actions recorded since the last save.
+        """
+        now = self.clock() if now is None else now
+        self.grid.changes.publish()
+        if now - self.last_save < self.interval or (not self.dirty and not self._new_actions()):
+            return False
+        with self.lock:
+            if self.pending is not None:
+                self.metrics.busy_skips += 1
+                return False
+        self._hand_over(self._capture())
+        self.last_save = now
+        return True
+
+    def _capture(self) -> AutosaveBuffer:
+        start = self.clock()
+        buffer = AutosaveBuffer()
+        grid, size = self.grid, self.chunk_size
+        for cx, cy in self.dirty:
+            buffer.chunks[(cx, cy)] = [
+                [grid[x][y].copy() for y in range(cy * size, min((cy + 1) * size, grid.y))]
+                for x in range(cx * size, min((cx + 1) * size, grid.x))
+            ]
+        self.dirty = set()
+        if self._new_actions():
+            history = self.history
+            if history.action_count < self.history_saved:
+                self.history_restart = True
+            if self.history_restart:
+                self.history_saved = 0
+            buffer.restart = self.history_restart
+            buffer.actions = history.replay_actions[self.history_saved:history.action_count]
+            self.history_saved = history.action_count
+            self.history_restart = False
+        elapsed = self.clock() - start
+        self.metrics.last_capture = elapsed
+        self.metrics.max_capture = max(self.metrics.max_capture, elapsed)
+        return buffer
+
+    def _hand_over(self, buffer: AutosaveBuffer) -> None:
+        with self.lock:
+            buffer.handed_over = self.clock()
+            self.pending = buffer
+            self.lock.notify_all()
+
+    def flush(self) -> None:
+        """Save everything changed so far, and wait until it is on disk."""
+        with self.lock:
+            while self.pending is not None:
+                self.lock.wait()
+        self.grid.changes.publish()
+        if self.dirty or self._new_actions():
+            self._hand_over(self._capture())
+            self.last_save = self.clock()
+        with self.lock:
+            while self.pending is not None:
+                self.lock.wait()
+
+    def close(self) -> None:
+        """Flush, and stop the writer. Closing again does nothing."""
+        if self.closing:
+            return
+        self.flush()
+        with self.lock:
+            self.closing = True
+            self.lock.notify_all()
+        self.thread.join()
+        self.grid.changes.unsubscribe(self.on_changes)
+
+    def _run(self) -> None:
+        while True:
+            with self.lock:
+                while self.pending is None and not self.closing:
+                    self.lock.wait()
+                if self.pending is None:
+                    return
+                buffer = self.pending
+            try:
+                self._write(buffer)
+            except Exception as e:
+                # Keep the window going; the next save tries again with everything.
+                self.error = e
+                self.metrics.errors += 1
+                self.file_size = 0
+            finally:
+                # Whatever happened, flush and close must not wait for this save forever.
+                with self.lock:
+                    self.pending = None
+                    self.lock.notify_all()
+
+    def _write(self, buffer: AutosaveBuffer) -> None:
+        self.saved_chunks.update(buffer.chunks)
+        if buffer.restart:
+            self.saved_actions = []
+        self.saved_actions.extend(buffer.actions)
+
+        written = 0
+        if self.file_size == 0 or self.file_size > COMPACT_RATIO * max(self.compact_size, 1 << 16):
+            # Start the file afresh with everything saved so far.
+            record = frame(_encode(self.saved_chunks, self.saved_actions, True))
+            temporary = self.path + ".tmp"
+            with open(temporary, "wb") as f:
+                f.write(self.header + record)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.path)
+            self.compact_size = self.file_size = written = len(self.header) + len(record)
+            self.metrics.compactions += 1
+        else:
+            record = frame(_encode(buffer.chunks, buffer.actions, buffer.restart))
+            with open(self.path, "ab") as f:
+                f.write(record)
+                f.flush()
+                os.fsync(f.fileno())
+            self.file_size += len(record)
+            written = len(record)
+
+        latency = self.clock() - buffer.handed_over
+        metrics = self.metrics
+        metrics.saves += 1
+        metrics.chunks_written += len(buffer.chunks)
+        metrics.actions_written += len(buffer.actions)
+        metrics.bytes_written += written
+        metrics.last_latency = latency
+        metrics.max_latency = max(metrics.max_latency, latency)
+        metrics.total_latency += latency
+
+
+def _encode(chunks: dict, actions: list, restart: bool) -> bytes:
+    return zlib.compress(pickle.dumps((chunks, actions, restart), pickle.HIGHEST_PROTOCOL), ZLIB_LEVEL)
+
+
+def load_autosave(path: str) -> tuple[Grid, list[tuple[PaintAction, bool]]]:
+    """
+    Read an autosave back into (grid, replay actions).
+    Anything after the last complete record is ignored.
+
+    :raises AutosaveError: if the file is not an autosave.
+    :complexity: O(xy + b), where b is the size of the file.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise AutosaveError("Autosave is missing its header")
+    magic, style_index, x, y, size = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or style_index >= len(Grid.DRAW_STYLE_OPTIONS):
+        raise AutosaveError("Not a paint autosave")
+    grid = Grid(Grid.DRAW_STYLE_OPTIONS[style_index], x, y)
+    actions: list[tuple[PaintAction, bool]] = []
+    for _, start, end in scan_frames(data, HEADER.size, len(data)):
+        chunks, new_actions, restart = pickle.loads(zlib.decompress(data[start:end]))
+        for (cx, cy), columns in chunks.items():
+            for i, column in enumerate(columns):
+                for j, store in enumerate(column):
+                    grid.place(cx * size + i, cy * size + j, store)
+        if restart:
+            actions = []
+        actions.extend(new_actions)
+    return grid, actions
@@ -0,0 +1,5 @@
+"""
+Performance benchmarks.
+
+Each module can be run on its own, e.g. `python -m benchmarks.bench_raster`.
+"""
@@ -0,0 +1,175 @@
+"""
+Benchmark of the data_structures ADTs against the builtins they stand in for.
+
+Runs the same workload on each ADT and on its builtin equivalent, at each
+size: ArrayR against list indexing, ArrayStack against list append/pop,
+CircularQueue against deque, ArraySortedList against a list kept sorted
+with bisect, and BSet against set. The growable stack and queue are run
+alongside the fixed ones. Reports operations per second (the fastest of
+--repeat runs) and the peak memory of a run.
+
+Usage: python -m benchmarks.bench_adts [--sizes N ...] [--json PATH]
+"""
+
+from __future__ import annotations
+import argparse
+import bisect
+import random
+from collections import deque
+
+from benchmarks.common import HIGHER, LOWER, best_time, peak_memory, write_results
+from data_structures.array_sorted_list import ArraySortedList
+from data_structures.bset import BSet
+from data_structures.queue_adt import CircularQueue, GrowableCircularQueue
+from data_structures.referential_array import ArrayR
+from data_structures.sorted_list_adt import ListItem
+from data_structures.stack_adt import ArrayStack, GrowableArrayStack
+
+SIZES = (100, 1000, 10000)
+METRICS = {"ops_per_sec": HIGHER, "peak_bytes": LOWER}
+
+
+def run_array(array) -> None:
+    for i in range(len(array)):
+        array[i] = i
+    for i in range(len(array)):
+        array[i]
+
+
+def run_stack(state) -> None:
+    stack, n = state
+    for i in range(n):
+        stack.push(i)
+    for _ in range(n):
+        stack.pop()
+
+
+def run_list_stack(state) -> None:
+    stack, n = state
+    for i in range(n):
+        stack.append(i)
+    for _ in range(n):
+        stack.pop()
+
+
+def run_queue(state) -> None:
+    queue, n = state
+    for i in range(n):
+        queue.append(i)
+    for _ in range(n):
+        queue.serve()
+
+
+def run_deque(state) -> None:
+    queue, n = state
+    for i in range(n):
+        queue.append(i)
+    for _ in range(n):
+        queue.popleft()
+
+
+def run_sorted_list(state) -> None:
+    items, keys = state
+    sorted_list = ArraySortedList(1)
+    for item in items:
+        sorted_list.add(item)
+    for key in keys:
+        ListItem(None, key) in sorted_list
+
+
+def run_bisect(state) -> None:
+    items, keys = state
+    sorted_list = []
+    sorted_keys = []
+    for item in items:
+        # Kept as two lists, as bisect on a key function has to call it for every comparison.
+        i = bisect.bisect_right(sorted_keys, item.key)
+        sorted_keys.insert(i, item.key)
+        sorted_list.insert(i, item)
+    for key in keys:
+        i = bisect.bisect_left(sorted_keys, key)
+        i < len(sorted_keys) and sorted_keys[i] == key
+
+
+def run_bset(state) -> None:
+    items, queries = state
+    s = BSet()
+    for item in items:
+        s.add(item)
+    for item in queries:
+        item in s
+
+
+def run_set(state) -> None:
+    items, queries = state
+    s = set()
+    for item in items:
+        s.add(item)
+    for item in queries:
+        item in s
+
+
+def cases(n: int, rng: random.Random) -> list[tuple[str, int, list[tuple[str, object, object]]]]:
+    """(operation, operations per run, [(implementation, setup, run)]) for size n."""
+    keys = [rng.randrange(n) for _ in range(n)]
+    items = [ListItem(i, key) for i, key in enumerate(keys)]
+    queries = [rng.randrange(n) for _ in range(n)]
+    # BSet only holds positive integers.
+    members = [rng.randrange(1, n + 1) for _ in range(n)]
+    member_queries = [query + 1 for query in queries]
+    return [
+        ("index set/get", 2 * n, [
+            ("ArrayR", lambda: ArrayR(n), run_array),
+            ("list", lambda: [None] * n, run_array),
+        ]),
+        ("stack push/pop", 2 * n, [
+            ("ArrayStack", lambda: (ArrayStack(n), n), run_stack),
+            ("GrowableArrayStack", lambda: (GrowableArrayStack(), n), run_stack),
+            ("list", lambda: ([], n), run_list_stack),
+        ]),
+        ("queue append/serve", 2 * n, [
+            ("CircularQueue", lambda: (CircularQueue(n), n), run_queue),
+            ("GrowableCircularQueue", lambda: (GrowableCircularQueue(), n), run_queue),
+            ("deque", lambda: (deque(), n), run_deque),
+        ]),
+        ("sorted add/contains", 2 * n, [
+            ("ArraySortedList", lambda: (items, queries), run_sorted_list),
+            ("bisect", lambda: (items, queries), run_bisect),
+        ]),
+        ("set add/contains", 2 * n, [
+            ("BSet", lambda: (members, member_queries), run_bset),
+            ("set", lambda: (members, member_queries), run_set),
+        ]),
+    ]
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--json", metavar="PATH", help='Also write the results as JSON to PATH ("-" for stdout).')
+    args = p.parse_args(argv)
+
+    results = []
+    print(f"{'operation':<20} {'implementation':<22} {'size':>6} {'ops/s':>12} {'peak (KiB)':>11}")
+    for n in args.sizes:
+        for operation, ops, implementations in cases(n, random.Random(args.seed)):
+            for implementation, setup, run in implementations:
+                seconds = best_time(setup, run, args.repeat)
+                peak = peak_memory(lambda: run(setup()))
+                results.append({
+                    "name": f"{operation}/{implementation}/{n}",
+                    "operation": operation,
+                    "implementation": implementation,
+                    "size": n,
+                    "ops_per_sec": ops / seconds,
+                    "peak_bytes": peak,
+                })
+                print(f"{operation:<20} {implementation:<22} {n:>6} {ops / seconds:>12,.0f} {peak / 1024:>11.1f}")
+    if args.json:
+        write_results(args.json, "adts", vars(args), METRICS, results)
+
+
+if __name__ == "__main__":
+    main()
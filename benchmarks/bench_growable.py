@@ -0,0 +1,80 @@
+"""
+Memory (and time) of the fixed-capacity stack and queue against the growable ones.
+
+Each additive layer store used to allocate a CircularQueue with room for 100
+times the number of layers, and the undo tracker two ArrayStacks of 10000
+actions, whether or not any of it was used. This measures, with tracemalloc,
+what a grid of additive stores and an undo tracker take up with the fixed
+versions and with GrowableCircularQueue and GrowableArrayStack, with each
+square holding a few layers, and the time to fill them.
+
+Usage: python -m benchmarks.bench_growable [--size N] [--layers N] [--actions N]
+"""
+
+from __future__ import annotations
+import argparse
+import time
+import tracemalloc
+
+from data_structures.queue_adt import CircularQueue, GrowableCircularQueue
+from data_structures.stack_adt import ArrayStack, GrowableArrayStack
+from layers import black
+
+# What AdditiveLayerStore and UndoTracker used to allocate.
+FIXED_QUEUE_CAPACITY = 100 * 9
+FIXED_STACK_CAPACITY = 10000
+
+
+def measure(build) -> tuple[int, float, object]:
+    """(bytes still allocated, seconds) for build(), and what it built (kept alive while measuring)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    built = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, elapsed, built
+
+
+def grid_of_queues(new_queue, size: int, layers: int) -> list:
+    queues = []
+    for _ in range(size * size):
+        queue = new_queue()
+        for _ in range(layers):
+            queue.append(black)
+        queues.append(queue)
+    return queues
+
+
+def undo_stacks(new_stack, actions: int) -> list:
+    stacks = [new_stack(), new_stack()]
+    for action in range(actions):
+        stacks[0].push(action)
+    return stacks
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--size", type=int, default=64, help="The grid is size x size squares.")
+    p.add_argument("--layers", type=int, default=3, help="Layers added to each square.")
+    p.add_argument("--actions", type=int, default=500, help="Actions pushed onto the undo stack.")
+    args = p.parse_args(argv)
+
+    cases = [
+        (f"{args.size}x{args.size} queues",
+         lambda: grid_of_queues(lambda: CircularQueue(FIXED_QUEUE_CAPACITY), args.size, args.layers),
+         lambda: grid_of_queues(GrowableCircularQueue, args.size, args.layers)),
+        (f"undo, {args.actions} actions",
+         lambda: undo_stacks(lambda: ArrayStack(FIXED_STACK_CAPACITY), args.actions),
+         lambda: undo_stacks(GrowableArrayStack, args.actions)),
+    ]
+    print(f"{'case':<22} {'fixed (KiB)':>12} {'growable (KiB)':>15} {'saving':>8} {'fixed (ms)':>11} {'growable (ms)':>14}")
+    for name, fixed, growable in cases:
+        fixed_size, fixed_time, _ = measure(fixed)
+        growable_size, growable_time, _ = measure(growable)
+        print(f"{name:<22} {fixed_size/1024:>12.1f} {growable_size/1024:>15.1f} {fixed_size/growable_size:>7.1f}x"
+              f" {fixed_time*1000:>11.2f} {growable_time*1000:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
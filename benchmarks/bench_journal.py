@@ -0,0 +1,105 @@
+"""
+Benchmark of replay journal compression.
+
+Records a synthetic session (random brush strokes, as painted in stroke
+mode, or single stamps) to a raw and to a compressed journal, and packs it
+with pack_actions. Reports the size of each, and how long it takes to stream
+the journal back, both decoding alone and decoding plus applying every
+action to a grid.
+
+Usage: python -m benchmarks.bench_journal [--seed N] [--actions N] [--stamps]
+"""
+
+from __future__ import annotations
+import argparse
+import os
+import random
+import tempfile
+import timeit
+
+from action import PaintAction, PaintStep
+from action_codec import pack_actions
+from brush import BRUSH_DIAMOND, get_stencil
+from grid import Grid
+from journal import CODEC_RAW, CODEC_ZLIB, JournalReader, JournalWriter
+from layer_util import get_layers
+
+GRID_SIZE = 32
+
+
+def make_session(count: int, stamps_only: bool, rng: random.Random) -> list[tuple[PaintAction, bool]]:
+    """Random strokes (or single stamps), with the occasional undo."""
+    layers = [layer for layer in get_layers() if layer is not None]
+    stencil = get_stencil(BRUSH_DIAMOND, 2)
+    actions = []
+    x, y = GRID_SIZE // 2, GRID_SIZE // 2
+    for _ in range(count):
+        if rng.random() < 0.05 and actions:
+            actions.append((actions[-1][0], True))
+            continue
+        layer = rng.choice(layers)
+        action = PaintAction()
+        painted = set()
+        for _ in range(1 if stamps_only else rng.randrange(5, 60)):
+            x = max(0, min(GRID_SIZE - 1, x + rng.choice((-1, 0, 1))))
+            y = max(0, min(GRID_SIZE - 1, y + rng.choice((-1, 0, 1))))
+            action.stamps.append((stencil, x, y))
+            for cell in stencil.cells(x, y, GRID_SIZE, GRID_SIZE):
+                if cell not in painted:
+                    painted.add(cell)
+                    action.add_step(PaintStep(cell, layer))
+        actions.append((action, False))
+    return actions
+
+
+def write_journal(path: str, actions, codec: int) -> int:
+    if os.path.exists(path):
+        os.remove(path)
+    with JournalWriter(path, Grid.DRAW_STYLE_SEQUENCE, GRID_SIZE, GRID_SIZE, codec=codec) as writer:
+        for action, is_undo in actions:
+            writer.append(action, is_undo)
+    return os.path.getsize(path)
+
+
+def decode(path: str) -> int:
+    with JournalReader(path) as reader:
+        return sum(1 for _ in reader.records())
+
+
+def play(path: str) -> None:
+    with JournalReader(path) as reader:
+        grid = reader.new_grid()
+        for action, is_undo in reader:
+            if is_undo:
+                action.undo_apply(grid)
+            else:
+                action.redo_apply(grid)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--actions", type=int, default=2000)
+    p.add_argument("--stamps", action="store_true", help="One stamp per action, as painted with stroke mode off.")
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args(argv)
+
+    actions = make_session(args.actions, args.stamps, random.Random(args.seed))
+    steps = sum(len(action.steps) for action, _ in actions)
+    print(f"{len(actions)} actions, {steps} steps")
+    with tempfile.TemporaryDirectory() as directory:
+        sizes = {}
+        print(f"{'format':>12} {'bytes':>10} {'ratio':>7} {'decode (ms)':>12} {'play (ms)':>10}")
+        for name, codec in (("raw", CODEC_RAW), ("zlib", CODEC_ZLIB)):
+            path = os.path.join(directory, f"{name}.paj")
+            sizes[name] = write_journal(path, actions, codec)
+            decoding = min(timeit.repeat(lambda: decode(path), number=1, repeat=args.repeat))
+            playing = min(timeit.repeat(lambda: play(path), number=1, repeat=args.repeat))
+            print(f"{name:>12} {sizes[name]:>10} {sizes['raw'] / sizes[name]:>6.1f}x {decoding*1000:>12.1f} {playing*1000:>10.1f}")
+        for codec in ("zlib", "lzma"):
+            size = len(pack_actions(actions, GRID_SIZE, GRID_SIZE, codec))
+            print(f"{'pack ' + codec:>12} {size:>10} {sizes['raw'] / size:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark of the brush stroke rasterisers in `raster`.
+
+Compares the original 0.5 pixel point sampler (plus the de-duplication
+pass `MyWindow.try_draw` used to run over its output) against the
+supercover grid traversal, on random drags of increasing length.
+
+Usage: python -m benchmarks.bench_raster [--seed N] [--drags N]
+"""
+
+from __future__ import annotations
+import argparse
+import random
+import timeit
+
+from raster import sampled_line, supercover_line
+
+# Matches the window: a 700x700 drawing panel split into 32x32 squares.
+CELL_WIDTH = 700 / 32
+CELL_HEIGHT = 700 / 32
+DRAG_LENGTHS = (10, 100, 700, 5000)
+
+
+def make_drags(length: float, count: int, rng: random.Random) -> list[tuple[float, float, float, float]]:
+    """Random drags of (roughly) the given pixel length."""
+    drags = []
+    for _ in range(count):
+        x0, y0 = rng.uniform(0, 700), rng.uniform(0, 700)
+        dx = rng.uniform(-1, 1)
+        dy = rng.choice((-1, 1)) * (1 - abs(dx))
+        drags.append((x0, y0, x0 + dx * length, y0 + dy * length))
+    return drags
+
+
+def run_sampled(drags) -> int:
+    painted = 0
+    for x0, y0, x1, y1 in drags:
+        prev = None
+        for point in sampled_line(x0, y0, x1, y1, CELL_WIDTH, CELL_HEIGHT):
+            if point != prev:
+                painted += 1
+                prev = point
+    return painted
+
+
+def run_supercover(drags) -> int:
+    painted = 0
+    for x0, y0, x1, y1 in drags:
+        for _ in supercover_line(x0, y0, x1, y1, CELL_WIDTH, CELL_HEIGHT):
+            painted += 1
+    return painted
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--drags", type=int, default=200, help="Drags per length.")
+    p.add_argument("--repeat", type=int, default=5)
+    args = p.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    print(f"{'length (px)':>12} {'sampled (ms)':>13} {'supercover (ms)':>16} {'speedup':>8} {'squares':>8}")
+    for length in DRAG_LENGTHS:
+        drags = make_drags(length, args.drags, rng)
+        sampled = min(timeit.repeat(lambda: run_sampled(drags), number=1, repeat=args.repeat))
+        supercover = min(timeit.repeat(lambda: run_supercover(drags), number=1, repeat=args.repeat))
+        squares = run_supercover(drags) / len(drags)
+        print(f"{length:>12} {sampled*1000:>13.2f} {supercover*1000:>16.2f} {sampled/supercover:>7.1f}x {squares:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
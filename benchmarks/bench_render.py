@@ -0,0 +1,157 @@
+"""
+Benchmark matrix of rendering a grid, across draw styles, grid sizes and stack depths.
+
+For every draw style, size and depth, builds a size x size grid and paints
+it with a seeded stroke workload: depth passes over the canvas, each pass a
+set of horizontal strokes of random lengths and layers, so every square
+ends up with depth layers added to it (SEQUENCE stores can only hold each
+layer once, so theirs stop growing at the number of layers). It then
+measures:
+
+    get_color_per_sec   squares coloured per second, over a full frame
+                        (the fastest of --repeat frames)
+    special_seconds     one Grid.special (the fastest of --repeat, each on a fresh copy)
+    grid_bytes          memory the painted grid takes up (as traced by tracemalloc)
+
+The default matrix stops at 512x512 to keep a run to minutes; pass
+--sizes 32 128 512 1024 for the whole range.
+
+With --json the results are saved as a baseline, and with --baseline a run
+is compared against one. compare compares two saved runs. Either way, a
+measurement more than --threshold worse than the baseline is flagged, and
+the exit status is 1 if any are. With --json - the results go to stdout,
+so the tables go to stderr.
+
+Usage: python -m benchmarks.bench_render run [--styles S ...] [--sizes N ...] [--depths N ...]
+                                             [--json PATH] [--baseline PATH]
+       python -m benchmarks.bench_render compare BASELINE CURRENT [--threshold F]
+"""
+
+from __future__ import annotations
+import argparse
+import random
+import sys
+import tracemalloc
+
+from benchmarks.common import (HIGHER, LOWER, REGRESSION_THRESHOLD, best_time, compare_results,
+                               print_comparisons, read_results, write_results)
+from export import BACKGROUND
+from action import PaintStep
+from grid import Grid
+from layer_util import get_layers
+
+SIZES = (32, 128, 512)
+DEPTHS = (1, 4, 8)
+METRICS = {"get_color_per_sec": HIGHER, "special_seconds": LOWER, "grid_bytes": LOWER}
+# Strokes are this many squares long, at most.
+MAX_STROKE = 48
+
+
+def paint(grid: Grid, depth: int, rng: random.Random) -> None:
+    """
+    depth passes over the grid, each made of horizontal strokes of one random layer each,
+    painted as the window paints them (as PaintSteps), so the grid's hash and changes are kept up to date.
+    """
+    layers = [layer for layer in get_layers() if layer is not None]
+    for _ in range(depth):
+        for y in range(grid.y):
+            x = 0
+            while x < grid.x:
+                layer = rng.choice(layers)
+                end = min(grid.x, x + rng.randint(1, MAX_STROKE))
+                for stroke_x in range(x, end):
+                    PaintStep((stroke_x, y), layer).redo_apply(grid)
+                x = end
+    # As after the window's next frame: the changes drawn and the hash brought up to date.
+    grid.changes.publish()
+    grid.state_hash()
+
+
+def painted_grid(style: str, size: int, depth: int, seed: int) -> tuple[Grid, int]:
+    """A painted grid, and the memory it takes up."""
+    tracemalloc.start()
+    try:
+        grid = Grid(style, size, size)
+        paint(grid, depth, random.Random(seed))
+        size_bytes, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return grid, size_bytes
+
+
+def frame(grid: Grid, timestamp: float = 0) -> None:
+    for x in range(grid.x):
+        column = grid[x]
+        for y in range(grid.y):
+            column[y].get_color(BACKGROUND, timestamp, x, y)
+
+
+def run(args, out=None) -> list[dict]:
+    """Run the matrix, printing each result to out (stdout by default) as it is measured."""
+    out = sys.stdout if out is None else out
+    results = []
+    print(f"{'style':<9} {'size':>5} {'depth':>5} {'get_color/s':>12} {'frame (ms)':>11} {'special (ms)':>13} {'grid (MiB)':>11}", file=out)
+    for style in args.styles:
+        for size in args.sizes:
+            for depth in args.depths:
+                grid, grid_bytes = painted_grid(style, size, depth, args.seed)
+                frame_seconds = best_time(lambda: grid, frame, args.repeat)
+                special_seconds = best_time(grid.copy, Grid.special, args.repeat)
+                results.append({
+                    "name": f"{style}/{size}/{depth}",
+                    "style": style,
+                    "size": size,
+                    "depth": depth,
+                    "get_color_per_sec": size * size / frame_seconds,
+                    "special_seconds": special_seconds,
+                    "grid_bytes": grid_bytes,
+                })
+                print(f"{style:<9} {size:>5} {depth:>5} {size * size / frame_seconds:>12,.0f} {frame_seconds*1000:>11.1f}"
+                      f" {special_seconds*1000:>13.1f} {grid_bytes / 2**20:>11.1f}", file=out)
+    return results
+
+
+def report(baseline: dict, current: dict, threshold: float, out=None) -> int:
+    comparisons = compare_results(baseline, current, threshold)
+    print_comparisons(comparisons, file=out)
+    return 1 if any(c.regressed for c in comparisons) else 0
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = p.add_subparsers(dest="command", required=True)
+    p_run = commands.add_parser("run", help="Run the matrix.")
+    p_run.add_argument("--seed", type=int, default=0)
+    p_run.add_argument("--styles", nargs="+", default=Grid.DRAW_STYLE_OPTIONS, choices=Grid.DRAW_STYLE_OPTIONS)
+    p_run.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    p_run.add_argument("--depths", type=int, nargs="+", default=DEPTHS)
+    p_run.add_argument("--repeat", type=int, default=3)
+    p_run.add_argument("--json", metavar="PATH", help='Save the results as JSON to PATH ("-" for stdout).')
+    p_run.add_argument("--baseline", metavar="PATH", help="Compare the results with a saved run.")
+    p_run.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    p_compare = commands.add_parser("compare", help="Compare two saved runs.")
+    p_compare.add_argument("baseline")
+    p_compare.add_argument("current")
+    p_compare.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = p.parse_args(argv)
+
+    try:
+        if args.command == "compare":
+            return report(read_results(args.baseline), read_results(args.current), args.threshold)
+
+        baseline = read_results(args.baseline) if args.baseline else None
+        # The JSON on stdout has to parse, so the tables go to stderr then.
+        out = sys.stderr if args.json == "-" else sys.stdout
+        results = run(args, out)
+        arguments = {key: value for key, value in vars(args).items() if key not in ("json", "baseline", "command")}
+        if args.json:
+            write_results(args.json, "render", arguments, METRICS, results)
+        if baseline is not None:
+            return report(baseline, {"benchmark": "render", "metrics": METRICS, "results": results}, args.threshold, out)
+        return 0
+    except (OSError, ValueError) as e:
+        p.error(str(e))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Helpers shared by the benchmarks: timing, peak memory, and JSON results.
+
+Results are written as JSON so runs on different commits can be diffed:
+{"benchmark": name, "environment": {...}, "arguments": {...}, "metrics": {...}, "results": [...]},
+where each result is a flat dict with a "name" unique within the run, and
+metrics says which of its fields are measurements, and whether higher or
+lower is better. compare_results matches two runs up by name, and flags
+the measurements that got worse by more than a threshold.
+"""
+
+from __future__ import annotations
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable
+
+HIGHER = "higher"
+LOWER = "lower"
+# A measurement has regressed once it is this much (as a fraction) worse than the baseline.
+REGRESSION_THRESHOLD = 0.15
+
+
+def best_time(setup: Callable[[], object], run: Callable[[object], object], repeat: int) -> float:
+    """The fastest of repeat calls of run(setup()), in seconds. Only run is timed."""
+    best = float("inf")
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(build: Callable[[], object]) -> int:
+    """The most memory (in bytes, as traced by tracemalloc) allocated at once while build() runs."""
+    tracemalloc.start()
+    try:
+        build()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def environment() -> dict:
+    """What the results were measured on: Python, platform, and the git commit (None outside a checkout)."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "commit": commit,
+    }
+
+
+def write_results(path: str, benchmark: str, arguments: dict, metrics: dict[str, str], results: list[dict]) -> None:
+    """
+    Write results to path as JSON, or to stdout if path is "-".
+    metrics maps each measurement in the results to HIGHER or LOWER, whichever is better.
+    """
+    document = {"benchmark": benchmark, "environment": environment(), "arguments": arguments,
+                "metrics": metrics, "results": results}
+    text = json.dumps(document, indent=2, sort_keys=True) + "\n"
+    if path == "-":
+        sys.stdout.write(text)
+    else:
+        with open(path, "w") as f:
+            f.write(text)
+
+
+def read_results(path: str) -> dict:
+    """
+    Read results written by write_results.
+
+    :raises ValueError: if the file isn't benchmark results.
+    """
+    with open(path) as f:
+        document = json.load(f)
+    if not isinstance(document, dict) or not isinstance(document.get("results"), list):
+        raise ValueError(f"{path} is not a benchmark results file")
+    return document
+
+
+@dataclass
+class Comparison:
+    """One measurement of one result, in a baseline run and the current one."""
+
+    name: str
+    metric: str
+    baseline: float
+    current: float
+    # How much better (positive) or worse (negative) current is, as a fraction of baseline.
+    change: float
+    regressed: bool
+
+
+def compare_results(baseline: dict, current: dict, threshold: float = REGRESSION_THRESHOLD) -> list[Comparison]:
+    """
+    Compare every measurement of the results the two runs have in common (by name).
+
+    :raises ValueError: if they are runs of different benchmarks.
+    """
+    if baseline.get("benchmark") != current.get("benchmark"):
+        raise ValueError(f"can't compare {baseline.get('benchmark')} results with {current.get('benchmark')} results")
+    metrics = current.get("metrics", {})
+    before = {result["name"]: result for result in baseline["results"]}
+    comparisons = []
+    for result in current["results"]:
+        old = before.get(result["name"])
+        if old is None:
+            continue
+        for metric, better in metrics.items():
+            if metric not in result or metric not in old or not old[metric]:
+                continue
+            change = (result[metric] - old[metric]) / old[metric]
+            if better == LOWER:
+                change = -change
+            comparisons.append(Comparison(result["name"], metric, old[metric], result[metric], change, change < -threshold))
+    return comparisons
+
+
+def print_comparisons(comparisons: list[Comparison], regressions_only: bool = False, file=None) -> None:
+    """Print comparisons as a table, to file (stdout by default)."""
+    file = sys.stdout if file is None else file
+    print(f"{'result':<40} {'metric':<16} {'baseline':>14} {'current':>14} {'change':>8}", file=file)
+    for c in comparisons:
+        if c.regressed or not regressions_only:
+            flag = "  REGRESSED" if c.regressed else ""
+            print(f"{c.name:<40} {c.metric:<16} {c.baseline:>14.6g} {c.current:>14.6g} {c.change:>+7.1%}{flag}", file=file)
+    regressed = sum(c.regressed for c in comparisons)
+    print(f"{len(comparisons)} measurements compared, {regressed} regressed", file=file)
@@ -0,0 +1,84 @@
+"""
+Brush shapes.
+
+A brush stamp is precomputed once per (shape, size) as a table of spans:
+for every column offset dx, the half-open range of row offsets it covers.
+Stamping then only clips those spans against the grid, instead of testing
+every square of the (2*size+1)^2 bounding box.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from functools import lru_cache
+
+BRUSH_DIAMOND = "DIAMOND"
+BRUSH_SQUARE = "SQUARE"
+BRUSH_DISC = "DISC"
+BRUSH_SHAPES = (
+    BRUSH_DIAMOND,
+    BRUSH_SQUARE,
+    BRUSH_DISC,
+)
+
+
+@dataclass(frozen=True)
+class BrushStencil:
+
+    shape: str
+    size: int
+    # spans[dx + size] == (dy_start, dy_end), the rows covered in column dx (end exclusive).
+    spans: tuple[tuple[int, int], ...]
+
+    def clipped_spans(self, px: int, py: int, width: int, height: int):
+        """
+        Yield (x, y_start, y_end) for every non-empty column of the stamp centred on (px, py),
+        clipped to a width x height grid.
+
+        Complexity: O(size) -- the columns are clipped once, then each span in O(1).
+        """
+        size = self.size
+        spans = self.spans
+        for x in range(max(px - size, 0), min(px + size + 1, width)):
+            dy_start, dy_end = spans[x - px + size]
+            y_start = max(py + dy_start, 0)
+            y_end = min(py + dy_end, height)
+            if y_start < y_end:
+                yield x, y_start, y_end
+
+    def cells(self, px: int, py: int, width: int, height: int):
+        """Yield every (x, y) covered by the stamp centred on (px, py), clipped to the grid."""
+        for x, y_start, y_end in self.clipped_spans(px, py, width, height):
+            for y in range(y_start, y_end):
+                yield x, y
+
+
+def _half_height(shape: str, size: int, dx: int) -> int:
+    """How far a brush column at offset dx extends up and down from the centre."""
+    if shape == BRUSH_DIAMOND:
+        return size - abs(dx)
+    if shape == BRUSH_SQUARE:
+        return size
+    # Disc of radius size + 1/2, so small discs are not just diamonds.
+    dy = 0
+    while (dy + 1) * (dy + 1) + dx * dx <= size * size + size:
+        dy += 1
+    return dy
+
+
+@lru_cache(maxsize=None)
+def get_stencil(shape: str, size: int) -> BrushStencil:
+    """
+    Get the (cached) stencil for a brush shape and size.
+
+    Raises:
+    - ValueError: if the shape is not one of BRUSH_SHAPES, or size is negative.
+    """
+    if shape not in BRUSH_SHAPES:
+        raise ValueError(f"Invalid brush shape {shape!r}, must be one of {BRUSH_SHAPES}")
+    if size < 0:
+        raise ValueError("Brush size must be non-negative")
+    spans = []
+    for dx in range(-size, size + 1):
+        half = _half_height(shape, size, dx)
+        spans.append((-half, half + 1))
+    return BrushStencil(shape, size, tuple(spans))
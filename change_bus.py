@@ -0,0 +1,119 @@
+"""
+Change notifications for grids.
+
+Whatever changes a layer store on a grid reports the square to the grid's
+ChangeBus (through Grid.mark_dirty), and changes to the whole grid (special,
+restore) are reported once, rather than square by square. Changes are
+collected until publish() is called, usually once a frame, and then handed
+to every subscriber as one GridChanges batch: a set of squares (so a square
+changed many times is reported once), which can also be walked chunk by
+chunk. Subscribers can then do work in proportion to what changed, instead
+of polling every square.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Callable, Iterator
+
+# Chunks are CHUNK_SIZE x CHUNK_SIZE squares.
+CHUNK_SIZE = 16
+
+
+@dataclass
+class GridChanges:
+    """The squares of a width x height grid that changed between two publishes."""
+
+    width: int
+    height: int
+    squares: set[tuple[int, int]] = field(default_factory=set)
+    # Every square changed; squares is then left empty.
+    everything: bool = False
+    chunk_size: int = CHUNK_SIZE
+
+    def __len__(self) -> int:
+        return self.width * self.height if self.everything else len(self.squares)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        """Every changed square, (x, y)."""
+        if self.everything:
+            return ((x, y) for x in range(self.width) for y in range(self.height))
+        return iter(self.squares)
+
+    def __contains__(self, square: tuple[int, int]) -> bool:
+        return self.everything or square in self.squares
+
+    def chunks(self) -> dict[tuple[int, int], list[tuple[int, int]]]:
+        """
+        The changed squares coalesced by chunk: {(chunk x, chunk y): [(x, y)]},
+        where square (x, y) is in chunk (x // chunk_size, y // chunk_size).
+
+        :complexity: O(c), where c is the number of changed squares.
+        """
+        chunks: dict[tuple[int, int], list[tuple[int, int]]] = {}
+        for x, y in self:
+            chunks.setdefault((x // self.chunk_size, y // self.chunk_size), []).append((x, y))
+        return chunks
+
+    def bounds(self) -> tuple[int, int, int, int] | None:
+        """The bounding box (left, bottom, right, top; right and top exclusive) of the changes, or None if there are none."""
+        if self.everything:
+            return 0, 0, self.width, self.height
+        if not self.squares:
+            return None
+        xs = [x for x, _ in self.squares]
+        ys = [y for _, y in self.squares]
+        return min(xs), min(ys), max(xs) + 1, max(ys) + 1
+
+
+class ChangeBus:
+    """Collects the changes to a grid, and publishes them to subscribers in batches."""
+
+    def __init__(self, width: int, height: int, chunk_size: int = CHUNK_SIZE) -> None:
+        self.width = width
+        self.height = height
+        self.chunk_size = chunk_size
+        self.subscribers: list[Callable[[GridChanges], None]] = []
+        self.pending = GridChanges(width, height, chunk_size=chunk_size)
+
+    def subscribe(self, callback: Callable[[GridChanges], None]) -> Callable[[GridChanges], None]:
+        """Call callback with every batch of changes published from now on. Returns callback (to unsubscribe with)."""
+        self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback: Callable[[GridChanges], None]) -> None:
+        """
+        Stop calling callback.
+
+        :raises ValueError: if it isn't subscribed.
+        """
+        self.subscribers.remove(callback)
+
+    def changed(self, x: int, y: int) -> None:
+        """Report a change to square (x, y). :complexity: O(1)"""
+        if not self.pending.everything:
+            self.pending.squares.add((x, y))
+
+    def changed_all(self) -> None:
+        """Report a change to every square. :complexity: O(1)"""
+        self.pending.everything = True
+        self.pending.squares = set()
+
+    def publish(self) -> GridChanges | None:
+        """
+        Hand the changes reported since the last publish to every subscriber, in the order they subscribed.
+        Returns the batch, or None (and no one is called) if nothing changed.
+
+        :complexity: O(s) calls, where s is the number of subscribers.
+        """
+        changes = self.pending
+        if not changes.everything and not changes.squares:
+            return None
+        self.pending = GridChanges(self.width, self.height, chunk_size=self.chunk_size)
+        for callback in list(self.subscribers):
+            callback(changes)
+        return changes
+
+    def __getstate__(self) -> dict:
+        # As with Grid.copy, an unpickled grid starts afresh: subscribers belong to this process
+        # (and are often bound methods of windows), and the changes pending are theirs.
+        return {**self.__dict__, "subscribers": [], "pending": GridChanges(self.width, self.height, chunk_size=self.chunk_size)}
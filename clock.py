@@ -0,0 +1,63 @@
+"""
+Clocks for MyWindow, and for scripts that drive one.
+
+A clock is called for the current time in seconds (as the clock= arguments
+of Autosaver and ReplayTracker.play_for are), and can be slept on.
+WallClock is the real time. VirtualClock only moves when it is slept on,
+and then a frame at a time: for each frame it passes, it calls its frame
+callbacks (usually a window's on_update and drawing) with the frame's
+length. So a script that paints, sleeps and paints again plays out the
+same, frame for frame, every time, and as fast as the frames can be worked
+out, rather than in real time.
+"""
+
+from __future__ import annotations
+import time
+from typing import Callable
+
+FRAME_TIME = 1 / 60
+
+
+class WallClock:
+    """The real time (time.monotonic), slept on with time.sleep."""
+
+    def __call__(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """Time that passes a frame at a time, only when slept on."""
+
+    def __init__(self, frame_time: float = FRAME_TIME, start: float = 0.0) -> None:
+        self.frame_time = frame_time
+        self.start = start
+        self.frames = 0
+        # Time slept on but not yet a whole frame.
+        self.pending = 0.0
+        self.on_frame: list[Callable[[float], None]] = []
+
+    def __call__(self) -> float:
+        return self.start + self.frames * self.frame_time
+
+    def sleep(self, seconds: float) -> None:
+        """
+        Pass as many whole frames as fit in seconds (with what was left over from the sleeps before),
+        calling every frame callback for each, in the order they were added.
+
+        :complexity: O(f * c), where f is the number of frames passed and c the cost of the callbacks.
+        """
+        self.pending += seconds
+        # Allow for rounding, so that sleeping 0.1 six times passes exactly 36 frames of 1/60.
+        frames = int(self.pending / self.frame_time + 1e-9)
+        self.pending = max(0.0, self.pending - frames * self.frame_time)
+        for _ in range(frames):
+            self.tick()
+
+    def tick(self) -> None:
+        """Pass a single frame."""
+        self.frames += 1
+        for callback in list(self.on_frame):
+            callback(self.frame_time)
@@ -3,6 +3,8 @@
     Items to store should be of time ListItem.
 """
 
+from heapq import merge as merge_sorted
+from typing import Iterable
 from data_structures.referential_array import ArrayR
 from data_structures.sorted_list_adt import *
 
@@ -50,30 +52,37 @@ class ArraySortedList(SortedList[T]):
             raise IndexError('Element should be inserted in sorted order')
 
     def __contains__(self, item: ListItem):
-        """ Checks if value is in the list. """
-        for i in range(len(self)):
-            if self.array[i] == item:
-                return True
-        return False
+        """ Checks if value is in the list.
+        :complexity: O(log n + d), where d is the number of items with the same key.
+        """
+        try:
+            self.index(item)
+        except ValueError:
+            return False
+        return True
 
     def _shuffle_right(self, index: int) -> None:
         """ Shuffle items to the right up to a given position. """
-        for i in range(len(self), index, -1):
-            self.array[i] = self.array[i - 1]
+        self.array.shift(index, len(self), 1)
 
     def _shuffle_left(self, index: int) -> None:
         """ Shuffle items starting at a given position to the left. """
-        for i in range(index, len(self)):
-            self.array[i] = self.array[i + 1]
+        self.array.shift(index + 1, len(self) + 1, -1)
+        # the last position still refers to the last item; let it go
+        self.array[len(self)] = None
 
     def _resize(self) -> None:
         """ Resize the list. """
-        # doubling the size of our list
-        new_array = ArrayR(2 * len(self.array))
+        self._reserve(2 * len(self.array))
+
+    def _reserve(self, capacity: int) -> None:
+        """ Grow the array to hold at least capacity items. """
+        if capacity <= len(self.array):
+            return
+        new_array = ArrayR(capacity)
 
         # copying the contents
-        for i in range(self.length):
-            new_array[i] = self.array[i]
+        new_array.copy_from(self.array, count=self.length)
 
         # referring to the new array
         self.array = new_array
@@ -88,12 +97,45 @@ class ArraySortedList(SortedList[T]):
         return item
 
     def index(self, item: ListItem) -> int:
-        """ Find the position of a given item in the list. """
-        pos = self._index_to_add(item)
-        if pos < len(self) and self[pos] == item:
-            return pos
+        """ Find the position of a given item in the list.
+        Binary search finds the first item with its key; only items with the same key are compared to it.
+        :complexity: O(log n + d), where d is the number of items with the same key.
+        :raises ValueError: if the item is not in the list.
+        """
+        pos = self._lower_bound(item.key)
+        while pos < len(self) and self.array[pos].key == item.key:
+            if self.array[pos] == item:
+                return pos
+            pos += 1
         raise ValueError('item not in list')
 
+    def _lower_bound(self, key) -> int:
+        """ Find the position of the first item with a key no less than key. """
+        low = 0
+        high = len(self)
+        while low < high:
+            mid = (low + high) // 2
+            if self.array[mid].key < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def merge(self, items: Iterable[ListItem]) -> None:
+        """ Add many items at once. They are sorted by key (stably) and merged with the list in a single pass,
+        rather than being shuffled in one at a time; items with equal keys go after those already in the list.
+        :complexity: O(n + k) for k items already in order (O(n + k log k) otherwise), rather than O(k * n).
+        """
+        items = sorted(items, key=lambda item: item.key)
+        if not items:
+            return
+        needed = len(self) + len(items)
+        if needed > len(self.array):
+            self._reserve(max(needed, 2 * len(self.array)))
+        merged = list(merge_sorted(self.array[:len(self)], items, key=lambda item: item.key))
+        self.array[:len(merged)] = merged
+        self.length = len(merged)
+
     def is_full(self):
         """ Check if the list is full. """
         return len(self) >= len(self.array)
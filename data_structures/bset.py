@@ -3,6 +3,7 @@
 """
 
 from __future__ import annotations
+from typing import Iterator
 from data_structures.set_adt import Set
 
 class BSet(Set[int]):
@@ -36,14 +37,46 @@ class BSet(Set[int]):
 
     def __len__(self) -> int:
         """
-        Size computation. The most expensive operation.
-        Use int.bit_length(your_integer) to calculate the bit length.
+        Size computation: the number of bits set.
+        :complexity: O(w / 64), where w is the bit length of elems (a popcount, in C).
         """
-        res = 0
-        for item in range(1, int.bit_length(self.elems) + 1):
-            if item in self:
-                res += 1
-        return res
+        return self.elems.bit_count()
+
+    def __iter__(self) -> Iterator[int]:
+        """ Iterates over the elements, smallest first, by extracting the lowest set bit each time.
+        :complexity: O(w / 64) per element, where w is the bit length of elems.
+        """
+        bit_elems = self.elems
+        while bit_elems:
+            lowest = bit_elems & -bit_elems
+            yield lowest.bit_length()
+            bit_elems ^= lowest
+
+    def rank(self, item: int) -> int:
+        """ The number of elements smaller than item.
+        :complexity: O(w / 64), where w is the bit length of elems.
+        :raises TypeError: if the item is not integer or if not positive.
+        """
+        if not isinstance(item, int) or item <= 0:
+            raise TypeError('Set elements should be integers')
+        return (self.elems & ((1 << (item - 1)) - 1)).bit_count()
+
+    def select(self, k: int) -> int:
+        """ The element with k elements smaller than it (the smallest for k = 0),
+        found by binary search over the bit positions, counting the bits below each.
+        :complexity: O(log w * w / 64), where w is the bit length of elems.
+        :raises IndexError: if k is not in between 0 and len(self) - 1.
+        """
+        if not 0 <= k < len(self):
+            raise IndexError('Set has no element of rank {0}'.format(k))
+        low, high = 1, self.elems.bit_length()
+        while low < high:
+            mid = (low + high) // 2
+            if (self.elems & ((1 << mid) - 1)).bit_count() > k:
+                high = mid
+            else:
+                low = mid + 1
+        return low
 
     def add(self, item: int) -> None:
         """ Adds an element to the set.
@@ -93,15 +126,7 @@ class BSet(Set[int]):
 
     def __str__(self):
         """ Construct a nice string representation. """
-        bit_elems = self.elems
-        out_elems = []
-        current = 0
-        while bit_elems:
-            if bit_elems & (1 << current):
-                out_elems.append(str(current+1))
-                bit_elems &= ~(1 << current)
-            current += 1
-        return '{' + ', '.join(out_elems) + '}'
+        return '{' + ', '.join(map(str, self)) + '}'
 
 if __name__ == '__main__':
     s = BSet(3)
@@ -8,7 +8,7 @@ __docformat__ = 'reStructuredText'
 
 import unittest
 from abc import ABC, abstractmethod
-from typing import Generic
+from typing import Generic, Iterator
 from data_structures.referential_array import ArrayR, T
 
 class Queue(ABC, Generic[T]):
@@ -99,6 +99,95 @@ class CircularQueue(Queue[T]):
         self.front = 0
         self.rear = 0
 
+    def peek_at(self, index: int) -> T:
+        """ Returns the element index places behind the front (0 is the front), without serving anything.
+        :raises IndexError: if there are not that many elements
+        :complexity: O(1)
+        """
+        if not 0 <= index < self.length:
+            raise IndexError("Queue index out of range")
+        return self.array[(self.front+index) % len(self.array)]
+
+    def __iter__(self) -> Iterator[T]:
+        """ The elements from front to rear (the order serve would return them), leaving the queue as is. """
+        array, capacity = self.array, len(self.array)
+        for i in range(self.front, self.front+self.length):
+            yield array[i % capacity]
+
+    def __reversed__(self) -> Iterator[T]:
+        """ The elements from rear to front. """
+        array, capacity = self.array, len(self.array)
+        for i in range(self.front+self.length-1, self.front-1, -1):
+            yield array[i % capacity]
+
+
+class GrowableCircularQueue(CircularQueue[T]):
+    """ Circular queue that is never full: the array doubles when an append needs more room.
+
+    Attributes:
+         initial_capacity (int): capacity the array starts with, and never shrinks below
+         shrink (bool): whether to halve the array once it is a quarter full
+
+    On a resize the elements are unwrapped into the new array, front first, so
+    front goes back to 0. As with GrowableArrayStack, appends and serves are O(1) amortised.
+    """
+    INITIAL_CAPACITY = 4
+
+    def __init__(self, initial_capacity: int = INITIAL_CAPACITY, shrink: bool = False) -> None:
+        CircularQueue.__init__(self, initial_capacity)
+        self.initial_capacity = len(self.array)
+        self.shrink = shrink
+
+    def is_full(self) -> bool:
+        """ Never true: the queue grows instead. """
+        return False
+
+    def append(self, item: T) -> None:
+        """ Adds an element to the rear of the queue.
+        :complexity: O(1) amortised, O(n) when the array doubles
+        """
+        if self.length == len(self.array):
+            self._resize(2 * len(self.array))
+        CircularQueue.append(self, item)
+
+    def serve(self) -> T:
+        """ Deletes and returns the element at the queue's front, dropping the array's reference to it.
+        :pre: queue is not empty
+        :raises Exception: if the queue is empty
+        :complexity: O(1) amortised, O(n) when the array halves
+        """
+        front = self.front
+        item = CircularQueue.serve(self)
+        self.array[front] = None
+        if self.shrink and 4 * self.length <= len(self.array) and len(self.array) > self.initial_capacity:
+            self._resize(max(self.initial_capacity, len(self.array) // 2))
+        return item
+
+    def clear(self) -> None:
+        """ Clears all elements from the queue, and gives back the array's memory. """
+        CircularQueue.clear(self)
+        self.array = ArrayR(self.initial_capacity)
+
+    def copy(self) -> 'GrowableCircularQueue[T]':
+        """ A queue with the same elements (not copies of them), in the same places.
+        :complexity: O(capacity)
+        """
+        other = GrowableCircularQueue.__new__(GrowableCircularQueue)
+        other.__dict__.update(self.__dict__)
+        other.array = ArrayR(len(self.array))
+        other.array.copy_from(self.array)
+        return other
+
+    def _resize(self, capacity: int) -> None:
+        array = ArrayR(capacity)
+        # The elements run from front to the end of the array, then wrap round to the start.
+        first = min(self.length, len(self.array) - self.front)
+        array.copy_from(self.array, 0, self.front, first)
+        array.copy_from(self.array, first, 0, self.length - first)
+        self.array = array
+        self.front = 0
+        self.rear = self.length % capacity
+
 
 class TestQueue(unittest.TestCase):
     """ Tests for the above class."""
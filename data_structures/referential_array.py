@@ -12,12 +12,20 @@ space to hold the references.
 Note that while I do check the precondition in __init__ (noone else
 would), I do not check that of getitem or setitem, since that is already
 checked by self.array[index].
+
+Slices of a ctypes array are read and written in C, so the bulk operations
+(slices, copy_from, fill, shift and iteration) move k references for about
+the cost of moving one from Python. Moving references with a raw memmove
+would skip their reference counts, so shift goes through slices instead,
+which have memmove semantics (overlapping ranges are fine).
 """
+from __future__ import annotations
+
 __author__ = "Julian Garcia for the __init__ code, Maria Garcia de la Banda for the rest"
 __docformat__ = 'reStructuredText'
 
 from ctypes import py_object
-from typing import TypeVar, Generic
+from typing import TypeVar, Generic, Iterator
 
 T = TypeVar('T')
 
@@ -30,7 +38,7 @@ class ArrayR(Generic[T]):
         if length <= 0:
             raise ValueError("Array length should be larger than 0.")
         self.array = (length * py_object)() # initialises the space
-        self.array[:] =  [None for _ in range(length)]
+        self.array[:] = [None] * length
 
     def __len__(self) -> int:
         """ Returns the length of the array
@@ -38,16 +46,72 @@ class ArrayR(Generic[T]):
         """
         return len(self.array)
 
-    def __getitem__(self, index: int) -> T:
-        """ Returns the object in position index.
-        :complexity: O(1)
+    def __getitem__(self, index: int | slice) -> T | list[T]:
+        """ Returns the object in position index, or a list of the objects in a slice.
+        :complexity: O(1), or O(k) for a slice of k objects (copied in C)
         :pre: index in between 0 and length - self.array[] checks it
         """
         return self.array[index]
 
-    def __setitem__(self, index: int, value: T) -> None:
-        """ Sets the object in position index to value
-        :complexity: O(1)
+    def __setitem__(self, index: int | slice, value: T) -> None:
+        """ Sets the object in position index to value, or the objects in a slice
+        to those in value (a sequence or ArrayR with as many objects as the slice).
+        :complexity: O(1), or O(k) for a slice of k objects (copied in C)
         :pre: index in between 0 and length - self.array[] checks it
+        :raises ValueError: if value doesn't have as many objects as the slice
         """
+        if isinstance(value, ArrayR):
+            value = value.array[:]
         self.array[index] = value
+
+    def __iter__(self) -> Iterator[T]:
+        """ Iterates over every object in the array, in order.
+        :complexity: O(1) per object
+        """
+        return iter(self.array)
+
+    def copy_from(self, source: ArrayR[T], start: int = 0, source_start: int = 0, count: int | None = None) -> None:
+        """ Copies count objects from source (which may be this array), starting at source_start,
+        into this array starting at start. By default, as many as fit from both.
+        :complexity: O(count), copied in C
+        :raises IndexError: if either range is out of bounds
+        """
+        if count is None:
+            count = min(len(source) - source_start, len(self) - start)
+        if count < 0 or min(start, source_start) < 0 or source_start + count > len(source) or start + count > len(self):
+            raise IndexError("Range out of bounds.")
+        self.array[start:start + count] = source.array[source_start:source_start + count]
+
+    def fill(self, value: T, start: int = 0, end: int | None = None) -> None:
+        """ Sets every position from start up to (not including) end to value.
+        :complexity: O(end - start), in C
+        :raises IndexError: if the range is out of bounds
+        """
+        end = len(self) if end is None else end
+        if not 0 <= start <= end <= len(self):
+            raise IndexError("Range out of bounds.")
+        self.array[start:end] = [value] * (end - start)
+
+    def shift(self, start: int, end: int, offset: int) -> None:
+        """ Moves the objects from start up to (not including) end by offset positions
+        (right if positive, left if negative), as memmove would: the ranges may overlap, and the
+        positions moved out of keep their objects.
+        :complexity: O(end - start), in C
+        :raises IndexError: if either range is out of bounds
+        """
+        self.copy_from(self, start + offset, start, end - start)
+
+    def __reduce__(self):
+        """ Pickles the array by its contents, as ctypes arrays of references cannot be pickled
+        :complexity: O(length)
+        """
+        return _rebuild_array, (list(self.array),)
+
+
+def _rebuild_array(items: list) -> ArrayR:
+    """ Unpickles an ArrayR.
+    :complexity: O(length)
+    """
+    array = ArrayR(len(items))
+    array[:] = items
+    return array
@@ -8,7 +8,7 @@ __docformat__ = 'reStructuredText'
 
 import unittest
 from abc import ABC, abstractmethod
-from typing import TypeVar, Generic
+from typing import TypeVar, Generic, Iterator
 from data_structures.referential_array import ArrayR, T
 
 class Stack(ABC, Generic[T]):
@@ -99,6 +99,89 @@ class ArrayStack(Stack[T]):
             raise Exception("Stack is empty")
         return self.array[self.length-1]
 
+    def peek_at(self, index: int) -> T:
+        """ Returns the element index places below the top (0 is the top), without popping anything.
+        :raises IndexError: if there are not that many elements
+        :complexity: O(1)
+        """
+        if not 0 <= index < self.length:
+            raise IndexError("Stack index out of range")
+        return self.array[self.length-1-index]
+
+    def __iter__(self) -> Iterator[T]:
+        """ The elements from the top down (the order pop would return them), leaving the stack as is. """
+        for i in range(self.length-1, -1, -1):
+            yield self.array[i]
+
+    def __reversed__(self) -> Iterator[T]:
+        """ The elements from the bottom up (the order they were pushed). """
+        for i in range(self.length):
+            yield self.array[i]
+
+
+class GrowableArrayStack(ArrayStack[T]):
+    """ Array stack that is only full at max_capacity (if any): the array doubles when a push needs more room.
+
+    Attributes:
+         initial_capacity (int): capacity the array starts with, and never shrinks below
+         shrink (bool): whether to halve the array once it is a quarter full
+         max_capacity (int|None): capacity the array never grows beyond, or None for no limit
+
+    Doubling means n pushes copy O(n) elements in all, so a push is O(1) amortised.
+    Halving only at a quarter (rather than a half) full keeps pushes and pops that
+    alternate at a boundary from resizing every time.
+    """
+    INITIAL_CAPACITY = 4
+
+    def __init__(self, initial_capacity: int = INITIAL_CAPACITY, shrink: bool = False,
+                 max_capacity: int|None = None) -> None:
+        if max_capacity is not None:
+            initial_capacity = min(initial_capacity, max_capacity)
+        ArrayStack.__init__(self, initial_capacity)
+        self.initial_capacity = len(self.array)
+        self.shrink = shrink
+        self.max_capacity = max_capacity
+
+    def is_full(self) -> bool:
+        """ True only if the stack holds max_capacity elements: otherwise it grows instead. """
+        return self.max_capacity is not None and self.length >= self.max_capacity
+
+    def push(self, item: T) -> None:
+        """ Pushes an element to the top of the stack.
+        :pre: stack is not full
+        :raises Exception: if the stack is full
+        :complexity: O(1) amortised, O(n) when the array doubles
+        """
+        if self.is_full():
+            raise Exception("Stack is full")
+        if self.length == len(self.array):
+            capacity = 2 * len(self.array)
+            self._resize(capacity if self.max_capacity is None else min(capacity, self.max_capacity))
+        self.array[self.length] = item
+        self.length += 1
+
+    def pop(self) -> T:
+        """ Pops the element at the top of the stack, dropping the array's reference to it.
+        :pre: stack is not empty
+        :raises Exception: if the stack is empty
+        :complexity: O(1) amortised, O(n) when the array halves
+        """
+        item = ArrayStack.pop(self)
+        self.array[self.length] = None
+        if self.shrink and 4 * self.length <= len(self.array) and len(self.array) > self.initial_capacity:
+            self._resize(max(self.initial_capacity, len(self.array) // 2))
+        return item
+
+    def clear(self) -> None:
+        """ Clears all elements from the stack, and gives back the array's memory. """
+        Stack.clear(self)
+        self.array = ArrayR(self.initial_capacity)
+
+    def _resize(self, capacity: int) -> None:
+        array = ArrayR(capacity)
+        array.copy_from(self.array, 0, 0, self.length)
+        self.array = array
+
 class TestStack(unittest.TestCase):
     """ Tests for the above class."""
     EMPTY = 0
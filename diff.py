@@ -0,0 +1,108 @@
+"""
+Differences between two grids (or a grid and a snapshot of it).
+
+Grids keep a hash of every square in flat arrays, one per column, plus a
+hash per column and one for the whole grid (see Grid.state_hash). Finding
+the squares that differ is then a matter of comparing hashes, from the top
+down: equal grid hashes mean no differences at all; only columns whose
+hashes differ are looked into; and those are compared a block of squares at
+a time, as slices of their arrays, before single squares are. Layer stores
+are only looked at for the squares that differ, to report what changed.
+
+Hashes are 64 bits, so two different squares are taken to be the same with
+a probability of about 2^-64.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+
+from grid import Grid
+from layer_util import Layer
+
+# Squares of a column compared at once, before looking for the ones that differ.
+BLOCK = 64
+
+
+@dataclass
+class CellDiff:
+    """A square that differs between two grids, with the layers applied to it in each."""
+
+    position: tuple[int, int]
+    before: list[Layer]
+    after: list[Layer]
+
+    @property
+    def added(self) -> list[Layer]:
+        """Layers in after but not in before (counting repeats), in the order they are applied."""
+        return _without(self.after, self.before)
+
+    @property
+    def removed(self) -> list[Layer]:
+        """Layers in before but not in after (counting repeats), in the order they were applied."""
+        return _without(self.before, self.after)
+
+
+def _without(layers: list[Layer], others: list[Layer]) -> list[Layer]:
+    remaining = list(others)
+    result = []
+    for layer in layers:
+        if layer in remaining:
+            remaining.remove(layer)
+        else:
+            result.append(layer)
+    return result
+
+
+def _check(a: Grid, b: Grid) -> None:
+    if not isinstance(a, Grid) or not isinstance(b, Grid):
+        raise TypeError("can only diff two Grids")
+    if (a.draw_style, a.x, a.y) != (b.draw_style, b.x, b.y):
+        raise ValueError("can only diff grids with the same draw style and dimensions")
+
+
+def changed_columns(a: Grid, b: Grid) -> list[int]:
+    """
+    The x of every column with a square that differs between a and b.
+
+    :raises TypeError: if a or b is not a Grid.
+    :raises ValueError: if they don't have the same draw style and dimensions.
+    :complexity: O(1) if the grids are the same, otherwise O(x); plus O(u) to bring the hashes up to date,
+        where u is the number of squares changed since they were last hashed.
+    """
+    _check(a, b)
+    if a.state_hash() == b.state_hash():
+        return []
+    columns_a, columns_b = a.column_hashes, b.column_hashes
+    return [x for x in range(a.x) if columns_a[x] != columns_b[x]]
+
+
+def changed_squares(a: Grid, b: Grid) -> list[tuple[int, int]]:
+    """
+    The (x, y) of every square that differs between a and b, column by column.
+
+    :raises TypeError: if a or b is not a Grid.
+    :raises ValueError: if they don't have the same draw style and dimensions.
+    :complexity: O(x + c * (y / BLOCK + d * BLOCK)) in the worst case, where c is the number of columns
+        that differ and d the number of squares that differ in each (see changed_columns for the best case).
+        Block comparisons are done in C, so sparse changes to even a million squares take a few milliseconds.
+    """
+    squares = []
+    for x in changed_columns(a, b):
+        column_a, column_b = a.square_hashes[x], b.square_hashes[x]
+        for start in range(0, a.y, BLOCK):
+            end = min(start + BLOCK, a.y)
+            if column_a[start:end] == column_b[start:end]:
+                continue
+            squares.extend((x, y) for y in range(start, end) if column_a[y] != column_b[y])
+    return squares
+
+
+def diff(a: Grid, b: Grid) -> list[CellDiff]:
+    """
+    Every square that differs between a (before) and b (after), with the layers applied to it in each.
+
+    :raises TypeError: if a or b is not a Grid.
+    :raises ValueError: if they don't have the same draw style and dimensions.
+    :complexity: as changed_squares, plus O(n) for each square that differs, where n is the number of layers in it.
+    """
+    return [CellDiff((x, y), a[x][y].stack(), b[x][y].stack()) for x, y in changed_squares(a, b)]
@@ -0,0 +1,234 @@
+"""
+Headless export of recorded sessions to images.
+
+Reads a replay journal, and renders the canvas every few actions as a PNG
+sequence, or an animated GIF or APNG, without opening a window.
+
+For a PNG sequence, the journal is played once, taking a keyframe (a copy of
+the grid) at the start of every chunk of frames. Chunks are then rendered in
+parallel by a process pool: each worker starts from its chunk's keyframe, and
+plays only the actions between its frames.
+
+Animations hold, in each frame, only the rectangle that changed since the
+previous one (see animation.py). With one worker they are rendered in a
+single pass, which only recolours the squares that changed. With more, the
+chunks of frames are rendered in parallel as for PNGs, and the frames are
+compared and encoded here, in order.
+
+Usage: python export.py session.paj out_dir [--every N] [--scale S] [--gif | --apng] [--workers N]
+"""
+
+from __future__ import annotations
+import argparse
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+from animation import APNGWriter, FrameDiffer, GIFWriter, PixelDiffer
+from grid import Grid, SpecialCheckpoint
+from replay import ReplayTracker
+
+# As MyWindow.BG.
+BACKGROUND = (255, 255, 255)
+# Seconds between frames, used as the timestamp animated layers see, and as the GIF frame duration.
+FRAME_DURATION = 0.05
+# Aim for this many chunks per worker, so workers that finish early can pick up more.
+CHUNKS_PER_WORKER = 4
+ANIMATION_WRITERS = {"gif": GIFWriter, "apng": APNGWriter}
+ANIMATION_NAMES = {"gif": "replay.gif", "apng": "replay.png"}
+
+
+def frame_positions(action_count: int, every: int) -> list[int]:
+    """
+    The number of actions played before each frame: every `every` actions, ending with all of them.
+    Frame 0 is the empty canvas.
+    """
+    positions = list(range(0, action_count, every))
+    positions.append(action_count)
+    return positions
+
+
+def render(grid: Grid, timestamp: float, background=BACKGROUND) -> bytes:
+    """
+    The colours of the grid as RGB bytes, one byte triple per square,
+    in rows from the top of the canvas (the highest y) down, as the window shows it.
+    """
+    pixels = bytearray(grid.x * grid.y * 3)
+    for x in range(grid.x):
+        column = grid[x]
+        for y in range(grid.y):
+            i = ((grid.y - 1 - y) * grid.x + x) * 3
+            pixels[i:i + 3] = bytes(column[y].get_color(background, timestamp, x, y))
+    return bytes(pixels)
+
+
+def to_image(grid_x: int, grid_y: int, pixels: bytes, scale: int):
+    """An image of rendered pixels, each square scaled up to scale x scale pixels."""
+    from PIL import Image
+    image = Image.frombytes("RGB", (grid_x, grid_y), pixels)
+    if scale != 1:
+        image = image.resize((grid_x * scale, grid_y * scale), getattr(Image, "Resampling", Image).NEAREST)
+    return image
+
+
+def frame_path(out_dir: str, frame: int) -> str:
+    return os.path.join(out_dir, f"frame_{frame:05d}.png")
+
+
+def _open_for_export(path: str) -> ReplayTracker:
+    """A tracker for the journal at path, to be played forwards only."""
+    tracker = ReplayTracker.from_journal(path)
+    # Seeking backwards is never needed, so no keyframes are worth taking.
+    tracker.KEYFRAME_INTERVAL = sys.maxsize
+    return tracker
+
+
+def _render_frames(path: str, keyframe: Grid, checkpoints: tuple[SpecialCheckpoint, ...],
+                   frames: list[tuple[int, int]]) -> Iterator[tuple[int, bytes]]:
+    """
+    Render frames [(frame number, position)] of a journal, in order, starting from the keyframe
+    (the grid after frames[0]'s position actions, with the checkpoints of the specials not undone by then),
+    yielding (frame number, pixels) for each.
+    """
+    tracker = _open_for_export(path)
+    try:
+        tracker.start_replay(frames[0][1], checkpoints)
+        grid = keyframe
+        for frame, position in frames:
+            tracker.play_actions(grid, position - tracker.position)
+            yield frame, render(grid, frame * FRAME_DURATION)
+    finally:
+        tracker.close()
+
+
+def render_chunk(path: str, keyframe: Grid, checkpoints: tuple[SpecialCheckpoint, ...], frames: list[tuple[int, int]],
+                 scale: int, out_dir: str) -> None:
+    """Render frames of a journal from a keyframe (see _render_frames), writing them as PNGs into out_dir."""
+    for frame, pixels in _render_frames(path, keyframe, checkpoints, frames):
+        to_image(keyframe.x, keyframe.y, pixels, scale).save(frame_path(out_dir, frame))
+
+
+def render_chunk_pixels(path: str, keyframe: Grid, checkpoints: tuple[SpecialCheckpoint, ...],
+                        frames: list[tuple[int, int]]) -> list[bytes]:
+    """As render_chunk, returning the rendered pixels of each frame rather than writing them out."""
+    return [pixels for _, pixels in _render_frames(path, keyframe, checkpoints, frames)]
+
+
+def plan_chunks(path: str, every: int, chunk_count: int) -> list[tuple[Grid, tuple[SpecialCheckpoint, ...], list[tuple[int, int]]]]:
+    """
+    Play the journal once, splitting its frames into chunk_count contiguous chunks,
+    and taking a keyframe at the start of each, with the checkpoints of the specials not undone by then
+    (so a chunk can undo them): [(keyframe, checkpoints, [(frame number, position)])].
+    """
+    tracker = _open_for_export(path)
+    frames = list(enumerate(frame_positions(len(tracker), every)))
+    size = math.ceil(len(frames) / chunk_count)
+    grid = tracker.reader.new_grid()
+    tracker.start_replay()
+    chunks = []
+    for start in range(0, len(frames), size):
+        chunk = frames[start:start + size]
+        tracker.play_actions(grid, chunk[0][1] - tracker.position)
+        chunks.append((grid.copy(), tuple(tracker.special_checkpoints), chunk))
+    tracker.close()
+    return chunks
+
+
+def export_animation(path: str, out_path: str, every: int = 1, scale: int = 8, fmt: str = "gif", workers: int = 1) -> int:
+    """
+    Export a journal as an animated GIF or APNG (fmt "gif" or "apng") at out_path.
+    Frames only hold the rectangle that changed since the previous frame,
+    or a single unchanged square if nothing did (so every frame is kept, with its own duration).
+    With more than one worker, frames are rendered by that many processes, and only compared and encoded here.
+    Returns the number of frames.
+
+    Raises:
+    - ValueError: if every or scale is not positive, or fmt is not a known format.
+    - JournalError: if path is not a journal.
+    """
+    if every <= 0 or scale <= 0:
+        raise ValueError("every and scale must be positive")
+    if fmt not in ANIMATION_WRITERS:
+        raise ValueError(f"fmt must be one of {tuple(ANIMATION_WRITERS)}")
+    if workers > 1:
+        return _export_animation_parallel(path, out_path, every, scale, fmt, workers)
+    tracker = _open_for_export(path)
+    positions = frame_positions(len(tracker), every)
+    grid = tracker.reader.new_grid()
+    tracker.start_replay()
+    differ = FrameDiffer(grid, BACKGROUND)
+    with ANIMATION_WRITERS[fmt](out_path, grid.x, grid.y, scale, len(positions)) as writer:
+        for frame, position in enumerate(positions):
+            tracker.play_actions(grid, position - tracker.position)
+            grid.changes.publish()
+            rect = differ.update(grid, frame * FRAME_DURATION) or (0, 0, 1, 1)
+            writer.add_frame(rect, differ.crop(rect), round(FRAME_DURATION * 1000))
+    tracker.close()
+    return len(positions)
+
+
+def _export_animation_parallel(path: str, out_path: str, every: int, scale: int, fmt: str, workers: int) -> int:
+    chunks = plan_chunks(path, every, workers * CHUNKS_PER_WORKER)
+    frame_count = sum(len(frames) for _, _, frames in chunks)
+    grid = chunks[0][0]
+    differ = PixelDiffer(grid.x, grid.y)
+    with ANIMATION_WRITERS[fmt](out_path, grid.x, grid.y, scale, frame_count) as writer, ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(render_chunk_pixels, path, *chunk) for chunk in chunks]
+        for future in futures:
+            for pixels in future.result():
+                rect = differ.update(pixels) or (0, 0, 1, 1)
+                writer.add_frame(rect, differ.crop(rect), round(FRAME_DURATION * 1000))
+    return frame_count
+
+
+def export(path: str, out_dir: str, every: int = 1, scale: int = 8, gif: bool = False, workers: int|None = None, apng: bool = False) -> int:
+    """
+    Export a journal as frame_NNNNN.png files in out_dir, or as out_dir/replay.gif (or replay.png, for apng).
+    Rendering is spread over `workers` processes (by default, one per core); with 1 it all happens here.
+    Returns the number of frames.
+
+    Raises:
+    - ValueError: if every or scale is not positive.
+    - JournalError: if path is not a journal.
+    """
+    if every <= 0 or scale <= 0:
+        raise ValueError("every and scale must be positive")
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    if gif or apng:
+        fmt = "gif" if gif else "apng"
+        return export_animation(path, os.path.join(out_dir, ANIMATION_NAMES[fmt]), every, scale, fmt, workers)
+
+    chunks = plan_chunks(path, every, workers * CHUNKS_PER_WORKER if workers > 1 else 1)
+    if workers == 1:
+        for chunk in chunks:
+            render_chunk(path, *chunk, scale, out_dir)
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(render_chunk, path, *chunk, scale, out_dir) for chunk in chunks]
+            for future in futures:
+                future.result()
+    return sum(len(frames) for _, _, frames in chunks)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("journal", help="A journal recorded with MyWindow.JOURNAL_PATH set.")
+    p.add_argument("out_dir")
+    p.add_argument("--every", type=int, default=1, help="Actions between frames.")
+    p.add_argument("--scale", type=int, default=8, help="Pixels per grid square.")
+    kind = p.add_mutually_exclusive_group()
+    kind.add_argument("--gif", action="store_true", help="Write out_dir/replay.gif instead of a PNG sequence.")
+    kind.add_argument("--apng", action="store_true", help="Write out_dir/replay.png, an animated PNG, instead of a PNG sequence.")
+    p.add_argument("--workers", type=int, default=None, help="Processes to render with (default: one per core).")
+    args = p.parse_args(argv)
+    started = time.perf_counter()
+    frames = export(args.journal, args.out_dir, args.every, args.scale, args.gif, args.workers, args.apng)
+    print(f"Exported {frames} frames to {args.out_dir} in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,22 @@
 from __future__ import annotations
+from array import array
+from dataclasses import dataclass
 from layer_store import *
 from data_structures.referential_array import *
+from brush import BRUSH_SHAPES, BRUSH_DIAMOND
+from zobrist import square_hash
+from change_bus import ChangeBus
+
+@dataclass
+class SpecialCheckpoint:
+    """
+    The squares a special changed (as x * height + y), with what each store's special changed
+    (its delta, see LayerStore.special_delta).
+    """
+
+    squares: array
+    deltas: list
+
 
 class Grid:
     DRAW_STYLE_SET = "SET"
@@ -15,6 +31,7 @@ class Grid:
     DEFAULT_BRUSH_SIZE = 2
     MAX_BRUSH = 5
     MIN_BRUSH = 0
+    DEFAULT_BRUSH_SHAPE = BRUSH_DIAMOND
 
     def __init__(self, draw_style:str, x:int, y:int) -> None:
         """
@@ -34,7 +51,7 @@ class Grid:
 
         What it does:
         Initialise the grid object.
-        Should also intialise the brush size to the DEFAULT provided as a class variable.
+        Should also intialise the brush size and shape to the DEFAULTs provided as class variables.
         self.grid = ArrayR(x): Create a one dimensional array with x elements.
         for i in range(x): Loop through the x dimension of the grid.
         self.grid[i] = ArrayR(y): Create a new one dimensional array with y elements for each element in the outer array.
@@ -71,6 +88,14 @@ class Grid:
         self.x:int = x #O(1)       
         self.y:int = y #O(1)
         self.brush_size:int = self.DEFAULT_BRUSH_SIZE #O(1)
+        self.brush_shape:str = self.DEFAULT_BRUSH_SHAPE #O(1)
+        self.changes = ChangeBus(x, y) #O(1) -- publishes the squares changed, see mark_dirty
+        self.grid_hash:int = 0 #O(1) -- XOR of square_hashes, see state_hash
+        # square_hashes[x][y] is the contribution of the square to grid_hash, and column_hashes[x] the XOR of column x's.
+        # Kept in flat arrays of 64 bit integers, so columns can be compared in one go (see diff.py).
+        self.square_hashes:list[array] = [array("Q", bytes(8 * y)) for _ in range(x)] #O(xy), but in C
+        self.column_hashes:array = array("Q", bytes(8 * x)) #O(x)
+        self.unhashed:set[tuple[int, int]] = set() #O(1) -- squares changed since grid_hash was last brought up to date
 
         self.grid = ArrayR(x)  #O(x) - Create 1D array with x elements    
 
@@ -83,6 +108,7 @@ class Grid:
                     self.grid[i][j] = AdditiveLayerStore() #O(1)
                 elif self.draw_style == self.DRAW_STYLE_SEQUENCE: #O(1)
                     self.grid[i][j] = SequenceLayerStore() #O(1)
+                self._bind(self.grid[i][j], i, j) #O(1)
         
        
     def __getitem__(self, index:int):
@@ -168,16 +194,262 @@ class Grid:
             self.brush_size -= 1 #O(1)
             
 
-    def special(self):
+    def set_brush_shape(self, shape:str):
         """
-        Args: self
+        Args: 
+        - shape: str, one of brush.BRUSH_SHAPES
 
         Raises:
+        ValueError: if shape is not one of BRUSH_SHAPES
+
+        Returns:
             None
         
+        What it does:
+        Changes the shape of the brush (diamond, square or disc).
+        The brush size is unchanged.
+        
+        Complexity:
+        Best case: O(1)
+        Worst case: O(1)
+        """
+        if shape not in BRUSH_SHAPES: #O(1)
+            raise ValueError(f"Invalid brush shape, must be one of {BRUSH_SHAPES}") #O(1)
+        self.brush_shape = shape #O(1)
+
+    def copy(self) -> Grid:
+        """
+        Args: self
+
+        Raises:
+            None
+
+        Returns:
+            Grid -- an independent copy of this grid (a snapshot)
+
+        What it does:
+        Creates a new grid with the same draw style, dimensions and brush,
+        where every grid square holds a copy of the corresponding layerstore.
+        The constructor is skipped, since it would create empty layerstores only to replace them.
+
+        Complexity:
+        O(xy * c), where xy are the dimensions of the grid and c is the cost of copying a layerstore.
+        """
+        new_grid = Grid.__new__(Grid) #O(1)
+        new_grid.draw_style = self.draw_style #O(1)
+        new_grid.x = self.x #O(1)
+        new_grid.y = self.y #O(1)
+        new_grid.brush_size = self.brush_size #O(1)
+        new_grid.brush_shape = self.brush_shape #O(1)
+        new_grid.changes = ChangeBus(self.x, self.y, self.changes.chunk_size) #O(1) -- a copy starts with no subscribers
+        new_grid.grid_hash = self.grid_hash #O(1)
+        new_grid.square_hashes = [array("Q", column) for column in self.square_hashes] #O(xy), but in C
+        new_grid.column_hashes = array("Q", self.column_hashes) #O(x)
+        new_grid.unhashed = set(self.unhashed) #O(xy)
+        new_grid.grid = ArrayR(self.x) #O(x)
+        for i in range(self.x): #O(x)
+            column = self.grid[i] #O(1)
+            new_column = ArrayR(self.y) #O(y)
+            for j in range(self.y): #O(y)
+                new_column[j] = new_grid._bind(column[j].copy(), i, j) #O(c)
+            new_grid.grid[i] = new_column #O(1)
+        return new_grid
+
+    def __setstate__(self, state: dict):
+        """
+        Args:
+        - state: dict -- the grid's attributes, as pickled
+
+        What it does:
+        Unpickles the grid. Stores are pickled without the grid they are in (see LayerStore.__getstate__),
+        so each is told again which grid and square it is in.
+
+        Complexity:
+        O(xy), where xy are the dimensions of the grid.
+        """
+        self.__dict__.update(state) #O(1)
+        for i in range(self.x): #O(x)
+            column = self.grid[i] #O(1)
+            for j in range(self.y): #O(y)
+                self._bind(column[j], i, j) #O(1)
+
+    def _bind(self, store: LayerStore, x:int, y:int) -> LayerStore:
+        """Tell store it is in square (x, y) of this grid, so it reports its changes here. Returns the store. :complexity: O(1)"""
+        store.owner = self #O(1)
+        store.position = (x, y) #O(1)
+        return store
+
+    def place(self, x:int, y:int, store: LayerStore):
+        """
+        Args:
+        - x:int, y:int: a grid square
+        - store: LayerStore, for this grid's draw style
+
+        Raises:
+            None
+
+        Returns:
+            None
+
+        What it does:
+        Puts store in square (x, y), in place of the store there, and marks the square dirty.
+        From then on the store reports its own changes to this grid.
+        Anything replacing a square's layerstore should go through this, rather than assigning it.
+
+        Complexity:
+        O(1)
+        """
+        self.grid[x][y] = self._bind(store, x, y) #O(1)
+        self.mark_dirty(x, y) #O(1)
+
+    def restore(self, snapshot: Grid):
+        """
+        Args:
+        - snapshot: Grid, usually made with copy()
+
+        Raises:
+        - TypeError: if snapshot is not a Grid
+        - ValueError: if snapshot does not have the same draw style and dimensions
+
         Returns:
             None
 
+        What it does:
+        Sets every grid square back to the state it has in the snapshot.
+        The snapshot is copied, so it is left untouched and can be restored again.
+        The brush is not part of the canvas, so it is left as is.
+
+        Complexity:
+        O(xy * c), where xy are the dimensions of the grid and c is the cost of copying a layerstore.
+        """
+        if not isinstance(snapshot, Grid): #O(1)
+            raise TypeError("snapshot must be a Grid!") #O(1)
+        if (snapshot.draw_style, snapshot.x, snapshot.y) != (self.draw_style, self.x, self.y): #O(1)
+            raise ValueError("snapshot must have the same draw style and dimensions!") #O(1)
+        for i in range(self.x): #O(x)
+            column = self.grid[i] #O(1)
+            snapshot_column = snapshot.grid[i] #O(1)
+            for j in range(self.y): #O(y)
+                column[j] = self._bind(snapshot_column[j].copy(), i, j) #O(c)
+        self.mark_all_dirty() #O(xy)
+        # Every square now has the snapshot's state, so it has the snapshot's hash too.
+        self.grid_hash = snapshot.state_hash() #O(u) -- u is the number of squares changed in the snapshot since it was last hashed
+        self.square_hashes = [array("Q", column) for column in snapshot.square_hashes] #O(xy), but in C
+        self.column_hashes = array("Q", snapshot.column_hashes) #O(x)
+        self.unhashed = set() #O(1)
+
+    def mark_dirty(self, x:int, y:int):
+        """
+        Args:
+        - x:int, y:int: the grid square whose layerstore was changed
+
+        Raises:
+            None
+
+        Returns:
+            None
+
+        What it does:
+        Reports that the square's layerstore changed: to the change bus (self.changes),
+        so subscribers to it (such as whatever draws the grid) only have to look at changed squares
+        when the changes are next published; and to the state hash.
+        Layerstores call this themselves whenever they change (see LayerStore.changed), so however
+        a store is changed, even through grid[x][y], neither can miss it.
+
+        Complexity:
+        O(1) on average -- adding to sets.
+        """
+        self.changes.changed(x, y) #O(1)
+        self.unhashed.add((x, y)) #O(1)
+
+    def mark_all_dirty(self):
+        """
+        Args: self
+
+        Raises:
+            None
+
+        Returns:
+            None
+
+        What it does:
+        Marks every grid square as dirty, for changes that affect the whole grid (special, restore).
+        This is a single change on the change bus, rather than one per square.
+
+        Complexity:
+        O(xy), where xy are the dimensions of the grid -- every square has to be hashed again.
+        """
+        self.changes.changed_all() #O(1)
+        self.unhashed.update((i, j) for i in range(self.x) for j in range(self.y)) #O(xy)
+
+    def state_hash(self) -> int:
+        """
+        Args: self
+
+        Raises:
+            None
+
+        Returns:
+            int -- a 64 bit hash of the state of every layerstore in the grid
+
+        What it does:
+        The hash of the grid is the XOR of each square's contribution (kept in square_hashes, and per column in column_hashes),
+        which mixes the square's position with its layerstore's state_hash (0 for an empty layerstore).
+        Layerstores keep their own hash up to date as they change, and mark their square dirty,
+        so only the squares changed since the last call need their contribution swapped: the old one XORed out, the new one in.
+        The cached hash is therefore never stale, whichever way a store was changed.
+
+        Grids with the same draw style, dimensions and hash are taken to be equal (see __eq__):
+        two different states have the same hash with a probability of about 2^-64.
+
+        Complexity:
+        O(u), where u is the number of squares changed since the last call,
+        so O(1) for each add or erase since then; O(1) if nothing changed.
+        """
+        for x, y in self.unhashed: #O(u)
+            column = self.square_hashes[x] #O(1)
+            change = column[y] ^ square_hash(self.grid[x][y].state_hash, x, y) #O(1)
+            column[y] ^= change #O(1)
+            self.column_hashes[x] ^= change #O(1)
+            self.grid_hash ^= change #O(1)
+        self.unhashed = set() #O(1)
+        return self.grid_hash
+
+    def __eq__(self, other) -> bool:
+        """
+        Args:
+        - other: anything
+
+        Raises:
+            None
+
+        Returns:
+            bool -- True if other is a Grid with the same draw style, dimensions and state hash
+
+        What it does:
+        Compares the grids by their state hash, rather than square by square.
+        Every store reports its changes to its grid, so the hashes are always up to date (see state_hash).
+        The brush is not part of the canvas, so it is not compared.
+
+        Complexity:
+        O(u), where u is the number of squares changed in either grid since they were last hashed.
+        """
+        if not isinstance(other, Grid): #O(1)
+            return NotImplemented
+        return (self.draw_style, self.x, self.y) == (other.draw_style, other.x, other.y) and self.state_hash() == other.state_hash() #O(u)
+
+    __hash__ = None # Grids are mutable, so they can't be dict keys: use state_hash() instead.
+
+    def special(self) -> SpecialCheckpoint:
+        """
+        Args: self
+
+        Raises:
+            None
+        
+        Returns:
+            SpecialCheckpoint -- the squares it changed, to undo (or redo) it with restore_special
+
         What it does:
         Activate the special affect on all grid squares.
 
@@ -185,14 +457,80 @@ class Grid:
         for j in range(self.y): iterates over height of grid
         self.grid[i][j].special(): activates the layerstore special effect on corresponding grid coordinate
 
+        For every store the special changed, the checkpoint keeps the store's delta: only what changed
+        (the layer a sequence store removed, a set store's special state, nothing for an additive store),
+        rather than a copy of the store.
+        Only the squares that changed need hashing again.
+
         Complexity:
         the code iterates over the x and y inputs of the grid using nested loops, where
-        x and y are the dimensions of the grid. Hence, the time complexity is O(xy).
+        x and y are the dimensions of the grid. Hence, the time complexity is O(xy * s),
+        where s is the cost of a layerstore's special.
         """
+        # Reported as a change to every square first, so the stores reporting their own changes cost nothing more;
+        # only the squares that changed (which the stores mark dirty) need hashing again.
+        self.changes.changed_all() #O(1)
+        squares, deltas = array("I"), [] #O(1)
         for i in range(self.x):     #O(x)
+            column = self.grid[i] #O(1)
             for j in range(self.y): #O(y)
-                self.grid[i][j]:LayerStore 
-                self.grid[i][j].special() #O(1)
+                store:LayerStore = column[j] #O(1)
+                old_hash = store.state_hash #O(1)
+                delta = store.special_delta() #O(s)
+                if store.state_hash != old_hash: #O(1)
+                    squares.append(i * self.y + j) #O(1)
+                    deltas.append(delta) #O(1)
+        return SpecialCheckpoint(squares, deltas) #O(1)
+
+    def restore_special(self, checkpoint: SpecialCheckpoint, undo: bool):
+        """
+        Args:
+        - checkpoint: SpecialCheckpoint, returned by special()
+        - undo: bool -- True to undo the special, False to redo it
+
+        Raises:
+            None
+
+        Returns:
+            None
+
+        What it does:
+        Undoes (or redoes) a special by undoing (or redoing) each changed store's delta in place, rather than
+        going through every square again. This is exact, unlike a second special (the sequence store's
+        special deletes a layer, and the set store's cannot be turned off).
+        The checkpoint is applied whatever else has changed since: undo and redo go in order, so anything
+        done after the special has been undone by then (though not always back to the same state hash,
+        e.g. a sequence store's erase leaves its layer marked as not applying). Each delta only puts back
+        what the special changed, and leaves the rest of its store as it is.
+
+        Complexity:
+        O(k * d), where k is the number of squares the special changed and d the cost of undoing (or redoing) a delta.
+        """
+        for square, delta in zip(checkpoint.squares, checkpoint.deltas): #O(k)
+            store:LayerStore = self.grid[square // self.y][square % self.y] #O(1)
+            if undo: #O(1)
+                store.undo_special(delta) #O(d)
+            else:
+                store.redo_special(delta) #O(d)
+
+    def new_store(self) -> LayerStore:
+        """
+        Args: self
+
+        Raises:
+            None
+
+        Returns:
+            LayerStore -- an empty layerstore for this grid's draw style
+
+        Complexity:
+        O(1)
+        """
+        if self.draw_style == self.DRAW_STYLE_SET: #O(1)
+            return SetLayerStore() #O(1)
+        if self.draw_style == self.DRAW_STYLE_ADD: #O(1)
+            return AdditiveLayerStore() #O(1)
+        return SequenceLayerStore() #O(1)
         
         
         
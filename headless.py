@@ -0,0 +1,259 @@
+"""
+MyWindow's painting logic, without a window.
+
+HeadlessWindow has the student part of MyWindow (on_paint, on_undo,
+on_special, strokes, replays, journals, ...) working on a grid, but nothing
+that needs a display: no sprites, no drawing, no mouse or keyboard. So
+anything that drives a MyWindow through those methods (the visual scripts,
+workload.drive) can drive one of these instead, at full speed and without
+a screen.
+
+The canvas is still coloured, by draw(), as on_draw colours it each frame;
+only nothing is put on the screen. Drawing matters to the grid, as a SET
+store's special inverts the colour it was last drawn with (and drawing a
+special store with no layer resets it). The window draws a frame between
+one mouse or key press and the next, so each of the methods called for
+them (on_paint, on_undo, on_special, ...) draws one first.
+
+A HeadlessWindow runs on a VirtualClock: each frame the clock passes (when
+a script sleeps on window.clock) is a frame of the window, which updates
+(on_update, so replays play and the timestamp moves on), draws, and keeps
+a hash of the canvas. So the visual scripts run without a display, as fast
+as their frames can be worked out, and the same every time:
+
+    python -m headless visuals.basic --save basic.hashes
+    python -m headless visuals.basic --check basic.hashes
+
+--check compares the frame hashes with a saved run, and reports the first
+frame that differs (the exit status is then 1). --layer-costs times every
+layer's calls during the run, and writes what each cost (see
+layer_util.write_costs; "-" prints them as a table).
+"""
+
+from __future__ import annotations
+import argparse
+import hashlib
+import importlib
+import sys
+import time
+from typing import Callable
+
+from animation import FrameDiffer
+from clock import FRAME_TIME, VirtualClock
+from grid import Grid
+from layer_util import layer_costs, reset_costs, time_calls, write_costs
+from main import MyWindow
+from profiler import COUNT_GET_COLOR, SECTION_GRID, FrameProfiler
+
+
+def _drawn_first(method: Callable) -> Callable:
+    """method, called after drawing a frame."""
+    def handler(self, *args):
+        self.draw()
+        return method(self, *args)
+    handler.__name__ = method.__name__
+    handler.__doc__ = f"Draw, as the window would have by now, then MyWindow.{method.__name__}."
+    return handler
+
+
+class HeadlessWindow:
+    """
+    A grid, and the undo and replay trackers MyWindow keeps for it, driven through MyWindow's methods.
+    MyWindow's settings (its upper case class attributes) apply here too, except the paths to files.
+    """
+
+    JOURNAL_PATH = None
+    AUTOSAVE_PATH = None
+
+    def __init__(self, draw_style: str = Grid.DRAW_STYLE_SET, width: int|None = None, height: int|None = None,
+                 journal_path: str|None = None, resume: bool = False, clock: VirtualClock|None = None) -> None:
+        """
+        A window of width x height squares (MyWindow's size by default).
+        With journal_path, every action is recorded to a journal there, as with MyWindow.JOURNAL_PATH;
+        unless resume is set, any journal already there is started over.
+        The window runs a frame for every frame clock passes (a VirtualClock of its own by default).
+        """
+        if width is not None:
+            self.GRID_SIZE_X = width
+        if height is not None:
+            self.GRID_SIZE_Y = height
+        self.JOURNAL_PATH = journal_path
+        self.draw_style = draw_style
+        self.clock = clock if clock is not None else VirtualClock()
+        self.clock.on_frame.append(self.frame)
+        self.enable_ui = True
+        self.z_pressed = False
+        self.y_pressed = False
+        self.z_timer = 0
+        self.y_timer = 0
+        self.replay_timer = 0
+        self.replay_paused = False
+        self.scrubbing = False
+        self.replay_mode = self.REPLAY_MODE
+        self.replay_speed = self.REPLAY_SPEED
+        # A hash of the canvas at the end of every frame so far.
+        self.frame_hashes: list[str] = []
+        # Times the updates and the colouring of the grid, if enabled (there is nothing else to time).
+        self.profiler = FrameProfiler()
+        self.journal_resumed = not resume
+        self.autosaver = None
+        self.autosave_restored = False
+        self.canvas: FrameDiffer|None = None
+        self.on_init()
+        self.reset()
+
+    def __getattr__(self, name: str):
+        # Settings not set here are looked up on MyWindow, rather than copied, so the two can't drift apart.
+        if name.isupper() and hasattr(MyWindow, name):
+            return getattr(MyWindow, name)
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def reset(self) -> None:
+        """Start over with an empty grid, as MyWindow.reset."""
+        self.grid = Grid(self.draw_style, self.GRID_SIZE_X, self.GRID_SIZE_Y)
+        self.timestamp = 0
+        self.reset_time = self.clock()
+        self.on_reset()
+
+    def change_draw_mode(self) -> None:
+        """Move on to the next draw style, and start over, as MyWindow.change_draw_mode."""
+        styles = Grid.DRAW_STYLE_OPTIONS
+        self.draw_style = styles[(styles.index(self.draw_style) + 1) % len(styles)]
+        self.reset()
+
+    def draw(self) -> None:
+        """Colour the canvas, as on_draw does, for the squares changed since the last draw (and animated ones)."""
+        with self.profiler.section(SECTION_GRID):
+            if self.canvas is None or self.canvas.grid is not self.grid:
+                if self.canvas is not None:
+                    self.canvas.close()
+                self.canvas = FrameDiffer(self.grid, self.BG[:])
+            self.grid.changes.publish()
+            self.canvas.update(self.grid, self.timestamp)
+        self.profiler.count(COUNT_GET_COLOR, self.canvas.recoloured)
+
+    def frame(self, delta_time: float) -> None:
+        """A frame of delta_time seconds: update, draw, and keep a hash of the canvas."""
+        self.on_update(delta_time)
+        self.draw()
+        self.profiler.end_frame()
+        self.frame_hashes.append(hashlib.blake2b(self.canvas.pixels, digest_size=8).hexdigest())
+
+    def digest(self) -> str:
+        """A hash of all the frames so far."""
+        return hashlib.blake2b("\n".join(self.frame_hashes).encode(), digest_size=8).hexdigest()
+
+    def close(self) -> None:
+        """Finish the journal and the autosave, if there are any, as MyWindow.on_close, and stop taking frames."""
+        self.replay_tracker.close()
+        if self.autosaver is not None:
+            self.autosaver.close()
+        if self.frame in self.clock.on_frame:
+            self.clock.on_frame.remove(self.frame)
+
+    on_update = MyWindow.on_update
+    advance_replay = MyWindow.advance_replay
+    start_replay = MyWindow.start_replay
+    finish_replay = MyWindow.finish_replay
+    on_init = MyWindow.on_init
+    on_reset = MyWindow.on_reset
+    on_journal_open = MyWindow.on_journal_open
+    on_autosave_open = MyWindow.on_autosave_open
+    on_autosave = MyWindow.on_autosave
+    on_stroke_end = MyWindow.on_stroke_end
+    on_replay_start = MyWindow.on_replay_start
+    on_replay_next_step = MyWindow.on_replay_next_step
+    on_replay_steps = MyWindow.on_replay_steps
+    on_replay_for = MyWindow.on_replay_for
+    on_replay_previous_step = MyWindow.on_replay_previous_step
+    on_replay_seek = MyWindow.on_replay_seek
+    on_replay_end = MyWindow.on_replay_end
+    on_increase_brush_size = MyWindow.on_increase_brush_size
+    on_decrease_brush_size = MyWindow.on_decrease_brush_size
+    on_change_brush_shape = MyWindow.on_change_brush_shape
+
+    # What the mouse and keyboard call, each in a frame of its own.
+    on_paint = _drawn_first(MyWindow.on_paint)
+    on_undo = _drawn_first(MyWindow.on_undo)
+    on_redo = _drawn_first(MyWindow.on_redo)
+    on_special = _drawn_first(MyWindow.on_special)
+    on_stroke_start = _drawn_first(MyWindow.on_stroke_start)
+
+
+def run_headless(func: Callable, fps: float = 1 / FRAME_TIME, **kwargs) -> HeadlessWindow:
+    """
+    Call func (a visual script, as given to main.run_with_func) with a HeadlessWindow running at fps frames
+    per (virtual) second, and close the window; kwargs go to HeadlessWindow (a clock given there is used as it is).
+    Returns the window.
+    """
+    kwargs.setdefault("clock", VirtualClock(1 / fps))
+    window = HeadlessWindow(**kwargs)
+    try:
+        func(window)
+    finally:
+        window.close()
+    return window
+
+
+def find_script(name: str) -> Callable:
+    """
+    The script in module:function name, or the only test_ function of the module if there's no function.
+
+    :raises ValueError: if there isn't exactly one.
+    """
+    module_name, _, function = name.partition(":")
+    module = importlib.import_module(module_name)
+    if function:
+        return getattr(module, function)
+    scripts = [value for key, value in vars(module).items() if key.startswith("test_") and callable(value)]
+    if len(scripts) != 1:
+        raise ValueError(f"{module_name} has {len(scripts)} test_ functions; name one as {module_name}:function")
+    return scripts[0]
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("script", help="A visual script, as module or module:function (e.g. visuals.basic).")
+    p.add_argument("--fps", type=float, default=1 / FRAME_TIME)
+    p.add_argument("--save", metavar="PATH", help="Save the frame hashes to PATH.")
+    p.add_argument("--check", metavar="PATH", help="Compare the frame hashes with ones saved to PATH.")
+    p.add_argument("--layer-costs", metavar="PATH", help='Time every layer, and write the costs to PATH ("-" for a table).')
+    args = p.parse_args(argv)
+
+    try:
+        func = find_script(args.script)
+        if args.layer_costs:
+            reset_costs()
+            time_calls()
+        start = time.perf_counter()
+        try:
+            window = run_headless(func, args.fps)
+        finally:
+            time_calls(False)
+        elapsed = time.perf_counter() - start
+        print(f"{args.script}: {len(window.frame_hashes)} frames, {window.clock() - window.clock.start:.2f}s virtual"
+              f" in {elapsed:.2f}s real, digest {window.digest()}")
+        if args.layer_costs:
+            write_costs(args.layer_costs, layer_costs())
+        if args.save:
+            with open(args.save, "w") as f:
+                f.writelines(h + "\n" for h in window.frame_hashes)
+        if args.check:
+            with open(args.check) as f:
+                expected = f.read().split()
+    except (ImportError, AttributeError, OSError, ValueError) as e:
+        p.error(str(e))
+    if args.check:
+        for i, (got, want) in enumerate(zip(window.frame_hashes, expected)):
+            if got != want:
+                print(f"frame {i} differs: {got}, expected {want}")
+                return 1
+        if len(window.frame_hashes) != len(expected):
+            print(f"{len(window.frame_hashes)} frames, expected {len(expected)}")
+            return 1
+        print("all frames match")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
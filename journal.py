@@ -0,0 +1,501 @@
+"""
+Append-only on-disk replay journal.
+
+A journal records every replay action (paint, special, and whether it was
+applied as an undo) as it happens, so a session survives the program exiting
+and is not limited by the in-memory replay buffer.
+
+File layout:
+    header:  magic, draw style, codec, grid width, grid height
+    records: payload length (varint), CRC32 of payload, payload
+
+With CODEC_RAW, each record payload holds the action kind, the wall-clock time
+it was recorded at, and its steps as (x, y, layer index). With CODEC_ZLIB,
+records are coded by action_codec relative to the records before them, and
+compressed with zlib, flushed after every record (the 00 00 FF FF marker
+ending each flush is left out, and put back when reading, as in WebSocket
+compression). Both are restarted every
+BLOCK_RECORDS records, so decoding can start at the beginning of any block.
+This makes long journals around 10x smaller or better. Records are only ever
+appended; a record cut short by a crash (or failing its CRC) marks the end of
+the journal, and is truncated away when the journal is reopened for writing.
+
+A sidecar index (the journal path + ".idx") maps every INDEX_STRIDE-th action
+number and its wall-clock time to its byte offset, so any action can be found
+by reading at most INDEX_STRIDE record headers. The index is only ever
+extended with the records appended since it was last updated. Its entries
+fall on block starts, so decoding can start from any of them.
+"""
+
+from __future__ import annotations
+import bisect
+import mmap
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+
+from action import PaintAction, PaintStep
+from action_codec import ActionDecoder, ActionEncoder, write_varint
+from grid import Grid
+from layer_util import get_layers
+
+MAGIC = b"PAJ1"
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+CODECS = (
+    CODEC_RAW,
+    CODEC_ZLIB,
+)
+
+HEADER = struct.Struct("<4sBBII")
+CRC = struct.Struct("<I")
+RECORD = struct.Struct("<BdI")
+STEP = struct.Struct("<HHB")
+
+FLAG_UNDO = 1
+FLAG_SPECIAL = 2
+
+INDEX_MAGIC = b"PAI1"
+INDEX_HEADER = struct.Struct("<4sI")
+INDEX_ENTRY = struct.Struct("<IdQ")
+INDEX_STRIDE = 64
+# Records per compression block; the index stride must be a multiple of it.
+BLOCK_RECORDS = 64
+SYNC_MARKER = b"\x00\x00\xff\xff"
+
+
+class JournalError(Exception):
+    pass
+
+
+@dataclass
+class JournalRecord:
+
+    action: PaintAction
+    is_undo: bool
+    timestamp: float
+    # Byte offsets of this record and of the one after it.
+    offset: int
+    next_offset: int
+
+
+def encode_record(action: PaintAction, is_undo: bool, timestamp: float) -> bytes:
+    """Encode an action as a record payload."""
+    flags = (FLAG_UNDO if is_undo else 0) | (FLAG_SPECIAL if action.is_special else 0)
+    parts = [RECORD.pack(flags, timestamp, len(action.steps))]
+    for step in action.steps:
+        x, y = step.affected_grid_square
+        parts.append(STEP.pack(x, y, step.affected_layer.index))
+    return b"".join(parts)
+
+
+def decode_record(payload) -> tuple[PaintAction, bool, float]:
+    """Decode a record payload into (action, is_undo, timestamp)."""
+    flags, timestamp, count = RECORD.unpack_from(payload, 0)
+    layers = get_layers()
+    steps = []
+    for x, y, layer_index in STEP.iter_unpack(payload[RECORD.size:RECORD.size + count * STEP.size]):
+        steps.append(PaintStep((x, y), layers[layer_index]))
+    return PaintAction(steps, bool(flags & FLAG_SPECIAL)), bool(flags & FLAG_UNDO), timestamp
+
+
+def scan_frames(data, offset: int, end: int):
+    """
+    Yield (offset, payload_start, next_offset) for every complete, valid record in data[offset:end].
+    Stops at the first record that is cut short or fails its CRC.
+    """
+    while offset < end:
+        length = 0
+        shift = 0
+        start = offset
+        while start < end and data[start] & 0x80:
+            length |= (data[start] & 0x7F) << shift
+            shift += 7
+            start += 1
+        if start + 1 + CRC.size > end:
+            return
+        length |= data[start] << shift
+        start += 1 + CRC.size
+        if start + length > end or zlib.crc32(data[start:start + length]) != CRC.unpack_from(data, start - CRC.size)[0]:
+            return
+        yield offset, start, start + length
+        offset = start + length
+
+
+def frame(payload: bytes) -> bytes:
+    """Frame a record payload for writing."""
+    out = bytearray()
+    write_varint(out, len(payload))
+    return bytes(out) + CRC.pack(zlib.crc32(payload)) + payload
+
+
+def index_path(path: str) -> str:
+    """The path of a journal's sidecar index."""
+    return path + ".idx"
+
+
+def read_header(data) -> tuple[str, int, int, int]:
+    """
+    Parse a journal header into (draw_style, codec, x, y).
+
+    Raises:
+    - JournalError: if the data does not start with a journal header.
+    """
+    if len(data) < HEADER.size:
+        raise JournalError("Journal is missing its header")
+    magic, style_index, codec, x, y = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or style_index >= len(Grid.DRAW_STYLE_OPTIONS):
+        raise JournalError("Not a paint journal")
+    return Grid.DRAW_STYLE_OPTIONS[style_index], codec, x, y
+
+
+def recover(path: str) -> int:
+    """
+    Truncate a journal after its last complete record (e.g. after a crash).
+    Its index is removed when anything is truncated, as it may point past the new end.
+    Returns the number of complete records.
+    """
+    with open(path, "r+b") as f:
+        data = f.read()
+        read_header(data)
+        end = HEADER.size
+        count = 0
+        for _, _, end in scan_frames(data, HEADER.size, len(data)):
+            count += 1
+        if end < len(data):
+            f.truncate(end)
+            if os.path.exists(index_path(path)):
+                os.remove(index_path(path))
+    return count
+
+
+class JournalWriter:
+    """
+    Appends records to a journal.
+
+    Every record is handed to the OS straight away, so a crash of the program loses nothing.
+    fsync (which protects against the machine going down as well) is batched every
+    fsync_every records, and done on flush() / close().
+    """
+
+    FSYNC_EVERY = 64
+
+    def __init__(self, path: str, draw_style: str, x: int, y: int, fsync_every: int = FSYNC_EVERY, clock=time.time, codec: int = CODEC_RAW) -> None:
+        """
+        Open a journal for appending, creating it if needed.
+        An existing journal is recovered (truncated after its last complete record) and appended to.
+
+        Raises:
+        - ValueError: if draw_style or codec is invalid, or the grid is too large to journal.
+        - JournalError: if an existing journal is for a different draw style, grid size or codec.
+        """
+        if draw_style not in Grid.DRAW_STYLE_OPTIONS:
+            raise ValueError("Invalid Draw Style, draw style must be one of draw style options!")
+        if codec not in CODECS:
+            raise ValueError(f"Invalid codec {codec}, must be one of {CODECS}")
+        if not (0 < x <= 0xFFFF and 0 < y <= 0xFFFF):
+            raise ValueError("Grid dimensions must be between 1 and 65535 to be journaled")
+        self.path = path
+        self.fsync_every = fsync_every
+        self.clock = clock
+        self.codec = codec
+        self.unsynced = 0
+        self.encoder = ActionEncoder(x, y)
+        self.compressor = None
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.count = recover(path)
+            self.file = open(path, "r+b")
+            if read_header(self.file.read(HEADER.size)) != (draw_style, codec, x, y):
+                self.file.close()
+                raise JournalError("Journal was recorded with a different draw style, grid size or codec")
+            self.file.seek(0, os.SEEK_END)
+            if codec != CODEC_RAW and self.count % BLOCK_RECORDS:
+                self._resume_block()
+        else:
+            self.count = 0
+            if os.path.exists(index_path(path)):
+                os.remove(index_path(path))
+            self.file = open(path, "wb")
+            self.file.write(HEADER.pack(MAGIC, Grid.DRAW_STYLE_OPTIONS.index(draw_style), codec, x, y))
+            self.file.flush()
+
+    def _resume_block(self) -> None:
+        """
+        Restore the coding state at the end of a partly written block, by coding its records again.
+        Coding is deterministic, so the state ends up exactly as when they were first written.
+        """
+        with JournalReader(self.path) as reader:
+            offset = reader.skip(HEADER.size, self.count - self.count % BLOCK_RECORDS)
+            records = list(reader.records(offset))
+        self._start_block()
+        for record in records:
+            self._compress(record.action, record.is_undo, record.timestamp)
+
+    def _start_block(self) -> None:
+        self.encoder.reset()
+        self.compressor = zlib.compressobj(9)
+
+    def _compress(self, action: PaintAction, is_undo: bool, timestamp: float) -> bytes:
+        coded = self.encoder.encode(action, is_undo, timestamp)
+        return (self.compressor.compress(coded) + self.compressor.flush(zlib.Z_SYNC_FLUSH))[:-len(SYNC_MARKER)]
+
+    def append(self, action: PaintAction, is_undo: bool = False) -> None:
+        """Append an action to the journal."""
+        if self.codec == CODEC_RAW:
+            payload = encode_record(action, is_undo, self.clock())
+        else:
+            if self.count % BLOCK_RECORDS == 0:
+                self._start_block()
+            payload = self._compress(action, is_undo, self.clock())
+        self.file.write(frame(payload))
+        self.file.flush()
+        self.count += 1
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        """Make everything written so far durable."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+    def __enter__(self) -> JournalWriter:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class JournalReader:
+    """
+    Reads a journal through a memory map, decoding records lazily,
+    so arbitrarily long sessions can be streamed without loading them.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Raises:
+        - JournalError: if the file is not a journal.
+        """
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.draw_style, self.codec, self.x, self.y = read_header(self.data)
+        except JournalError:
+            self.close()
+            raise
+        if self.codec not in CODECS:
+            self.close()
+            raise JournalError(f"Unsupported journal codec {self.codec}")
+
+    def refresh(self) -> None:
+        """Remap the file, to see records appended since it was opened."""
+        self.data.close()
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def records(self, offset: int = HEADER.size):
+        """
+        Yield every complete record from the given byte offset (by default, the first record).
+        In a compressed journal, the offset must be the start of a block, such as an index entry.
+        """
+        if self.codec == CODEC_RAW:
+            for offset, start, next_offset in scan_frames(self.data, offset, len(self.data)):
+                action, is_undo, timestamp = decode_record(self.data[start:next_offset])
+                yield JournalRecord(action, is_undo, timestamp, offset, next_offset)
+            return
+        decoder = ActionDecoder(self.x, self.y)
+        decompressor = None
+        for n, (offset, start, next_offset) in enumerate(scan_frames(self.data, offset, len(self.data))):
+            if n % BLOCK_RECORDS == 0:
+                decoder.reset()
+                decompressor = zlib.decompressobj()
+            action, is_undo, timestamp = decoder.decode(decompressor.decompress(self.data[start:next_offset] + SYNC_MARKER))
+            yield JournalRecord(action, is_undo, timestamp, offset, next_offset)
+
+    def timestamp_at(self, offset: int) -> float:
+        """
+        The wall-clock time of the record at a byte offset (a block start, in a compressed journal).
+        Raw records are not decoded for this.
+        """
+        if self.codec == CODEC_RAW:
+            for _, start, _ in scan_frames(self.data, offset, len(self.data)):
+                return RECORD.unpack_from(self.data, start)[1]
+        return self.record_at(offset).timestamp
+
+    def record_at(self, offset: int) -> JournalRecord:
+        """
+        Decode the record starting at a byte offset (a block start, in a compressed journal).
+
+        Raises:
+        - JournalError: if there is no complete record there.
+        """
+        for record in self.records(offset):
+            return record
+        raise JournalError(f"No complete record at offset {offset}")
+
+    def skip(self, offset: int, count: int) -> int:
+        """
+        The offset of the record count records after the one at offset, without decoding any of them.
+        (In a compressed journal, decoding must still start from a block start.)
+
+        Raises:
+        - JournalError: if the journal ends first.
+        """
+        if count == 0:
+            return offset
+        for _, _, offset in scan_frames(self.data, offset, len(self.data)):
+            count -= 1
+            if count == 0:
+                return offset
+        raise JournalError("Journal ended before the record to skip to")
+
+    def __iter__(self):
+        for record in self.records():
+            yield record.action, record.is_undo
+
+    def count(self) -> int:
+        """Number of complete records. Only the record headers are read, nothing is decoded."""
+        return sum(1 for _ in scan_frames(self.data, HEADER.size, len(self.data)))
+
+    def new_grid(self) -> Grid:
+        """An empty grid of the draw style and size the journal was recorded with."""
+        return Grid(self.draw_style, self.x, self.y)
+
+    def close(self) -> None:
+        if not self.data.closed:
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self) -> JournalReader:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class JournalIndex:
+    """
+    Sidecar index of a journal: the byte offset and wall-clock time of every stride-th action.
+
+    The entries are kept in memory as parallel lists (so they can be bisected),
+    and appended to the index file as the journal grows.
+    """
+
+    def __init__(self, path: str, stride: int = INDEX_STRIDE) -> None:
+        """
+        Load the index of the journal at path, if it has a usable one.
+        Call update() to bring it up to date with the journal.
+
+        Raises:
+        - ValueError: if stride is not positive.
+        """
+        if stride <= 0:
+            raise ValueError("Index stride must be positive")
+        self.path = index_path(path)
+        self.stride = stride
+        self.numbers: list[int] = []
+        self.times: list[float] = []
+        self.offsets: list[int] = []
+        # Number of records in the journal, and the offset just after the last of them, as of the last update.
+        self.count = 0
+        self.end_offset = HEADER.size
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                data = f.read()
+            if len(data) >= INDEX_HEADER.size and INDEX_HEADER.unpack_from(data, 0) == (INDEX_MAGIC, stride):
+                usable = len(data) - (len(data) - INDEX_HEADER.size) % INDEX_ENTRY.size
+                for number, timestamp, offset in INDEX_ENTRY.iter_unpack(data[INDEX_HEADER.size:usable]):
+                    self.numbers.append(number)
+                    self.times.append(timestamp)
+                    self.offsets.append(offset)
+
+    def _is_valid(self, reader: JournalReader) -> bool:
+        """Whether the entries can be trusted for this journal: the last one must be a complete record."""
+        if not self.offsets:
+            return True
+        offset = self.offsets[-1]
+        return self.numbers[-1] == (len(self.numbers) - 1) * self.stride and \
+            next(scan_frames(reader.data, offset, len(reader.data)), None) is not None
+
+    def update(self, reader: JournalReader) -> int:
+        """
+        Index the records appended to the journal since the last update, and return the number of records.
+        Only the records after the last entry are read. An index that does not match the journal is rebuilt.
+
+        Raises:
+        - ValueError: if the journal is compressed, and the stride is not a multiple of BLOCK_RECORDS.
+        """
+        if reader.codec != CODEC_RAW and self.stride % BLOCK_RECORDS:
+            raise ValueError(f"The index stride of a compressed journal must be a multiple of {BLOCK_RECORDS}")
+        if not self._is_valid(reader):
+            self.numbers, self.times, self.offsets = [], [], []
+        number = self.numbers[-1] if self.numbers else 0
+        offset = self.offsets[-1] if self.offsets else HEADER.size
+        new_entries = []
+        for offset, _, next_offset in scan_frames(reader.data, offset, len(reader.data)):
+            if number % self.stride == 0 and number // self.stride == len(self.numbers):
+                timestamp = reader.timestamp_at(offset)
+                self.numbers.append(number)
+                self.times.append(timestamp)
+                self.offsets.append(offset)
+                new_entries.append(INDEX_ENTRY.pack(number, timestamp, offset))
+            number += 1
+            self.end_offset = next_offset
+        self.count = number
+        self._write(new_entries)
+        return self.count
+
+    def _write(self, new_entries: list[bytes]) -> None:
+        """Append new entries to the index file, rewriting it if it is missing or has the wrong number of entries."""
+        expected = INDEX_HEADER.size + (len(self.numbers) - len(new_entries)) * INDEX_ENTRY.size
+        if os.path.exists(self.path) and os.path.getsize(self.path) == expected:
+            if new_entries:
+                with open(self.path, "ab") as f:
+                    f.write(b"".join(new_entries))
+            return
+        with open(self.path, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, self.stride))
+            for entry in zip(self.numbers, self.times, self.offsets):
+                f.write(INDEX_ENTRY.pack(*entry))
+
+    def locate(self, number: int) -> tuple[int, int]:
+        """(action number, offset) of the closest indexed action at or before the given one."""
+        entry = min(number // self.stride, len(self.numbers) - 1)
+        if entry < 0:
+            return 0, HEADER.size
+        return self.numbers[entry], self.offsets[entry]
+
+    def offset_of(self, reader: JournalReader, number: int) -> int:
+        """
+        The byte offset of an action, reading at most stride record headers.
+        (In a compressed journal, decoding must start from locate(number) instead.)
+
+        Raises:
+        - JournalError: if the journal has no such action.
+        """
+        indexed, offset = self.locate(number)
+        return reader.skip(offset, number - indexed)
+
+    def find_time(self, reader: JournalReader, timestamp: float) -> int:
+        """
+        The number of the first action recorded at or after a wall-clock time
+        (the number of actions, if there is none), reading at most stride records.
+        """
+        entry = bisect.bisect_right(self.times, timestamp) - 1
+        if entry < 0:
+            return 0
+        number = self.numbers[entry]
+        for record in reader.records(self.offsets[entry]):
+            if record.timestamp >= timestamp:
+                return number
+            number += 1
+        return number
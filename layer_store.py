@@ -9,11 +9,34 @@ from data_structures.array_sorted_list import *
 from data_structures.sorted_list_adt import *
 from data_structures.abstract_list import *
 from data_structures.bset import *
+from zobrist import *
 
 class LayerStore(ABC):
+    """
+    Every store keeps state_hash, an incremental hash of its whole state (see zobrist.py),
+    updated in O(1) by add, erase and special. Stores in the same state have the same hash,
+    and an empty store has hash 0.
+
+    A store in a grid knows the grid and its square there (see Grid.place), and tells the grid
+    whenever it changes, so the grid's state hash and change bus can't miss a change.
+    """
 
     def __init__(self) -> None:
-        pass
+        self.state_hash = 0
+        self.owner = None
+        self.position = (0, 0)
+
+    def changed(self) -> None:
+        """
+        Tell the grid the store is in (if any) that it changed.
+        :complexity: O(1)
+        """
+        if self.owner is not None:
+            self.owner.mark_dirty(*self.position)
+
+    def __getstate__(self) -> dict:
+        # A store is pickled on its own (a grid places its stores again when unpickled, see Grid.__setstate__).
+        return {**self.__dict__, "owner": None}
 
     @abstractmethod
     def add(self, layer: Layer) -> bool:
@@ -45,6 +68,60 @@ class LayerStore(ABC):
         """
         pass
 
+    def special_delta(self):
+        """
+        Apply special, and return a delta: what undo_special and redo_special need to undo and redo it.
+        By default, copies of the store from before and after it; stores override this with something smaller.
+        :complexity: O(c + s), where c is the cost of copy and s of special.
+        """
+        before = self.copy()
+        self.special()
+        return before, self.copy()
+
+    def undo_special(self, delta) -> None:
+        """
+        Put back what the special that returned delta (see special_delta) changed, as it was before it.
+        :complexity: O(c), where c is the cost of copy.
+        """
+        self._become(delta[0])
+
+    def redo_special(self, delta) -> None:
+        """
+        Put back what the special that returned delta (see special_delta) changed, as it was after it.
+        :complexity: O(c), where c is the cost of copy.
+        """
+        self._become(delta[1])
+
+    def _become(self, store: LayerStore) -> None:
+        """Take on a copy of store's state, staying in the same grid and square. :complexity: O(c)"""
+        owner, position = self.owner, self.position
+        self.__dict__.update(store.copy().__dict__)
+        self.owner, self.position = owner, position
+        self.changed()
+
+    @abstractmethod
+    def copy(self) -> LayerStore:
+        """
+        Returns an independent copy of this store, which can be
+        mutated without affecting the original.
+        """
+        pass
+
+    @abstractmethod
+    def is_animated(self) -> bool:
+        """
+        Returns true if the colour of this square changes with the timestamp,
+        as an animated layer is being applied.
+        """
+        pass
+
+    @abstractmethod
+    def stack(self) -> list[Layer]:
+        """
+        Returns the layers currently applied, in the order they are applied.
+        """
+        pass
+
 class SetLayerStore(LayerStore):
     """
     What it does:
@@ -89,7 +166,7 @@ class SetLayerStore(LayerStore):
             y: int - position from height dimension
 
         Raises:
-            TypeError: if timestamp, x or y is not an integer and if start not a tuple of a tuple of (r,g,b) integers
+            TypeError: if timestamp is not a number, x or y is not an integer, or start is not an (r,g,b) colour
 
         Returns:
             start:(r,g,b)-- if there are no layers currently
@@ -111,10 +188,10 @@ class SetLayerStore(LayerStore):
             The apply method has constant time complexity as it will always apply to a fixed tuple of (r,g,b) values.
 
         """
-        if not isinstance(start, tuple) and len(start) == 3 and all(isinstance(i, int) for i in start): #O(1)
+        if not (isinstance(start, (tuple, list)) and len(start) == 3): #O(1)
             raise TypeError("start must be a tuple of (r,g,b) integers") 
-        if not isinstance(timestamp, int): #O(1)
-            raise TypeError("timestamp must be an integer")
+        if not isinstance(timestamp, (int, float)): #O(1)
+            raise TypeError("timestamp must be a number")
         if not isinstance(x, int): #O(1)
             raise TypeError("x must be an integer")
         if not isinstance(y, int): #O(1)
@@ -154,7 +231,9 @@ class SetLayerStore(LayerStore):
             return TypeError("layer must be a Layer Class type")
 
         if self.current_layers != layer: #O(1)
+            self.state_hash ^= layer_key(ROLE_SET, self.current_layers) ^ layer_key(ROLE_SET, layer) #O(1)
             self.current_layers = layer  #O(1)
+            self.changed() #O(1)
             return True  #O(1)
         else:
             return False #O(1)
@@ -180,7 +259,9 @@ class SetLayerStore(LayerStore):
             a boolean without doing any iterations, etc.
         """
         if self.current_layers != None:  #O(1)
+            self.state_hash ^= layer_key(ROLE_SET, self.current_layers) #O(1)
             self.current_layers = None   #O(1)
+            self.changed() #O(1)
             return True   #O(1)
         else:
             return False  #O(1)
@@ -204,8 +285,134 @@ class SetLayerStore(LayerStore):
         because it always applies to a fixed (r,g,b) value tuple
         """
         special_layer = invert.apply(self.current_color, 0 , 0, 0) #O(1)
+        # Once special, the (frozen) colour is part of the state: swap the key of the old colour for the new one.
+        self.state_hash ^= color_key(self.current_color) if self.is_special else layer_key(ROLE_SPECIAL, invert) #O(1)
         self.is_special = True #O(1)
         self.current_color = special_layer #O(1)
+        self.state_hash ^= color_key(self.current_color) #O(1)
+        self.changed() #O(1)
+
+    def special_delta(self) -> tuple:
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            tuple -- the special state (is_special, current_color) from before the special, then after it
+        What it does:
+            Applies special. Only the special state changes, so that is all undo_special and redo_special need.
+            Redoing can't just apply special again, as the colour it inverts is the one last drawn.
+        Complexity:
+            Best case complexity == Worst case complexity == O(1)
+        """
+        is_special, color = self.is_special, self.current_color #O(1)
+        self.special() #O(1)
+        return is_special, color, self.is_special, self.current_color #O(1)
+
+    def _set_special_state(self, is_special: bool, color) -> None:
+        """
+        Args:
+            is_special: bool, color: the colour frozen while special
+        Raises:
+            None
+        Returns:
+            None
+        What it does:
+            Sets the special state, swapping its part of the hash (nothing unless special: the special key
+            and the frozen colour's) for the new one's. The layer is left as it is, whatever it now is.
+        Complexity:
+            Best case complexity == Worst case complexity == O(1)
+        """
+        if self.is_special: #O(1)
+            self.state_hash ^= layer_key(ROLE_SPECIAL, invert) ^ color_key(self.current_color) #O(1)
+        self.is_special, self.current_color = is_special, color #O(1)
+        if self.is_special: #O(1)
+            self.state_hash ^= layer_key(ROLE_SPECIAL, invert) ^ color_key(self.current_color) #O(1)
+        self.changed() #O(1)
+
+    def undo_special(self, delta: tuple) -> None:
+        """
+        Args:
+            delta: tuple -- returned by special_delta
+        Raises:
+            None
+        Returns:
+            None
+        What it does:
+            Puts the special state back as it was before the special.
+        Complexity:
+            Best case complexity == Worst case complexity == O(1)
+        """
+        self._set_special_state(*delta[:2]) #O(1)
+
+    def redo_special(self, delta: tuple) -> None:
+        """
+        Args:
+            delta: tuple -- returned by special_delta
+        Raises:
+            None
+        Returns:
+            None
+        What it does:
+            Puts the special state back as it was after the special.
+        Complexity:
+            Best case complexity == Worst case complexity == O(1)
+        """
+        self._set_special_state(*delta[2:]) #O(1)
+
+    def copy(self) -> SetLayerStore:
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            SetLayerStore -- an independent copy of this store
+        What it does:
+            Creates a new store with the same layer, colour and special state.
+        Complexity:
+            Best case complexity == Worst case complexity == O(1)
+        """
+        new_store = SetLayerStore() #O(1)
+        new_store.current_layers = self.current_layers #O(1)
+        new_store.current_color = self.current_color #O(1)
+        new_store.is_special = self.is_special #O(1)
+        new_store.state_hash = self.state_hash #O(1)
+        return new_store
+
+    def is_animated(self) -> bool:
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            bool -- True if the current layer is animated
+        What it does:
+            Once special has been used the colour is frozen, so the square is not animated
+            whatever the current layer is.
+        Complexity:
+            Best case complexity == Worst case complexity == O(1)
+        """
+        if self.current_layers == None or self.is_special: #O(1)
+            return False #O(1)
+        return self.current_layers.animated #O(1)
+
+    def stack(self) -> list[Layer]:
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            list[Layer] -- the current layer, or nothing
+        Complexity:
+            Best case complexity == Worst case complexity == O(1)
+        """
+        if self.current_layers == None: #O(1)
+            return [] #O(1)
+        return [self.current_layers] #O(1)
                                                                
 class AdditiveLayerStore(LayerStore):
     """
@@ -225,30 +432,20 @@ class AdditiveLayerStore(LayerStore):
             None
 
         What it does:
-            self.layer_counter: keeps track of the amount of layers. 
-
-            for layer in temp: Counts the amount of layers until it returns a None value,
-            which means all the layers have been counted for, and increment self.layer_counter
-
-            self.current_layers: A CircularQueue where the capacity is set to 100 times the amount of layers
+            self.current_layers: A GrowableCircularQueue, which starts small and doubles as layers are added,
+                rather than every square allocating room for 100 times the amount of layers up front.
             self.current_color: Keeps track of the current color. Initially None
 
         Complexity:
-            Best case complexity == Worst case complexity == O(n). Where n is the amount of layers.
-            The time complexity is O(n). the iteration has a linear time complexity proportional to the number of layers.
-            All the other operations (initializing variable, etc) are constant.           
+            Best case complexity == Worst case complexity == O(1)
         """
-        self.layer_counter = 0  #O(1)
-        temp = get_layers()     #O(1)
-        for layer in temp:      #O(n), where n is the amount of layers in the 'temp' collection
-            if layer == None:   #O(1)
-                break 
-            self.layer_counter += 1  #O(1)
-                                
-        
-        self.current_layers = CircularQueue(100*self.layer_counter) #O(1)
+        self.current_layers = GrowableCircularQueue() #O(1)
         self.current_color = None   #O(1)
         super().__init__() #O(1)
+        # The queue is ordered, so state_hash is a polynomial hash of the layers from the front,
+        # and reverse_hash the same from the back (which special swaps in). hash_power is POLY_BASE ** length.
+        self.reverse_hash = 0 #O(1)
+        self.hash_power = 1 #O(1)
 
     def get_color(self, start, timestamp, x, y) -> tuple[int, int, int]:
         """
@@ -259,7 +456,7 @@ class AdditiveLayerStore(LayerStore):
             y: int - position from height dimension
 
         Raises:
-            TypeError: if timestamp, x or y is not an integer and if start not a tuple of a tuple of (r,g,b) integers
+            TypeError: if timestamp is not a number, x or y is not an integer, or start is not an (r,g,b) colour
 
         Returns:
             self.current_color: tuple[int, int, int] --  (r,g,b) color
@@ -267,15 +464,10 @@ class AdditiveLayerStore(LayerStore):
         What it does:
             If there are no layers, set the current color to the given start color and return it.
 
-            Otherwise, we iterate over the amount of layers in the queue. 
-
-            If there isn't a color yet, we remove and take the oldest remaining layer, then append it back to the queue. 
-            Then, apply the oldest remaining layer to the 'start' color, and update the current color with it.
+            Otherwise, we iterate over the layers in the queue from oldest to youngest (without serving them),
+            applying each one to the colour so far, starting from the 'start' color.
 
-            else, we follow the same set of instructions as above, the only difference is that we apply the oldest remaning layer
-            to the current color instead of the 'start' color.
-
-            Finally, return the current color.
+            Finally, update the current color with the result and return it.
 
         Complexity:
             Best case complexity = O(n) == Worst case complexity = O(n) -- when there 
@@ -286,10 +478,10 @@ class AdditiveLayerStore(LayerStore):
 
         """
 
-        if not isinstance(start, tuple) and len(start) == 3 and all(isinstance(i, int) for i in start): #O(1)
+        if not (isinstance(start, (tuple, list)) and len(start) == 3): #O(1)
             raise TypeError("start must be a tuple of (r,g,b) integers") 
-        if not isinstance(timestamp, int): #O(1)
-            raise TypeError("timestamp must be an integer")
+        if not isinstance(timestamp, (int, float)): #O(1)
+            raise TypeError("timestamp must be a number")
         if not isinstance(x, int): #O(1)
             raise TypeError("x must be an integer")
         if not isinstance(y, int): #O(1)
@@ -300,19 +492,11 @@ class AdditiveLayerStore(LayerStore):
             return start #O(1)
 
         else:
-            for _ in range(self.current_layers.length):  #O(n) - where n is the number of layers in the queue    
-                if self.current_color == None: #O(1)                    
-                    new_layer:Layer = self.current_layers.serve() #O(1)
-                    self.current_layers.append(new_layer) #O(1)
-                    served_layer = new_layer.apply(start, timestamp , x, y) #O(1) 
-                    self.current_color = served_layer   #O(1)
-                else:
-                    new_layer:Layer = self.current_layers.serve() #O(1)     
-                    self.current_layers.append(new_layer) #O(1)
-                    served_layer = new_layer.apply(self.current_color, timestamp, x, y) #O(1)
-                    self.current_color = served_layer   #O(1)                                
-
-            return self.current_color #O(1)
+            color = start #O(1) -- layers are applied to the start colour afresh on every call
+            for layer in self.current_layers:  #O(n) - where n is the number of layers in the queue
+                color = layer.apply(color, timestamp, x, y) #O(1)
+            self.current_color = color #O(1)
+            return color #O(1)
 
 
     def add(self, layer: Layer) -> bool:
@@ -332,7 +516,12 @@ class AdditiveLayerStore(LayerStore):
         if not isinstance(layer, Layer): #O(1)
             return TypeError("layer must be a Layer Class type")
         
-        self.current_layers.append(layer) #O(1), Queue implementation doesn't have resize
+        self.current_layers.append(layer) #O(1) amortised, the queue doubles when full
+        value = layer_key(ROLE_LIST, layer) % POLY_PRIME #O(1)
+        self.state_hash = (self.state_hash + value * self.hash_power) % POLY_PRIME #O(1)
+        self.reverse_hash = (self.reverse_hash * POLY_BASE + value) % POLY_PRIME #O(1)
+        self.hash_power = self.hash_power * POLY_BASE % POLY_PRIME #O(1)
+        self.changed() #O(1)
         return True
         
     def erase(self, layer: Layer) -> bool:
@@ -352,7 +541,12 @@ class AdditiveLayerStore(LayerStore):
         Complexity:
             Best case complexity == Worst case complexity == O(1), we are only removing a layer from the front of the queue.
         """
-        self.current_layers.serve() #O(1)
+        served_layer:Layer = self.current_layers.serve() #O(1)
+        value = layer_key(ROLE_LIST, served_layer) % POLY_PRIME #O(1)
+        self.hash_power = self.hash_power * POLY_BASE_INV % POLY_PRIME #O(1)
+        self.state_hash = (self.state_hash - value) * POLY_BASE_INV % POLY_PRIME #O(1)
+        self.reverse_hash = (self.reverse_hash - value * self.hash_power) % POLY_PRIME #O(1)
+        self.changed() #O(1)
         return True
     
     def special(self):
@@ -367,7 +561,7 @@ class AdditiveLayerStore(LayerStore):
             The special mode on an additive layer reverses the "ages" of each layer, so the oldest layer is now the youngest 
             layer, and so on.
 
-            First, Create a stack with the same capacity as the queue, take out all the elements in the queue until it's empty and push
+            First, Create a stack with room for the layers in the queue, take out all the elements in the queue until it's empty and push
             all the elements into the stack. Then, take out all the elements in the stack until it's empty, and push all the 
             elements back into the queue. Now, all the elements in the queue will be in a reversed order.
         Complexity:
@@ -383,15 +577,109 @@ class AdditiveLayerStore(LayerStore):
             of the function is O(n + n), which simplifies to O(n).
 
         """
-        stack = ArrayStack(100*self.layer_counter)                                           
+        stack = GrowableArrayStack(len(self.current_layers)) #O(n)
         while self.current_layers.is_empty() == False: #O(1)
             served_layer = self.current_layers.serve() #O(1)
-            stack.push(served_layer) #O(1) -- stack doesn't have resize implementation                  
+            stack.push(served_layer) #O(1) -- the stack already has room for every layer
         
         while stack.is_empty() == False: #O(1)               
             peeked_layer = stack.peek() #O(1)                
             stack.pop() #O(1)                                
             self.current_layers.append(peeked_layer) #O(1)
+
+        if self.state_hash != self.reverse_hash: #O(1) -- otherwise the layers read the same both ways
+            self.state_hash, self.reverse_hash = self.reverse_hash, self.state_hash #O(1)
+            self.changed() #O(1)
+
+    def special_delta(self) -> None:
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            None -- reversing the layers again undoes (and redoes) the special, so there is nothing to keep
+        What it does:
+            Applies special.
+        Complexity:
+            Best case complexity == Worst case complexity == O(n), where n is the number of layers.
+        """
+        self.special() #O(n)
+
+    def undo_special(self, delta: None) -> None:
+        """
+        Args:
+            delta: None -- returned by special_delta
+        Raises:
+            None
+        Returns:
+            None
+        What it does:
+            Reverses the layers back, which undoes the special.
+        Complexity:
+            Best case complexity == Worst case complexity == O(n), where n is the number of layers.
+        """
+        self.special() #O(n)
+
+    redo_special = undo_special
+
+    def copy(self) -> AdditiveLayerStore:
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            AdditiveLayerStore -- an independent copy of this store
+        What it does:
+            Creates a new store holding the same layers in the same order.
+            The constructor is skipped, as it would allocate a queue again.
+            The queue's array is copied across as it is (in one go), along with its front and rear.
+        Complexity:
+            Best case complexity == Worst case complexity == O(c)
+            Where c is the capacity of the queue (at most twice the number of layers), copied in C.
+        """
+        new_store = AdditiveLayerStore.__new__(AdditiveLayerStore) #O(1)
+        new_store.current_layers = self.current_layers.copy() #O(c)
+        new_store.current_color = self.current_color #O(1)
+        new_store.state_hash = self.state_hash #O(1)
+        new_store.reverse_hash = self.reverse_hash #O(1)
+        new_store.hash_power = self.hash_power #O(1)
+        new_store.owner = None #O(1)
+        new_store.position = (0, 0) #O(1)
+        return new_store
+
+    def is_animated(self) -> bool:
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            bool -- True if any of the layers is animated
+        What it does:
+            Iterates over the queue (leaving it as it was), stopping at the first animated layer.
+        Complexity:
+            Best case complexity == O(1), when the oldest layer is animated
+            Worst case complexity == O(n), where n is the number of layers in the queue.
+        """
+        return any(layer.animated for layer in self.current_layers) #O(n)
+
+    def stack(self) -> list[Layer]:
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            list[Layer] -- the layers in the queue, oldest first
+        What it does:
+            Iterates over the queue from front to rear (leaving it as it was).
+        Complexity:
+            Best case complexity == Worst case complexity == O(n)
+            Where n is the number of layers in the queue.
+        """
+        return list(self.current_layers) #O(n)
         
 class SequenceLayerStore(LayerStore):
     """
@@ -439,7 +727,7 @@ class SequenceLayerStore(LayerStore):
             y: int - position from height dimension
 
         Raises:
-            TypeError: if timestamp, x or y is not an integer and if start not a tuple of a tuple of (r,g,b) integers
+            TypeError: if timestamp is not a number, x or y is not an integer, or start is not an (r,g,b) colour
 
         What it does:   
             if self.current_layers.is_empty(): If there are no layers currently, 
@@ -450,30 +738,22 @@ class SequenceLayerStore(LayerStore):
             be applied, we use the difference method where we take all the layers that are in 'applying' 
             but not in 'not applying'
 
-            for layers in self.current_layers: for all the items in the list
-            if layers == None: break out of the loop if we've accounted for all the layers
-            layer_index = layers.key: take the layer.key value out of the ListItem() object 
-            if layer_index in applied_layers: if the layer's index is in the applied layers set
-
-            if self.current_color == None: then we apply it to the 'start' color if the current color doesn't exist
-            and update the current color to the new one
-
-            Otherwise, we just take the layer and apply it to the current color and update the current color.
+            The layers in 'applying' are exactly those in the list (add and special keep them in step),
+            so we iterate over the bits of applied_layers directly, smallest index first, and apply each
+            layer to the current color in turn, starting from 'start'.
 
             Finally, return the current color
         Complexity:
-            Best case complexity = O(1). when the first element of the input array is the target value.
-            the function would return immediately without iterating over any of the remaining elements. 
-            In this case, the time complexity would be O(1).
+            Best case complexity = O(1) -- when there are no layers.
 
-            Worst case complexity = O(n+m). where n is the number of layers in the self.current_layers and m is the
-            amount of elements in the applied_layers set. 
+            Worst case complexity = O(m). where m is the amount of elements in the applied_layers set
+            (each found by extracting the lowest set bit).
         """
 
-        if not isinstance(start, tuple) and len(start) == 3 and all(isinstance(i, int) for i in start): #O(1)
+        if not (isinstance(start, (tuple, list)) and len(start) == 3): #O(1)
             raise TypeError("start must be a tuple of (r,g,b) integers") 
-        if not isinstance(timestamp, int): #O(1)
-            raise TypeError("timestamp must be an integer")
+        if not isinstance(timestamp, (int, float)): #O(1)
+            raise TypeError("timestamp must be a number")
         if not isinstance(x, int): #O(1)
             raise TypeError("x must be an integer")
         if not isinstance(y, int): #O(1)
@@ -485,26 +765,12 @@ class SequenceLayerStore(LayerStore):
         
         else:
             
-            applied_layers:BSet = self.applying.difference(self.not_applying) #O(n+m)
-                                                    
-            for layers in self.current_layers:#O(n) - where n is the amount of elements in the list
-                layers:ListItem  #O(1)                        
-                if layers == None:  #O(1)
-                    break    
-                layers.key:int
-                layer_index:int = layers.key #O(1)          
-                if layer_index in applied_layers: #O(m) - where m is the amount of elements in the set
-                    
-                    if self.current_color == None: #O(1)                       
-                        layer_color:Layer = layers.value #O(1)                          
-                        new_layers = layer_color.apply(start,timestamp,x,y) #O(1)
-                        self.current_color = new_layers #O(1)                    
-                        
-                    else:
-                        layer_color_:Layer = layers.value #O(1)                                       
-                        new_layers = layer_color_.apply(self.current_color, timestamp, x, y) #O(1)
-                        self.current_color = new_layers #O(1)                                     
-            
+            applied_layers:BSet = self.applying.difference(self.not_applying) #O(1)
+            layers = get_layers() #O(1)
+            color = start #O(1) -- layers are applied to the start colour afresh on every call
+            for key in applied_layers: #O(m) - where m is the amount of elements in the set
+                color = layers[key - 1].apply(color, timestamp, x, y) #O(1)
+            self.current_color = color #O(1)
             return self.current_color #O(1) 
             
     def add(self, layer: Layer) -> bool:
@@ -522,20 +788,26 @@ class SequenceLayerStore(LayerStore):
         Set elements should be integers')"
 
         Complexity:
-        Best case complexity = O(1) --  if the layer already exists in self.current_layers 
-        Worst case complexity = O(n) -- if when adding, the list is full and needs to be resized
+        Best case complexity = O(log n) --  if the layer already exists in self.current_layers 
+        Worst case complexity = O(n) -- if when adding, the list is full and needs to be resized, or the layer
+        goes before the others and they are shuffled along (in C)
 
-        The average time complexity is O(n) as we are on average traversing through self.current_layers
-        to check whether element is in it or not.
+        Checking whether element is in self.current_layers is a binary search by key, as keys are unique.
         """
         if not isinstance(layer, Layer): #O(1)
             return TypeError("layer must be a Layer Class type")
 
+        old_hash = self.state_hash #O(1)
         element = ListItem(value=layer, key=layer.index+1) #O(1)
-        if element not in self.current_layers: #O(n)             
+        if element not in self.current_layers: #O(log n)             
             self.current_layers.add(element) #O(log n)              
+            self.state_hash ^= layer_key(ROLE_LIST, layer) #O(1)
         
+        if layer.index+1 not in self.applying: #O(1)
+            self.state_hash ^= layer_key(ROLE_APPLYING, layer) #O(1)
         self.applying.add(layer.index+1) #O(1)                   
+        if self.state_hash != old_hash: #O(1)
+            self.changed() #O(1)
         return True
 
     def erase(self, layer: Layer) -> bool:
@@ -554,49 +826,48 @@ class SequenceLayerStore(LayerStore):
         if not isinstance(layer, Layer): #O(1)
             return TypeError("layer must be a Layer Class type")
 
+        if layer.index+1 not in self.not_applying: #O(1)
+            self.state_hash ^= layer_key(ROLE_NOT_APPLYING, layer) #O(1)
+            self.changed() #O(1)
         self.not_applying.add(layer.index+1) #O(1)                
         return True
 
-    def special(self):
+    def special(self) -> Layer|None:
         """
         Args:
             self
         Raises:
             None
         Returns:
-            None
+            Layer|None -- the layer removed (None if there are no layers)
         What it does:
-            Sort the layers in a lexicographical order by creating a ListItem() instance for each
+            Rank the layers in a lexicographical order by creating a ListItem() instance for each
         layer along with their ordered keys. 
 
         the_index: variable that holds the index for the median applying layer
-        temporary_layers = ArraySortedList(0): Create a temporary sorted list
+        names = BSet(10): the set of the ranks of the names of the layers in the list
         elements: variable that holds all ListItem instances made
 
         for layers in self.current_layers: For all the items in the list, if layers is None then we have 
         accounted for all the layers.
 
         for items in elements: for all the items in the element variable, if their item.value(layer) is the same,
-        then we add the items to the temporary sorted list.
+        then we add the item's rank to names.
 
         if n % 2 == 0: if it's an even number of applying layers, select the lexicographically smaller of the two names.
         Otherwise, select the median applying one.
 
-        temporary_layers.delete_at_index(the_index): delete the median applying layer at the given index
-        self.current_layers = ArraySortedList(0): reset the current layers
-
-        for elems in temporary_layers: #for items in the new sorted list, get the layer value of the item
-        and call the add function to add it back to the recently reset current layers.
+        names.select(the_index): the rank of the median name, so the median layer is elements[rank - 1].
+        It is removed from the list (found by binary search) and from 'applying', which stays in step with the list
+        (see redo_special).
 
         Complexity:
-        Best-case complexity: O(n log n) -- when the input layers are already sorted lexicographically, 
-        resulting in no swaps during sorting.
-
-        Worst-case complexity: O(n^2 log n) -- when the input layers are reverse sorted lexicographically, 
-        resulting in n^2 swaps.   
+        Best-case complexity == Worst-case complexity: O(n) -- n is the number of layers in the list,
+        each ranked in O(1); selecting the median is a binary search over the bits of names,
+        and removing it from the list shuffles the layers after it along (in C).
         """
         #black, blue, darken, green, invert, lighten, rainbow, red, sparkle
-        temporary_layers = ArraySortedList(0) #O(1)
+        names = BSet(10) #O(1) -- the rank of the name of every layer in the list
         the_index:int = 0  #O(1)                     
 
         item1 = ListItem(black, 1) 
@@ -617,26 +888,146 @@ class SequenceLayerStore(LayerStore):
                     break
             for items in elements: #O(1)  
                 if layers.value == items.value: #O(1)
-                    temporary_layers.add(items) #O(log n) 
+                    names.add(items.key) #O(1)
                     
-        n = temporary_layers.length #O(1)
+        n = len(names) #O(1)
 
         if n % 2 == 0: #O(1)
             the_index = (n // 2) - 1 #O(1)
         else: 
             the_index = n // 2 #O(1)
 
-        if temporary_layers.is_empty(): #O(1)
-            return
-        
-        temporary_layers.delete_at_index(the_index) #O(log n) -- n is the length of temporary_layers
-        self.current_layers = ArraySortedList(0) #O(1)
+        if names.is_empty(): #O(1)
+            return None
         
-        for elems in temporary_layers: #O(n)
-            elems:ListItem
-            if elems == None:#O(1)
-                break
-            new_layer = elems.value #O(1)
-            self.add(new_layer)  #O(log n)           
+        median:Layer = elements[names.select(the_index) - 1].value #O(1)
+        self.redo_special(median) #O(n)
+        return median
 
+    def special_delta(self) -> Layer|None:
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            Layer|None -- the layer the special removed (None if the list was empty)
+        What it does:
+            Applies special. The removed layer is all undo_special and redo_special need.
+        Complexity:
+            Best case complexity == Worst case complexity == O(n), as special.
+        """
+        return self.special() #O(n)
+
+    def undo_special(self, delta: Layer|None) -> None:
+        """
+        Args:
+            delta: Layer|None -- returned by special_delta
+        Raises:
+            None
+        Returns:
+            None
+        What it does:
+            Puts the layer the special removed back in the list and in 'applying', unless it is already
+            (painted again since, say): whatever else happened to the store since the special is left as it is.
+        Complexity:
+            Best case complexity == Worst case complexity == O(n) -- the layers after it are shuffled along (in C).
+        """
+        if delta is None: #O(1)
+            return
+        element = ListItem(value=delta, key=delta.index+1) #O(1)
+        if element not in self.current_layers: #O(log n)
+            self.current_layers.add(element) #O(n)
+            self.state_hash ^= layer_key(ROLE_LIST, delta) #O(1)
+        if delta.index+1 not in self.applying: #O(1)
+            self.applying.add(delta.index+1) #O(1)
+            self.state_hash ^= layer_key(ROLE_APPLYING, delta) #O(1)
+        self.changed() #O(1)
+
+    def redo_special(self, delta: Layer|None) -> None:
+        """
+        Args:
+            delta: Layer|None -- returned by special_delta
+        Raises:
+            None
+        Returns:
+            None
+        What it does:
+            Removes the layer the special removed from the list and from 'applying' again
+            (which keeps 'applying' in step with the list), as far as it is in them.
+        Complexity:
+            Best case complexity == Worst case complexity == O(n) -- the layers after it are shuffled along (in C).
+        """
+        if delta is None: #O(1)
+            return
+        element = ListItem(value=delta, key=delta.index+1) #O(1)
+        if element in self.current_layers: #O(log n)
+            self.current_layers.remove(element) #O(n) -- shuffled along in C
+            self.state_hash ^= layer_key(ROLE_LIST, delta) #O(1)
+        if delta.index+1 in self.applying: #O(1)
+            self.applying.remove(delta.index+1) #O(1)
+            self.state_hash ^= layer_key(ROLE_APPLYING, delta) #O(1)
+        self.changed() #O(1)
+
+    def copy(self) -> SequenceLayerStore:
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            SequenceLayerStore -- an independent copy of this store
+        What it does:
+            Creates a new store with the same list of layers and the same applying / not applying sets.
+            The list is already sorted, so its items are copied across in one go.
+        Complexity:
+            Best case complexity == Worst case complexity == O(n)
+            Where n is the capacity of the current layers list.
+        """
+        new_store = SequenceLayerStore() #O(1)
+        new_store.current_layers = ArraySortedList(len(self.current_layers.array)) #O(n)
+        new_store.current_layers.array.copy_from(self.current_layers.array, count=len(self.current_layers)) #O(n), in C
+        new_store.current_layers.length = self.current_layers.length #O(1)
+        new_store.applying.elems = self.applying.elems #O(1)
+        new_store.not_applying.elems = self.not_applying.elems #O(1)
+        new_store.current_color = self.current_color #O(1)
+        new_store.state_hash = self.state_hash #O(1)
+        return new_store
+
+    def is_animated(self) -> bool:
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            bool -- True if any of the applied layers is animated
+        What it does:
+            As in get_color, a layer is applied if its index is in 'applying' but not in 'not applying'.
+        Complexity:
+            Best case complexity = O(1) -- when there are no layers.
+            Worst case complexity = O(m), where m is the amount of elements in the applied layers set.
+        """
+        layers = get_layers() #O(1)
+        for key in self.applying.difference(self.not_applying): #O(m)
+            if layers[key - 1].animated: #O(1)
+                return True #O(1)
+        return False #O(1)
+
+    def stack(self) -> list[Layer]:
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            list[Layer] -- the applied layers, in order of index
+        What it does:
+            As in get_color, a layer is applied if its index is in 'applying' but not in 'not applying'.
+        Complexity:
+            Best case complexity = O(1) -- when there are no layers.
+            Worst case complexity = O(m), where m is the amount of elements in the applied layers set.
+        """
+        layers = get_layers() #O(1)
+        return [layers[key - 1] for key in self.applying.difference(self.not_applying)] #O(m)
         
@@ -1,15 +1,26 @@
 """
 Layer Util functions & definition.
 
+Calls of the layers can be counted and timed (see count_calls and time_calls),
+to see which layers a session spends its time in (see layer_costs).
+
 No need to edit unless adding new features.
 """
 
 from __future__ import annotations
 from dataclasses import dataclass, field
+import csv
+import json
+import time
 from data_structures.referential_array import ArrayR
 
 LAYERS: ArrayR[Layer] = ArrayR(20)
 cur_layer_index = 0
+# Whether calls of each layer's apply are being counted (see count_calls), and timed (see time_calls).
+counting = False
+timing = False
+# Time spent so far in layers called by the layer call in progress (as sparkle calls lighten and darken).
+_nested_seconds = 0.0
 
 @dataclass
 class Layer:
@@ -18,12 +29,27 @@ class Layer:
     apply: function
     name: str = field(init=False)
     bg: tuple[int, int, int] | None = None
+    animated: bool = False
+    # Calls of apply so far, while they are counted (see count_calls);
+    # and the time spent in them (less that in the layers they call), while they are timed (see time_calls).
+    calls: int = field(default=0, init=False, repr=False, compare=False)
+    seconds: float = field(default=0.0, init=False, repr=False, compare=False)
 
     def __post_init__(self):
         if hasattr(self.apply, "__bg__"):
             self.bg = self.apply.__bg__
+        if hasattr(self.apply, "__animated__"):
+            self.animated = self.apply.__animated__
         self.name = self.apply.__name__
 
+    def __reduce__(self):
+        # Layers are registered once per process, so they are pickled as their index
+        # (their apply functions can't be pickled by name, as the name is bound to the Layer).
+        return _registered_layer, (self.index,)
+
+def _registered_layer(index: int) -> Layer:
+    return get_layers()[index]
+
 class background(object):
     """Simple decorator to add a __bg__ property to a layer
 
@@ -43,6 +69,23 @@ class background(object):
         func.__bg__ = self.val
         return layer
 
+def animated(layer: function|Layer):
+    """Decorator to mark a layer whose colour changes with the timestamp,
+    so squares it is applied to have to be redrawn every frame.
+
+    Usage:  @register
+            @animated
+            def my_special_layer(...):
+    """
+    # This could be applied before or after registration
+    if isinstance(layer, Layer):
+        layer.animated = True
+        func = layer.apply
+    else:
+        func = layer
+    func.__animated__ = True
+    return layer
+
 def register(func):
     """
     Layer register function.
@@ -55,9 +98,129 @@ def register(func):
     """
     global cur_layer_index
     LAYERS[cur_layer_index] = Layer(cur_layer_index, func)
+    if counting or timing:
+        _instrument(LAYERS[cur_layer_index])
     cur_layer_index += 1
     return LAYERS[cur_layer_index-1]
 
+def _instrument(layer: Layer):
+    """Wrap layer's own apply function to count (and time) its calls, as counting and timing are on, or unwrap it."""
+    func = getattr(layer.apply, "__instrumented__", layer.apply)
+    if timing:
+        def apply(color, timestamp, x, y):
+            global _nested_seconds
+            outer_nested, _nested_seconds = _nested_seconds, 0.0
+            start = time.perf_counter()
+            try:
+                return func(color, timestamp, x, y)
+            finally:
+                elapsed = time.perf_counter() - start
+                layer.calls += 1
+                layer.seconds += elapsed - _nested_seconds
+                _nested_seconds = outer_nested + elapsed
+    elif counting:
+        def apply(color, timestamp, x, y):
+            layer.calls += 1
+            return func(color, timestamp, x, y)
+    else:
+        layer.apply = func
+        return
+    apply.__name__ = func.__name__
+    apply.__instrumented__ = func
+    layer.apply = apply
+
+def _instrument_all():
+    for layer in LAYERS:
+        if layer is None:
+            break
+        _instrument(layer)
+
+def count_calls(enabled: bool = True):
+    """
+    Start (or with enabled False, stop) counting the calls of every layer's apply, in Layer.calls.
+    Layers neither counted nor timed call their own function, so cost nothing extra.
+    """
+    global counting
+    counting = enabled
+    _instrument_all()
+
+def time_calls(enabled: bool = True):
+    """
+    Start (or with enabled False, stop) counting and timing the calls of every layer's apply,
+    in Layer.calls and Layer.seconds. Layers registered while timing are timed from the start.
+    A layer's time leaves out that of the layers it calls itself, so the times of all the layers add up
+    to the time spent applying layers.
+    """
+    global timing
+    timing = enabled
+    _instrument_all()
+
+def total_calls() -> int:
+    """Calls of every layer's apply counted so far."""
+    return sum(layer.calls for layer in LAYERS if layer is not None)
+
+@dataclass
+class LayerCost:
+    """What a layer's apply calls have cost so far (see time_calls)."""
+
+    index: int
+    name: str
+    calls: int
+    seconds: float
+    # Fraction of the time spent in all layers.
+    share: float
+
+    @property
+    def mean(self) -> float:
+        """Seconds per call."""
+        return self.seconds / self.calls if self.calls else 0.0
+
+def layer_costs() -> list[LayerCost]:
+    """Every layer that has been called, the costliest (by total time, then calls) first."""
+    layers = [layer for layer in get_layers() if layer is not None and layer.calls]
+    total = sum(layer.seconds for layer in layers)
+    costs = [
+        LayerCost(layer.index, layer.name, layer.calls, layer.seconds, layer.seconds / total if total else 0.0)
+        for layer in layers
+    ]
+    costs.sort(key=lambda cost: (cost.seconds, cost.calls), reverse=True)
+    return costs
+
+def reset_costs():
+    """Start every layer's calls and time from 0."""
+    for layer in LAYERS:
+        if layer is None:
+            break
+        layer.calls = 0
+        layer.seconds = 0.0
+
+def format_costs(costs: list[LayerCost]) -> str:
+    """costs as a table, one layer per line."""
+    lines = [f"{'layer':<12} {'calls':>10} {'total (ms)':>11} {'mean (us)':>10} {'share':>7}"]
+    for cost in costs:
+        lines.append(f"{cost.name:<12} {cost.calls:>10} {cost.seconds*1000:>11.2f} {cost.mean*1e6:>10.2f} {cost.share:>7.1%}")
+    return "\n".join(lines)
+
+def write_costs(path: str, costs: list[LayerCost]):
+    """
+    Write costs to path: as CSV if it ends in .csv, as JSON otherwise, or as a table to stdout if path is "-".
+    """
+    if path == "-":
+        print(format_costs(costs))
+        return
+    rows = [
+        {"index": c.index, "name": c.name, "calls": c.calls, "seconds": c.seconds, "mean": c.mean, "share": c.share}
+        for c in costs
+    ]
+    with open(path, "w", newline="") as f:
+        if path.endswith(".csv"):
+            writer = csv.DictWriter(f, ["index", "name", "calls", "seconds", "mean", "share"])
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            json.dump(rows, f, indent=2)
+            f.write("\n")
+
 def get_layers():
     import layers # Force all registrations to occur.
     return LAYERS
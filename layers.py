@@ -3,9 +3,10 @@ All layers are defined here.
 """
 
 import colorsys
-from layer_util import background, register
+from layer_util import animated, background, register
 
 @register
+@animated
 @background(200, 0, 120)
 def rainbow(color, timestamp, x, y):
     return tuple(
@@ -50,6 +51,7 @@ def blue(color, timestamp, x, y):
     return (0, 0, 255)
 
 @register
+@animated
 @background(100, 170, 255)
 def sparkle(color, timestamp, x, y):
     ts = int((timestamp + x/3 + y/5) * 3)
@@ -1,13 +1,21 @@
+import os
 import arcade
 import arcade.key as keys
-import math
 from grid import Grid
-from layer_util import get_layers, Layer
+from layer_util import get_layers, layer_costs, time_calls, write_costs, Layer
 from layers import lighten
 from layer_store import *
 from undo import *
 from action import *
 from replay import *
+from raster import supercover_line
+from brush import BRUSH_SHAPES, BrushStencil, get_stencil
+from journal import CODEC_ZLIB, JournalError, JournalWriter
+from animation import FrameDiffer
+from autosave import AUTOSAVE_INTERVAL, AutosaveError, Autosaver, load_autosave
+from clock import WallClock
+from profiler import (COUNT_GET_COLOR, HISTOGRAM_BUCKET, SECTION_GRID, SECTION_RECTANGLES, SECTION_UI,
+                      SECTION_UPDATE, FrameProfiler)
 
 class MyWindow(arcade.Window):
     """ Painter Window """
@@ -20,6 +28,45 @@ class MyWindow(arcade.Window):
 
     REPLAY_TIMER_DELTA = 0.05
 
+    # How the replay advances each update.
+    # STEP: one action every REPLAY_TIMER_DELTA seconds.
+    # SPEED: REPLAY_SPEED times as many actions as STEP would play.
+    # BUDGET: as many actions as fit in REPLAY_FRAME_BUDGET seconds per update.
+    # CATCH_UP: everything that is left, in a single update.
+    REPLAY_MODE_STEP = "STEP"
+    REPLAY_MODE_SPEED = "SPEED"
+    REPLAY_MODE_BUDGET = "BUDGET"
+    REPLAY_MODE_CATCH_UP = "CATCH_UP"
+    REPLAY_MODE = REPLAY_MODE_STEP
+    REPLAY_SPEED = 1
+    REPLAY_FRAME_BUDGET = 0.008
+    # Height of the timeline scrubber shown along the bottom of the canvas during replays.
+    SCRUBBER_HEIGHT = 12
+
+    # Accumulate a whole drag into a single (deduplicated) undo/replay action.
+    STROKE_MODE = True
+
+    # If set, every action is recorded to an on-disk journal at this path, so sessions
+    # are not limited in length and can be recovered after a crash.
+    JOURNAL_PATH = None
+    JOURNAL_CODEC = CODEC_ZLIB
+
+    # If set, the canvas (and the replay history, unless a journal keeps it) is saved to this path
+    # every AUTOSAVE_INTERVAL seconds, in the background, and restored from it on start.
+    AUTOSAVE_PATH = None
+    AUTOSAVE_INTERVAL = AUTOSAVE_INTERVAL
+
+    # If set, frames are timed from the start, with the timings shown over the canvas.
+    # PROFILE_KEY toggles this at any time; the timings are also kept in window.profiler (see profiler.py).
+    PROFILE = False
+    PROFILE_KEY = keys.F3
+    PROFILE_WIDTH = 420
+    PROFILE_LINE_HEIGHT = 16
+
+    # If set, the calls of every layer are counted and timed, and what each layer cost is written
+    # to this path (as CSV if it ends in .csv, JSON otherwise) on closing.
+    LAYER_COSTS_PATH = None
+
     GRID_SIZE_X = 32
     GRID_SIZE_Y = 32
 
@@ -28,11 +75,16 @@ class MyWindow(arcade.Window):
     # SCAFFOLD PART
     # Unless you're adding new features, you shouldn't need to touch this.
 
-    def __init__(self) -> None:
-        """Initialise visual and logic variables."""
+    def __init__(self, clock=None) -> None:
+        """
+        Initialise visual and logic variables. The window's time (timestamp) is clock's (the real time by default),
+        which scripts driving the window sleep on.
+        """
         super().__init__(self.SCREEN_WIDTH, self.SCREEN_HEIGHT, self.SCREEN_TITLE)
         arcade.set_background_color(self.BG)
+        self.clock = clock if clock is not None else WallClock()
         self.grid: Grid = None
+        self.canvas: FrameDiffer = None
         self.draw_style = Grid.DRAW_STYLE_SET
         self.z_pressed = False
         self.y_pressed = False
@@ -40,12 +92,26 @@ class MyWindow(arcade.Window):
         self.y_timer = 0
         self.enable_ui = True
         self.replay_timer = 0
+        self.replay_paused = False
+        self.scrubbing = False
+        self.replay_mode = self.REPLAY_MODE
+        self.replay_speed = self.REPLAY_SPEED
+        self.journal_resumed = False
+        self.autosaver: Autosaver = None
+        self.autosave_restored = False
+        self.profiler = FrameProfiler()
+        if self.PROFILE:
+            self.profiler.enable()
+        if self.LAYER_COSTS_PATH is not None:
+            time_calls()
         self.on_init()
 
     def reset(self) -> None:
         """Reset the screen."""
         self.grid = Grid(self.draw_style, self.GRID_SIZE_X, self.GRID_SIZE_Y)
+        # Seconds since the reset, by the window's clock: taken once an update, so a frame is drawn at a single time.
         self.timestamp = 0
+        self.reset_time = self.clock()
 
         self.selected_layer_index = -1
         self.dragging = None
@@ -104,36 +170,90 @@ class MyWindow(arcade.Window):
         """Set up the game and initialize the variables."""
         self.reset()
 
+    def on_close(self) -> None:
+        """Make sure the journal, autosave and layer costs are written out before closing."""
+        self.replay_tracker.close()
+        if self.autosaver is not None:
+            self.autosaver.close()
+        if self.LAYER_COSTS_PATH is not None:
+            write_costs(self.LAYER_COSTS_PATH, layer_costs())
+        super().on_close()
+
     def on_draw(self) -> None:
         """Draw everything"""
-        self.clear()
-        # UI - Layers
-        for i, layer in enumerate(get_layers()):
-            if layer is None: break
-            xstart = (i % 2) * self.LAYER_BUTTON_SIZE + self.DRAW_PANEL
-            xend = ((i % 2)+1) * self.LAYER_BUTTON_SIZE + self.DRAW_PANEL
-            ystart = self.SCREEN_HEIGHT - (i//2) * self.LAYER_BUTTON_SIZE
-            yend = self.SCREEN_HEIGHT - (i//2+1) * self.LAYER_BUTTON_SIZE
-            bg = lighten.apply(layer.bg or self.BG[:], 0, 0, 0) if self.selected_layer_index == i else (layer.bg or self.BG[:])
+        with self.profiler.section(SECTION_UI):
+            self.clear()
+            # UI - Layers
+            for i, layer in enumerate(get_layers()):
+                if layer is None: break
+                xstart = (i % 2) * self.LAYER_BUTTON_SIZE + self.DRAW_PANEL
+                xend = ((i % 2)+1) * self.LAYER_BUTTON_SIZE + self.DRAW_PANEL
+                ystart = self.SCREEN_HEIGHT - (i//2) * self.LAYER_BUTTON_SIZE
+                yend = self.SCREEN_HEIGHT - (i//2+1) * self.LAYER_BUTTON_SIZE
+                bg = lighten.apply(layer.bg or self.BG[:], 0, 0, 0) if self.selected_layer_index == i else (layer.bg or self.BG[:])
+                if not self.enable_ui:
+                    bg = lighten.apply(bg, 0, 0, 0)
+                arcade.draw_lrtb_rectangle_filled(xstart, xend, ystart, yend, bg)
+                arcade.draw_lrtb_rectangle_outline(
+                    xstart, xend, ystart, yend, (0, 0, 0), border_width=1,
+                )
+                arcade.draw_text(str(i), xstart, (ystart+yend)/2, (0, 0, 0), 18, width=xend-xstart, align="center", bold=True, anchor_y="center")
+            # UI - Draw Modes / Action buttons
+            self.action_buttons.draw()
+        # Grid: colours are only worked out again for squares that changed this frame, or are animated.
+        with self.profiler.section(SECTION_GRID):
+            if self.canvas is None or self.canvas.grid is not self.grid:
+                if self.canvas is not None:
+                    self.canvas.close()
+                self.canvas = FrameDiffer(self.grid, self.BG[:])
+            self.grid.changes.publish()
+            self.canvas.update(self.grid, self.timestamp)
+        self.profiler.count(COUNT_GET_COLOR, self.canvas.recoloured)
+        with self.profiler.section(SECTION_RECTANGLES):
+            pixels = self.canvas.pixels
+            for x in range(self.GRID_SIZE_X):
+                for y in range(self.GRID_SIZE_Y):
+                    i = ((self.GRID_SIZE_Y - 1 - y) * self.GRID_SIZE_X + x) * 3
+                    arcade.draw_lrtb_rectangle_filled(
+                        self.GRID_SQ_WIDTH * x,
+                        self.GRID_SQ_WIDTH * (x+1),
+                        self.GRID_SQ_HEIGHT * (y+1),
+                        self.GRID_SQ_HEIGHT * y,
+                        tuple(pixels[i:i+3]),
+                    )
+        # Replay timeline
+        with self.profiler.section(SECTION_UI):
             if not self.enable_ui:
-                bg = lighten.apply(bg, 0, 0, 0)
-            arcade.draw_lrtb_rectangle_filled(xstart, xend, ystart, yend, bg)
-            arcade.draw_lrtb_rectangle_outline(
-                xstart, xend, ystart, yend, (0, 0, 0), border_width=1,
+                arcade.draw_lrtb_rectangle_filled(0, self.DRAW_PANEL, self.SCRUBBER_HEIGHT, 0, (200, 200, 200))
+                progress = self.replay_tracker.position / max(len(self.replay_tracker), 1)
+                arcade.draw_lrtb_rectangle_filled(0, self.DRAW_PANEL * progress, self.SCRUBBER_HEIGHT, 0, (60, 60, 60))
+        self.profiler.end_frame()
+        if self.profiler.enabled:
+            self.draw_profile()
+
+    def draw_profile(self) -> None:
+        """Draw the profiler's frame timings, and a histogram of frame times, over the top left of the canvas."""
+        lines = self.profiler.report()
+        stats = self.profiler.stats()
+        top = self.SCREEN_HEIGHT - 4
+        left = 4
+        bar_width = 12
+        bars_height = 40
+        height = len(lines) * self.PROFILE_LINE_HEIGHT + bars_height + 12
+        arcade.draw_lrtb_rectangle_filled(0, self.PROFILE_WIDTH, self.SCREEN_HEIGHT, self.SCREEN_HEIGHT - height, (0, 0, 0, 180))
+        for i, line in enumerate(lines):
+            arcade.draw_text(line, left, top - (i + 1) * self.PROFILE_LINE_HEIGHT, (255, 255, 255), 10)
+        if stats is None:
+            return
+        bottom = self.SCREEN_HEIGHT - height + 4
+        most = max(stats.histogram)
+        for i, frames in enumerate(stats.histogram):
+            over = (i + 1) * HISTOGRAM_BUCKET > self.profiler.budget
+            arcade.draw_lrtb_rectangle_filled(
+                left + i * bar_width, left + (i + 1) * bar_width - 2,
+                bottom + bars_height * frames / most, bottom,
+                (230, 80, 80) if over else (120, 220, 120),
             )
-            arcade.draw_text(str(i), xstart, (ystart+yend)/2, (0, 0, 0), 18, width=xend-xstart, align="center", bold=True, anchor_y="center")
-        # UI - Draw Modes / Action buttons
-        self.action_buttons.draw()
-        # Grid
-        for x in range(self.GRID_SIZE_X):
-            for y in range(self.GRID_SIZE_Y):
-                arcade.draw_lrtb_rectangle_filled(
-                    self.GRID_SQ_WIDTH * x,
-                    self.GRID_SQ_WIDTH * (x+1),
-                    self.GRID_SQ_HEIGHT * (y+1),
-                    self.GRID_SQ_HEIGHT * y,
-                    self.grid[x][y].get_color(self.BG[:], self.timestamp, x, y),
-                )
 
     def on_mouse_press(self, x: int, y: int, button: int, modifiers: int) -> None:
         """Called when the mouse buttons are pressed."""
@@ -181,18 +301,30 @@ class MyWindow(arcade.Window):
             yend = 2 * self.LAYER_BUTTON_SIZE
             if xstart <= x < xend and yend <= y < ystart:
                 self.on_special()
+        elif not self.enable_ui:
+            # Replay timeline
+            if y <= self.SCRUBBER_HEIGHT:
+                self.scrubbing = True
+                self.scrub_to(x)
         else:
             self.dragging = True
+            if self.STROKE_MODE:
+                self.on_stroke_start()
             self.try_draw(x, y)
 
     def on_mouse_release(self, x: int, y: int, button: int, modifiers: int):
         """Called when the mouse buttons are released."""
         self.dragging = False
+        self.scrubbing = False
         self.prev_drawn = None
         self.prev_pos = None
+        self.on_stroke_end()
 
     def on_mouse_motion(self, x, y, dx, dy) -> None:
         """Called when the mouse moves."""
+        if self.scrubbing:
+            self.scrub_to(x)
+            return
         if not self.dragging:
             return
         if not(0 <= self.selected_layer_index < len(get_layers())):
@@ -203,7 +335,29 @@ class MyWindow(arcade.Window):
 
     def on_key_press(self, symbol: int, modifiers: int) -> None:
         """Called when a keyboard key is pressed."""
+        if symbol == self.PROFILE_KEY:
+            self.profiler.enable(not self.profiler.enabled)
+            return
         if not self.enable_ui:
+            # Replay controls
+            if symbol == keys.SPACE:
+                self.replay_paused = not self.replay_paused
+            elif symbol == keys.LEFT:
+                self.replay_paused = True
+                self.on_replay_previous_step()
+            elif symbol == keys.RIGHT:
+                self.replay_paused = True
+                if self.on_replay_next_step():
+                    self.finish_replay()
+            elif symbol in (keys.UP, keys.DOWN):
+                # Faster / slower, measured in actions relative to STEP mode.
+                if self.replay_mode != self.REPLAY_MODE_SPEED:
+                    self.replay_mode = self.REPLAY_MODE_SPEED
+                    self.replay_speed = 1
+                    self.replay_timer = 0
+                self.replay_speed = self.replay_speed * 2 if symbol == keys.UP else self.replay_speed / 2
+            elif symbol == keys.END:
+                self.replay_mode = self.REPLAY_MODE_CATCH_UP
             return
         self.z_pressed = keys.Z == symbol and (modifiers & keys.MOD_CTRL)
         self.y_pressed = keys.Y == symbol and (modifiers & keys.MOD_CTRL)
@@ -213,6 +367,8 @@ class MyWindow(arcade.Window):
         if self.y_pressed:
             self.on_redo()
             self.y_timer = 0.5
+        if symbol == keys.B:
+            self.on_change_brush_shape()
 
     def on_key_release(self, symbol: int, modifiers: int) -> None:
         """Called when a keyboard key is released."""
@@ -225,17 +381,11 @@ class MyWindow(arcade.Window):
             return
         layer = get_layers()[self.selected_layer_index]
         if self.prev_pos is not None:
-            # Try draw in increments of 0.5 to avoid skipping squares.
-            mhat_dist = abs(x - self.prev_pos[0]) + abs(y - self.prev_pos[1])
-            increment = 0.5
-            points_to_draw = []
-            for d in range(1, math.ceil(mhat_dist/increment)+1):
-                distance = min(d * increment / mhat_dist, 1)
-                nx = distance * (x - self.prev_pos[0]) + self.prev_pos[0]
-                ny = distance * (y - self.prev_pos[1]) + self.prev_pos[1]
-                nx_pos = int(nx // self.GRID_SQ_WIDTH)
-                ny_pos = int(ny // self.GRID_SQ_HEIGHT)
-                points_to_draw.append((nx_pos, ny_pos))
+            # Every square crossed by the segment, once each, so no squares are skipped.
+            points_to_draw = supercover_line(
+                self.prev_pos[0], self.prev_pos[1], x, y,
+                self.GRID_SQ_WIDTH, self.GRID_SQ_HEIGHT,
+            )
         else:
             x_pos = int(x // self.GRID_SQ_WIDTH)
             y_pos = int(y // self.GRID_SQ_HEIGHT)
@@ -251,31 +401,61 @@ class MyWindow(arcade.Window):
 
     def start_replay(self) -> None:
         """Begin the replay mode."""
+        self.on_stroke_end()
         self.enable_ui = False
+        self.replay_paused = False
         self.grid = Grid(self.draw_style, self.GRID_SIZE_X, self.GRID_SIZE_Y)
-        self.replay_timer = self.REPLAY_TIMER_DELTA
+        self.replay_timer = self.REPLAY_TIMER_DELTA if self.replay_mode == self.REPLAY_MODE_STEP else 0
         self.on_replay_start()
 
+    def finish_replay(self) -> None:
+        """End the replay mode, leaving the replayed canvas to draw on."""
+        self.enable_ui = True
+        self.replay_paused = False
+        self.scrubbing = False
+        self.on_replay_end()
+
+    def scrub_to(self, x) -> None:
+        """Seek the replay to the point of the timeline under screen position x."""
+        fraction = min(max(x / self.DRAW_PANEL, 0), 1)
+        self.on_replay_seek(round(fraction * len(self.replay_tracker)))
+
     def on_update(self, delta_time) -> None:
         """Movement and game logic."""
-        self.timestamp += delta_time
-        if self.z_pressed:
-            self.z_timer -= delta_time
-            if self.z_timer <= 0:
-                self.on_undo()
-                self.z_timer += 0.05
-        if self.y_pressed:
-            self.y_timer -= delta_time
-            if self.y_timer <= 0:
-                self.on_redo()
-                self.y_timer += 0.05
-        if not self.enable_ui:
+        with self.profiler.section(SECTION_UPDATE):
+            self.timestamp = self.clock() - self.reset_time
+            if self.z_pressed:
+                self.z_timer -= delta_time
+                if self.z_timer <= 0:
+                    self.on_undo()
+                    self.z_timer += 0.05
+            if self.y_pressed:
+                self.y_timer -= delta_time
+                if self.y_timer <= 0:
+                    self.on_redo()
+                    self.y_timer += 0.05
+            if not self.enable_ui and not self.replay_paused and not self.scrubbing:
+                if self.advance_replay(delta_time):
+                    self.finish_replay()
+            self.on_autosave()
+
+    def advance_replay(self, delta_time) -> bool:
+        """Play the replay actions due this update, according to the replay mode. Returns whether it finished."""
+        if self.replay_mode == self.REPLAY_MODE_STEP:
             self.replay_timer -= delta_time
             if self.replay_timer <= 0:
                 self.replay_timer += self.REPLAY_TIMER_DELTA
-                finished = self.on_replay_next_step()
-                if finished:
-                    self.enable_ui = True
+                return self.on_replay_next_step()
+            return False
+        if self.replay_mode == self.REPLAY_MODE_SPEED:
+            # replay_timer accumulates fractions of an action between updates.
+            self.replay_timer += delta_time * self.replay_speed / self.REPLAY_TIMER_DELTA
+            count = int(self.replay_timer)
+            self.replay_timer -= count
+            return self.on_replay_steps(count)
+        if self.replay_mode == self.REPLAY_MODE_BUDGET:
+            return self.on_replay_for(self.REPLAY_FRAME_BUDGET)
+        return self.on_replay_steps(None)
 
     def change_draw_mode(self) -> None:
         """Changes the draw mode of the application, and resets the window."""
@@ -299,12 +479,14 @@ class MyWindow(arcade.Window):
             None
         What it does:
             Initialisation that occurs after the system initialisation.
-            Initializes the steps for every painted action, and initializes
-            the undo and replay tracker. 
+            Initializes the steps for every painted action, the stroke currently
+            being drawn (if any), and initializes the undo and replay tracker. 
         Complexity:
             Best case == Worst case == O(1)
         """
         self.steps = [] #O(1)
+        self.in_stroke = False #O(1)
+        self.stroke: PaintStroke|None = None #O(1)
         self.undo_tracker = UndoTracker() #O(1)
         self.replay_tracker = ReplayTracker() #O(1)
 
@@ -318,10 +500,109 @@ class MyWindow(arcade.Window):
             None
         What it does:
             Called when a window reset is requested.
+            If a journal is in use, recording starts over in it, except for the first reset,
+            which resumes the session left in it. Likewise for the autosave, if there is one.
         Complexity:
-            Best case == Worst Case == O(1)    
+            Best case == Worst Case == O(1) without a journal or autosave,
+            see on_journal_open and on_autosave_open otherwise.
         """
+        self.replay_tracker.close() #O(1)
         self.on_init() #O(1)
+        if self.JOURNAL_PATH is not None: #O(1)
+            self.on_journal_open(resume=not self.journal_resumed)
+            self.journal_resumed = True #O(1)
+        if self.AUTOSAVE_PATH is not None: #O(1)
+            self.on_autosave_open(restore=not self.autosave_restored)
+            self.autosave_restored = True #O(1)
+
+    def on_journal_open(self, resume: bool):
+        """
+        Args:
+            resume: bool -- whether to continue the session already in the journal
+        Raises:
+            None
+        Returns:
+            None
+        What it does:
+            Records replay actions to the journal at JOURNAL_PATH.
+            When resuming, the journal is recovered (anything after its last complete record is dropped),
+            and its actions are played onto the grid, so the canvas is as it was when the session ended.
+            Undo history is not part of the journal, so it starts empty.
+            A journal that cannot be resumed (not a journal, or recorded in another draw style, grid size or codec)
+            is replaced by a new one.
+        Complexity:
+            Best case complexity: O(1) when starting a new journal.
+            Worst case complexity: O(k*n) when resuming, where k is the number of actions in the journal,
+            and n the amount of steps per action.
+        """
+        if not resume and os.path.exists(self.JOURNAL_PATH): #O(1)
+            os.remove(self.JOURNAL_PATH) #O(1)
+        try:
+            journal = JournalWriter(self.JOURNAL_PATH, self.draw_style, self.GRID_SIZE_X, self.GRID_SIZE_Y, codec=self.JOURNAL_CODEC) #O(r)
+        except JournalError:
+            os.remove(self.JOURNAL_PATH) #O(1)
+            journal = JournalWriter(self.JOURNAL_PATH, self.draw_style, self.GRID_SIZE_X, self.GRID_SIZE_Y, codec=self.JOURNAL_CODEC) #O(1)
+        self.replay_tracker = ReplayTracker(journal) #O(1)
+        if len(self.replay_tracker): #O(1)
+            self.replay_tracker.start_replay() #O(1)
+            self.replay_tracker.play_actions(self.grid) #O(k*n)
+            self.replay_tracker.stop_replay() #O(1)
+
+    def on_autosave_open(self, restore: bool):
+        """
+        Args:
+            restore: bool -- whether to carry on from the canvas saved at AUTOSAVE_PATH
+        Raises:
+            None
+        Returns:
+            None
+        What it does:
+            Starts autosaving the grid to AUTOSAVE_PATH, in place of any autosave before.
+            When restoring, the saved canvas (and its draw style) is taken up, and its replay history
+            recorded again, so it can be replayed. A journal has its own history and canvas to resume,
+            so nothing is restored with one. An autosave that cannot be read, or is of another grid size,
+            is left to be overwritten.
+            Undo history is not autosaved, so it starts empty.
+        Complexity:
+            Best case complexity: O(1) when not restoring (the file is written in the background).
+            Worst case complexity: O(xy + b + k) when restoring, where b is the size of the autosave,
+            and k the number of actions in its history.
+        """
+        if self.autosaver is not None: #O(1)
+            self.autosaver.close() #O(1) -- waits for at most one save in progress
+        if restore and self.JOURNAL_PATH is None and os.path.exists(self.AUTOSAVE_PATH): #O(1)
+            try:
+                grid, actions = load_autosave(self.AUTOSAVE_PATH) #O(xy + b)
+            except (AutosaveError, OSError):
+                grid = None #O(1)
+            if grid is not None and (grid.x, grid.y) == (self.GRID_SIZE_X, self.GRID_SIZE_Y): #O(1)
+                self.grid = grid #O(1)
+                self.draw_style = grid.draw_style #O(1)
+                for action, is_undo in actions: #O(k)
+                    self.replay_tracker.add_action(action, is_undo) #O(1)
+        self.autosaver = Autosaver(self.AUTOSAVE_PATH, self.grid, self.replay_tracker, self.AUTOSAVE_INTERVAL, self.clock) #O(1)
+
+    def on_autosave(self):
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            None
+        What it does:
+            Called every update. Hands the changes since the last autosave to the autosave thread,
+            if one is due; this never waits for the disk. Replays are not autosaved until they finish,
+            and then the grid they left is saved in full.
+        Complexity:
+            Best case complexity: O(1) when no save is due.
+            Worst case complexity: O(k*s + a), see Autosaver.tick.
+        """
+        if self.autosaver is None or not self.enable_ui: #O(1)
+            return
+        if self.autosaver.grid is not self.grid: #O(1)
+            self.autosaver.attach(self.grid) #O(xy / s) -- s is the number of squares per chunk
+        self.autosaver.tick() #O(k*s + a)
 
     def on_paint(self, layer: Layer, px:int, py:int):
         """
@@ -341,10 +622,19 @@ class MyWindow(arcade.Window):
             px: x position of the brush.
             py: y position of the brush.
 
+            If a stroke is in progress (see on_stroke_start), the painted squares are
+            accumulated into the stroke instead, and squares the stroke has already
+            touched are skipped. The stroke is recorded as one action in on_stroke_end.
+
+            The squares painted are given by the grid's brush shape and size. The shape's
+            stencil is precomputed as one span of rows per column, so only the squares
+            actually painted are visited, and each column of the grid is looked up once.
+            The stamp is remembered on the action, so journals can store it compactly.
+
         Complexity:
-        Best case complexity == Worst case complexity == O(x*y + n)
-        Traverses through the vicinity and access the value and stores them to x and y,
-        then we add a layer which has O(n) worst case complexity. 
+        Best case complexity == Worst case complexity == O(s*n)
+        Where s is the number of squares under the brush (clipped to the grid),
+        and adding a layer has O(n) worst case complexity.
         """
         if not isinstance(px, int): #O(1)
             raise TypeError("px value must be int")
@@ -353,22 +643,31 @@ class MyWindow(arcade.Window):
         if not isinstance(layer, Layer): #O(1)
             raise TypeError("layer value must be of Layer type")
         
+        if self.in_stroke and (self.stroke is None or self.stroke.layer != layer): #O(1)
+            self.on_stroke_end() #O(1)
+            self.in_stroke = True #O(1)
+            self.stroke = PaintStroke(layer, self.grid.x, self.grid.y) #O(xy)
 
-        d:int = self.grid.brush_size #O(1)
-        
-        vicinity_x:range = range(max(px-d, 0), min(px+d+1, self.grid.x)) #O(1)
-        vicinity_y:range = range(max(py-d, 0), min(py+d+1, self.grid.y)) #O(1)
+        stencil:BrushStencil = get_stencil(self.grid.brush_shape, self.grid.brush_size) #O(1) -- cached
 
         x:int
         y:int
-        for x in vicinity_x: #O(x) -- where x is the size of the vicinity
-            for y in vicinity_y: #O(y) -- where y is the size of the vicinity
-                if abs(x-px) + abs(y-py) <= d: #O(1)
-                    self.grid[x][y].add(layer) #O(n) 
+        for x, y_start, y_end in stencil.clipped_spans(px, py, self.grid.x, self.grid.y): #O(d) -- d is the brush size
+            column = self.grid[x] #O(1)
+            for y in range(y_start, y_end): #O(s/d) -- squares in this column of the stamp
+                if self.stroke is not None: #O(1)
+                    if self.stroke.touch(x, y): #O(1)
+                        column[y].add(layer) #O(n) -- the store marks its square dirty
+                else:
+                    column[y].add(layer) #O(n) -- the store marks its square dirty
                     self.steps.append(PaintStep((x,y), layer)) #O(1)
         
-        self.undo_tracker.add_action(PaintAction(self.steps[:], False)) #O(1)
-        self.replay_tracker.add_action(PaintAction(self.steps[:], False)) #O(1)
+        if self.stroke is not None: #O(1)
+            self.stroke.action.stamps.append((stencil, px, py)) #O(1)
+            return
+
+        self.undo_tracker.add_action(PaintAction(self.steps[:], False, [(stencil, px, py)])) #O(1)
+        self.replay_tracker.add_action(PaintAction(self.steps[:], False, [(stencil, px, py)])) #O(1)
         self.steps.clear() #O(1)
 
     def on_undo(self):
@@ -384,8 +683,10 @@ class MyWindow(arcade.Window):
         Complexity:
             Best case complexity == Worst case complexity == O(n)
         """
+        self.on_stroke_end() #O(1)
         a = self.undo_tracker.undo(self.grid) #O(n) -- where n is the length of undo_tracker tree of actions
-        self.replay_tracker.add_action(a, True) #O(1)
+        if a is not None: #O(1)
+            self.replay_tracker.add_action(a, True) #O(1)
 
 
     def on_redo(self):
@@ -401,8 +702,10 @@ class MyWindow(arcade.Window):
         Complexity:
             Best case complexity == Worst case complexity == O(n)
         """
+        self.on_stroke_end() #O(1)
         b = self.undo_tracker.redo(self.grid) #O(n) where n is the length of the redo_branch 
-        self.replay_tracker.add_action(b, False) #O(n)
+        if b is not None: #O(1)
+            self.replay_tracker.add_action(b, False) #O(n)
 
     def on_special(self):
         """
@@ -414,12 +717,60 @@ class MyWindow(arcade.Window):
             None
         What it does:
             Called when the special action is requested and activate grid's special method.
+            The special is recorded as an action for undo and replay. Applying it keeps a checkpoint
+            of the squares it changed, so undoing it puts those back exactly, rather than applying special again.
         Complexity:
             the grid method iterates through x and y where they are the dimensions of the grid
 
-            Best case complexity == Worst case complexity == O(xy)
+            Best case complexity == Worst case complexity == O(xy * s), see Grid.special
         """
-        self.grid.special() #O(xy) -- x,y is the dimension of the grid
+        self.on_stroke_end() #O(1)
+        action = PaintAction([], is_special=True) #O(1)
+        action.redo_apply(self.grid) #O(xy + k*c) -- x,y is the dimension of the grid
+        self.undo_tracker.add_action(action) #O(1)
+        self.replay_tracker.add_action(action) #O(1)
+
+    def on_stroke_start(self):
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            None
+        What it does:
+            Called when a drag starts (mouse press on the drawing panel) in stroke mode.
+            Every on_paint until on_stroke_end is accumulated into a single PaintStroke,
+            which is created lazily on the first paint, since that is when the layer is known.
+        Complexity:
+            Best case == Worst case == O(1)
+        """
+        self.on_stroke_end() #O(1)
+        self.in_stroke = True #O(1)
+
+    def on_stroke_end(self):
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            None
+        What it does:
+            Called when a drag ends (mouse release), or before anything else that must not
+            interleave with a stroke (undo, redo, special, replay).
+            Records the accumulated stroke as a single action in the undo and replay trackers.
+            Does nothing if no stroke is in progress, or if the stroke never touched a square.
+        Complexity:
+            Best case == Worst case == O(1)
+        """
+        stroke = self.stroke #O(1)
+        self.in_stroke = False #O(1)
+        self.stroke = None #O(1)
+        if stroke is None or stroke.is_empty(): #O(1)
+            return
+        self.undo_tracker.add_action(stroke.action) #O(1)
+        self.replay_tracker.add_action(PaintAction(stroke.action.steps[:], False, stroke.action.stamps[:])) #O(1)
 
     def on_replay_start(self):
         """
@@ -430,11 +781,11 @@ class MyWindow(arcade.Window):
         Returns:
             None
         What it does:
-            Called when the replay starting is requested. Plays the replay. 
+            Called when the replay starting is requested. Rewinds the replay and plays the first action. 
         Complexity:
             Worst case complexity == Best case complexity == O(n)
         """
-
+        self.replay_tracker.start_replay() #O(1)
         self.replay_tracker.play_next_action(self.grid) #O(n) where n is the length of replayactions queue
         
 
@@ -454,6 +805,90 @@ class MyWindow(arcade.Window):
         """
         return self.replay_tracker.play_next_action(self.grid) #O(n) where n is the length of replayactions queue
 
+    def on_replay_steps(self, count: int|None) -> bool:
+        """
+        Args:
+            count: int|None -- the number of actions to play, or None for all of them
+        Raises:
+            None
+        Returns:
+            bool
+        What it does:
+            Called when several steps of the replay should be played at once.
+            Returns whether the replay is finished.
+        Complexity:
+            Worst case complexity == Best case complexity == O(k*n)
+            Where k is the number of actions played and n the steps per action.
+        """
+        return self.replay_tracker.play_actions(self.grid, count) #O(k*n)
+
+    def on_replay_for(self, budget: float) -> bool:
+        """
+        Args:
+            budget: float -- time allowed, in seconds
+        Raises:
+            None
+        Returns:
+            bool
+        What it does:
+            Called when as many steps of the replay as fit in a time budget should be played,
+            timed by the window's clock. Returns whether the replay is finished.
+        Complexity:
+            Worst case complexity == Best case complexity == O(k*n)
+            Where k is the number of actions that fit in the budget and n the steps per action.
+        """
+        return self.replay_tracker.play_for(self.grid, budget, self.clock) #O(k*n)
+
+    def on_replay_previous_step(self) -> bool:
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            bool
+        What it does:
+            Called when stepping the replay backwards is requested.
+            Returns whether the replay was already at its start.
+        Complexity:
+            Worst case complexity == O(xy + k*n), restoring the nearest keyframe (xy is the size of the grid)
+            then replaying at most k = KEYFRAME_INTERVAL actions of n steps.
+        """
+        return self.replay_tracker.play_previous_action(self.grid) #O(xy + k*n)
+
+    def on_replay_seek(self, position: int):
+        """
+        Args:
+            position: int -- the number of actions that should have been replayed
+        Raises:
+            None
+        Returns:
+            None
+        What it does:
+            Called when the replay timeline is scrubbed. Puts the grid in the state it was in
+            after `position` actions.
+        Complexity:
+            Worst case complexity == O(xy + k*n), restoring the nearest keyframe (xy is the size of the grid)
+            then replaying at most k = KEYFRAME_INTERVAL actions of n steps.
+        """
+        self.replay_tracker.seek(self.grid, position) #O(xy + k*n)
+
+    def on_replay_end(self):
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            None
+        What it does:
+            Called when the replay is over. The replayed grid is now the canvas,
+            so the replay tracker can carry on recording.
+        Complexity:
+            Worst case complexity == Best case complexity == O(1)
+        """
+        self.replay_tracker.stop_replay() #O(1)
+
     def on_increase_brush_size(self):
         """Called when an increase to the brush size is requested."""
         self.grid.increase_brush_size()
@@ -462,6 +897,11 @@ class MyWindow(arcade.Window):
         """Called when a decrease to the brush size is requested."""
         self.grid.decrease_brush_size()
 
+    def on_change_brush_shape(self):
+        """Called when the next brush shape is requested."""
+        shapes = BRUSH_SHAPES
+        self.grid.set_brush_shape(shapes[(shapes.index(self.grid.brush_shape) + 1) % len(shapes)])
+
 
 def main():
     """ Main function """
@@ -469,9 +909,10 @@ def main():
     window.setup()
     arcade.run()
 
-def run_with_func(func, pause=False):
+def run_with_func(func, pause=False, clock=None):
+    """Run func(window) alongside the window, on a thread of its own. The window runs on clock (the real time by default)."""
     from threading import Thread
-    window = MyWindow()
+    window = MyWindow(clock)
     window.setup()
     if pause:
         _ = input("Press enter to begin test.")
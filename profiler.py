@@ -0,0 +1,191 @@
+"""
+Per-frame timing of the window, to see which part of a frame goes over budget.
+
+A FrameProfiler splits each frame into sections: the window's on_update
+("update"), working out the colours of the grid ("grid"), submitting the
+grid's rectangles to be drawn ("rectangles"), and the sidebar and the rest
+of the interface ("ui"). The window times each section with
+
+    with profiler.section(SECTION_GRID):
+        ...
+
+and calls end_frame() once a frame is drawn. A frame's time is the total of
+its sections (so the profiler's own overlay isn't counted). It also keeps
+two counts per frame: squares coloured (get_color calls), and calls of any
+layer's apply (which are counted, see layer_util.count_calls, only while
+the profiler is enabled).
+
+The last HISTORY frames are kept; stats() sums them up: the mean time of
+each section, the 50th, 95th and 99th percentile frame times, how many
+frames went over the budget, and a histogram of frame times. A disabled
+profiler (as it starts) does nothing, and its sections cost a method call.
+"""
+
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass, field
+import math
+import time
+
+import layer_util
+
+SECTION_UPDATE = "update"
+SECTION_GRID = "grid"
+SECTION_RECTANGLES = "rectangles"
+SECTION_UI = "ui"
+SECTIONS = (SECTION_UPDATE, SECTION_GRID, SECTION_RECTANGLES, SECTION_UI)
+COUNT_GET_COLOR = "get_color"
+COUNT_APPLY = "apply"
+COUNTS = (COUNT_GET_COLOR, COUNT_APPLY)
+
+# Frames kept, for the statistics.
+HISTORY = 300
+# The time a frame can take at 60 frames a second.
+FRAME_BUDGET = 1 / 60
+# Histogram buckets, in seconds: the last one also holds everything slower.
+HISTOGRAM_BUCKET = 0.002
+HISTOGRAM_BUCKETS = 16
+
+
+@dataclass
+class FrameStats:
+    """The frames a profiler has kept, summed up. Times are in seconds."""
+
+    frames: int
+    # Mean time per frame of each section, and of the last frame.
+    sections: dict[str, float]
+    last: dict[str, float]
+    # Mean per frame of each count.
+    counts: dict[str, float]
+    p50: float
+    p95: float
+    p99: float
+    worst: float
+    over_budget: int
+    # Frames taking [i * HISTOGRAM_BUCKET, (i + 1) * HISTOGRAM_BUCKET) seconds, for each bucket i.
+    histogram: list[int] = field(default_factory=list)
+
+
+class _Section:
+    """Times a section of a frame, as a context manager."""
+
+    def __init__(self, profiler: FrameProfiler, name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = self.profiler.clock()
+
+    def __exit__(self, *exc) -> None:
+        self.profiler.add(self.name, self.profiler.clock() - self.start)
+
+
+class _NoSection:
+    """What a disabled profiler times sections with."""
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NO_SECTION = _NoSection()
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    """The value fraction of the way through ordered (a sorted, non-empty list), by nearest rank."""
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+class FrameProfiler:
+    """Section times and counts of the last frames of a window."""
+
+    def __init__(self, history: int = HISTORY, budget: float = FRAME_BUDGET, clock=time.perf_counter) -> None:
+        self.budget = budget
+        self.clock = clock
+        self.enabled = False
+        # (section times, counts) of every frame kept, oldest first.
+        self.frames: deque[tuple[dict[str, float], dict[str, int]]] = deque(maxlen=history)
+        self._sections = {name: _Section(self, name) for name in SECTIONS}
+        self._times = dict.fromkeys(SECTIONS, 0.0)
+        self._counts = dict.fromkeys(COUNTS, 0)
+        self._apply_calls = 0
+
+    def enable(self, enabled: bool = True) -> None:
+        """Start (or stop) profiling, from a new frame; frames kept from before are dropped."""
+        self.enabled = enabled
+        layer_util.count_calls(enabled)
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop every frame kept, and the one in progress."""
+        self.frames.clear()
+        self._times = dict.fromkeys(SECTIONS, 0.0)
+        self._counts = dict.fromkeys(COUNTS, 0)
+        self._apply_calls = layer_util.total_calls()
+
+    def section(self, name: str):
+        """A context manager timing a section (one of SECTIONS) of this frame."""
+        return self._sections[name] if self.enabled else _NO_SECTION
+
+    def add(self, name: str, seconds: float) -> None:
+        """Add seconds to a section of this frame."""
+        if self.enabled:
+            self._times[name] += seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        """Add n to a count (one of COUNTS) of this frame."""
+        if self.enabled:
+            self._counts[name] += n
+
+    def end_frame(self) -> None:
+        """Keep this frame, and start the next."""
+        if not self.enabled:
+            return
+        apply_calls = layer_util.total_calls()
+        self._counts[COUNT_APPLY] += apply_calls - self._apply_calls
+        self._apply_calls = apply_calls
+        self.frames.append((self._times, self._counts))
+        self._times = dict.fromkeys(SECTIONS, 0.0)
+        self._counts = dict.fromkeys(COUNTS, 0)
+
+    def stats(self) -> FrameStats|None:
+        """
+        The frames kept, summed up, or None if there aren't any yet.
+
+        :complexity: O(f log f) for f frames kept.
+        """
+        if not self.frames:
+            return None
+        n = len(self.frames)
+        totals = sorted(sum(times.values()) for times, _ in self.frames)
+        histogram = [0] * HISTOGRAM_BUCKETS
+        for total in totals:
+            histogram[min(int(total / HISTOGRAM_BUCKET), HISTOGRAM_BUCKETS - 1)] += 1
+        return FrameStats(
+            frames=n,
+            sections={name: sum(times[name] for times, _ in self.frames) / n for name in SECTIONS},
+            last=dict(self.frames[-1][0]),
+            counts={name: sum(counts[name] for _, counts in self.frames) / n for name in COUNTS},
+            p50=percentile(totals, 0.5),
+            p95=percentile(totals, 0.95),
+            p99=percentile(totals, 0.99),
+            worst=totals[-1],
+            over_budget=sum(total > self.budget for total in totals),
+            histogram=histogram,
+        )
+
+    def report(self) -> list[str]:
+        """The stats as lines of text, as the window's overlay shows them."""
+        stats = self.stats()
+        if stats is None:
+            return ["no frames yet"]
+        ms = 1000
+        return [
+            f"frame p50 {stats.p50*ms:.1f}  p95 {stats.p95*ms:.1f}  p99 {stats.p99*ms:.1f}  max {stats.worst*ms:.1f} ms",
+            f"over {self.budget*ms:.1f} ms: {stats.over_budget}/{stats.frames} frames",
+            "  ".join(f"{name} {stats.sections[name]*ms:.2f}" for name in SECTIONS) + " ms",
+            f"get_color {stats.counts[COUNT_GET_COLOR]:.0f}  apply {stats.counts[COUNT_APPLY]:.0f} per frame",
+        ]
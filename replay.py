@@ -1,43 +1,168 @@
 from __future__ import annotations
+import time
 from action import PaintAction
-from grid import Grid
-from data_structures.queue_adt import *
+from grid import Grid, SpecialCheckpoint
+from data_structures.referential_array import ArrayR
+from journal import JournalIndex, JournalReader, JournalWriter
 
 class ReplayTracker:
 
-    def __init__(self):
+    # Maximum number of actions that can be recorded.
+    MAX_ACTIONS = 10000
+    # The array of actions starts this big, and doubles as they are recorded, up to MAX_ACTIONS.
+    INITIAL_CAPACITY = 64
+    # A snapshot of the grid is kept every KEYFRAME_INTERVAL actions, so seeking
+    # only ever needs to replay at most this many actions.
+    KEYFRAME_INTERVAL = 50
+    # At most this many snapshots are kept. Past that, every other one is dropped and the interval doubles,
+    # so a replay of n actions keeps MAX_KEYFRAMES snapshots at most, and seeking plays O(n / MAX_KEYFRAMES) actions.
+    MAX_KEYFRAMES = 16
+
+    def __init__(self, journal: JournalWriter|None = None):
         """
         Args:
             self
+            journal: JournalWriter|None -- if given, actions are recorded to this on-disk journal
+                instead of in memory, and played back by streaming it.
         Raises:
             None
         Returns:
             None
         What it does:
-            self.replay_actions: Queue to store replay actions
+            self.replay_actions: Array to store replay actions, as (action, is_undo) pairs.
+                It starts at INITIAL_CAPACITY and doubles when full, rather than taking room for MAX_ACTIONS up front.
+                Actions are not removed when played, so the replay can be restarted and seeked.
+            self.action_count: Number of actions recorded
+            self.position: Number of actions played so far (index of the next action to play)
+            self.start: The action playback started from. Actions before it are not played.
+            self.keyframes: keyframes[k] is a snapshot of the grid before action start + k * KEYFRAME_INTERVAL * keyframe_spacing.
+                Keyframes are taken the first time playback passes them.
+            self.keyframe_checkpoints: keyframe_checkpoints[k] is special_checkpoints as it was at keyframes[k],
+                so the specials played before a keyframe can still be undone after seeking back to it.
+            self.keyframe_spacing: how many KEYFRAME_INTERVALs apart the keyframes are. It doubles (and every other
+                keyframe is dropped) whenever there would be more than MAX_KEYFRAMES, so they take bounded memory.
             self.is_replay: bool to determine whether replay is happening or not
+            self.journal / self.reader / self.index: the journal being recorded to, the reader streaming it back,
+                and its offset index, used to jump straight to any action.
+                A journal that already has records (e.g. one recovered after a crash) continues from them.
+            self.read_index / self.read_records: the next action the reader will decode, and the stream of records
+                it comes from, so playing forwards never rescans (or restarts decompressing) the journal.
+            self.special_checkpoints: checkpoints of the specials played and not yet undone, most recent last.
+                Actions decoded from a journal are new objects each time, so an undone special gets its checkpoint
+                from here rather than from the (different) object that applied it.
         Complexity:
             Best case complexity == Worst case complexity == O(1)
         """
-        self.replay_actions = CircularQueue(10000) #O(1)
+        self.replay_actions = ArrayR(min(self.INITIAL_CAPACITY, self.MAX_ACTIONS)) if journal is None else None #O(1)
+        self.action_count = journal.count if journal is not None else 0 #O(1)
+        self.position = 0 #O(1)
+        self.start = 0 #O(1)
+        self.keyframes: list[Grid] = [] #O(1)
+        self.keyframe_checkpoints: list[tuple[SpecialCheckpoint, ...]] = [] #O(1)
+        self.keyframe_spacing = 1 #O(1)
         self.is_replay = False #O(1)
+        self.journal = journal #O(1)
+        self.reader: JournalReader|None = None #O(1)
+        self.index: JournalIndex|None = None #O(1)
+        self.read_index = 0 #O(1)
+        self.read_records = None #O(1)
+        self.special_checkpoints: list[SpecialCheckpoint] = [] #O(1)
 
-    def start_replay(self) -> None:
+    @classmethod
+    def from_journal(cls, path: str) -> ReplayTracker:
+        """
+        Args:
+            path: str -- a journal file
+        Raises:
+            JournalError: if the file is not a journal
+        Returns:
+            ReplayTracker -- a tracker that plays the journal back, ready to start_replay.
+                Nothing more can be recorded to it. The grid to play onto is reader.new_grid().
+        Complexity:
+            Best case complexity: O(INDEX_STRIDE), when the journal's index is up to date.
+            Worst case complexity: O(r), where r is the number of records, to build its index
+            (only the record headers are read).
+        """
+        tracker = cls() #O(1)
+        tracker.replay_actions = None #O(1)
+        tracker.reader = JournalReader(path) #O(1)
+        tracker.index = JournalIndex(path) #O(e), where e is the number of index entries
+        tracker.action_count = tracker.index.update(tracker.reader) #O(r) for the records not indexed yet
+        return tracker
+
+    def close(self) -> None:
+        """ Closes the journal and its reader, if any. """
+        if self.reader is not None:
+            self.reader.close()
+        if self.journal is not None:
+            self.journal.close()
+
+    def __len__(self) -> int:
+        """ Returns the number of actions recorded. """
+        return self.action_count
+
+    def start_replay(self, start: int = 0, special_checkpoints: tuple[SpecialCheckpoint, ...] = ()) -> None:
         """
         Args:
             self
+            start: int -- the action to start playback from, 0 for the whole recording
+            special_checkpoints: when starting part way through, the checkpoints of the specials played before start
+                and not undone, most recent last (special_checkpoints as it was there), so they can be undone
         Raises:
-            None
+            TypeError: if start isn't an int
         Returns:
             None
         What it does:
-            updates self.is_replay to True so no more actions can be added
+            updates self.is_replay to True so no more actions can be added,
+            and rewinds playback to the first action.
             Called whenever we should stop taking actions, and start playing them back.
             Useful if you have any setup to do before `play_next_action` should be called.
+            Playback is expected to start from an empty grid, or when starting part way through,
+            from a grid holding whatever the actions should be applied on top of.
+            Starting part way through a journal jumps straight there using its index, without reading the prefix.
+            When recording to a journal, the reader is (re)mapped so it sees every record written so far,
+            and the index is extended with them.
+            Keyframes are kept between replays from the same start.
         Complexity:
-            Best case complexity == Worst case complexity == O(1)
+            Best case complexity: O(1)
+            Worst case complexity: O(r) when recording to a journal, where r is the number of records
+            added since the last replay, to index them.
         """
+        if not isinstance(start, int): #O(1)
+            raise TypeError("start must be an int")
+        if self.journal is not None: #O(1)
+            if self.reader is None: #O(1)
+                self.reader = JournalReader(self.journal.path) #O(1)
+                self.index = JournalIndex(self.journal.path) #O(e)
+            else:
+                self.reader.refresh() #O(1)
+            self.read_records = None #O(1)
+            self.index.update(self.reader) #O(r)
+        start = max(0, min(start, self.action_count)) #O(1)
+        if start != self.start: #O(1)
+            self.keyframes = [] #O(1)
+            self.keyframe_checkpoints = [] #O(1)
+            self.keyframe_spacing = 1 #O(1)
+            self.start = start #O(1)
         self.is_replay = True #O(1)
+        self.position = start #O(1)
+        self.special_checkpoints = list(special_checkpoints) #O(s)
+
+    def stop_replay(self) -> None:
+        """
+        Args:
+            self
+        Raises:
+            None
+        Returns:
+            None
+        What it does:
+            Allows actions to be added again after a replay, continuing the recording.
+            The grid being drawn on should be the replayed one, so that it matches the recording.
+        Complexity:
+            Best case complexity == Worst case complexity == O(1)
+        """
+        self.is_replay = False #O(1)
             
     def add_action(self, action: PaintAction, is_undo: bool=False) -> None:
         """
@@ -56,12 +181,15 @@ class ReplayTracker:
             Special, Redo, and Draw all have this is False.
 
             Check if start_replay has been called, if it hasn't, add action and is_undo
-            to self.replay_actions.
+            to self.replay_actions. If the replay is already full, the action is not recorded.
+            When recording to a journal, the action is appended to it instead, with no limit.
+            A tracker playing back a journal it is not recording cannot record anything.
 
         Complexity:
-            Best case complexity == Worst case complexity == O(1)
+            Best case complexity == Worst case complexity == O(1) amortised
 
-            The time complexity is O(1)        
+            The time complexity is O(1), except when the array of actions is full and doubles,
+            which is O(n) but happens only once every n actions.
         """
         
         if self.is_replay: #O(1)
@@ -73,7 +201,21 @@ class ReplayTracker:
         if not isinstance(is_undo, bool):
             raise TypeError("is_undo must be a boolean value")
 
-        self.replay_actions.append((action, is_undo)) #O(1)
+        if self.journal is not None: #O(1)
+            self.journal.append(action, is_undo) #O(n) -- to encode the steps
+            self.action_count += 1 #O(1)
+            return
+
+        if self.replay_actions is None or self.action_count >= self.MAX_ACTIONS: #O(1)
+            return
+
+        if self.action_count == len(self.replay_actions): #O(1)
+            actions = ArrayR(min(2 * len(self.replay_actions), self.MAX_ACTIONS)) #O(n)
+            actions.copy_from(self.replay_actions) #O(n), copied in C
+            self.replay_actions = actions #O(1)
+
+        self.replay_actions[self.action_count] = (action, is_undo) #O(1)
+        self.action_count += 1 #O(1)
 
     def play_next_action(self, grid: Grid) -> bool:
         """
@@ -88,27 +230,217 @@ class ReplayTracker:
             Returns a boolean.
             - If there were no more actions to play, and so nothing happened, return True.
             - Otherwise, return False.
+            If the action starts a new keyframe interval that has no keyframe yet,
+            a snapshot of the grid is taken first (or the last one is shared, if the grid's state hash hasn't changed).
+            If there are MAX_KEYFRAMES already, every other one is dropped first, and the interval doubles.
         Complexity:
-            Best case complexity == Worst case complexity: O(n).
-            the function has to apply undo or apply redo which is O(n) complexity.
+            Best case complexity: O(n), the function has to apply undo or apply redo
+            which is O(n), where n is the amount of steps in the action.
+            Worst case complexity: O(n + xy * c), when a keyframe is taken, where xy are the dimensions
+            of the grid and c is the cost of copying a layerstore. This happens once every
+            keyframe interval, and only the first time those actions are played.
         """
 
         if not isinstance(grid, Grid):
             raise TypeError("grid input must be of Grid() type")
 
-        if not self.replay_actions.is_empty(): #O(1)
-            action, is_undo = self.replay_actions.serve() #O(1)
-            action:PaintAction
+        if self.position >= self.action_count: #O(1)
+            return True
 
-            if action == None: #O(1)
-                return
-
-            if is_undo: #O(1)
-                action.undo_apply(grid) #O(n) -- Where n is the amount of element in the PaintAction Steps
+        played = self.position - self.start #O(1)
+        interval = self.KEYFRAME_INTERVAL * self.keyframe_spacing #O(1)
+        if len(self.keyframes) >= self.MAX_KEYFRAMES and played == len(self.keyframes) * interval: #O(1)
+            # Keep the keyframes at even multiples of the interval, which is doubled.
+            self.keyframes = self.keyframes[::2] #O(MAX_KEYFRAMES)
+            self.keyframe_checkpoints = self.keyframe_checkpoints[::2] #O(MAX_KEYFRAMES)
+            self.keyframe_spacing *= 2 #O(1)
+            interval *= 2 #O(1)
+        if played % interval == 0 and played // interval == len(self.keyframes): #O(1)
+            if self.keyframes and self.keyframes[-1] == grid: #O(u) -- compared by state hash
+                self.keyframes.append(self.keyframes[-1]) #O(1) -- nothing changed, so share the snapshot (restore copies it)
             else:
-                action.redo_apply(grid) #O(n) -- Where n is the amount of element in the PaintAction Steps
-            return False
-        return True
+                self.keyframes.append(grid.copy()) #O(xy * c)
+            self.keyframe_checkpoints.append(tuple(self.special_checkpoints)) #O(s) -- s is the number of specials not undone
+
+        action, is_undo = self.get_action(self.position) #O(n)
+        action:PaintAction
+        self.position += 1 #O(1)
+
+        if is_undo: #O(1)
+            if action.is_special and self.special_checkpoints: #O(1)
+                checkpoint = self.special_checkpoints.pop() #O(1)
+                if action.checkpoint is None: #O(1)
+                    action.checkpoint = checkpoint #O(1)
+            action.undo_apply(grid) #O(n) -- Where n is the amount of element in the PaintAction Steps
+        else:
+            action.redo_apply(grid) #O(n) -- Where n is the amount of element in the PaintAction Steps
+            if action.is_special: #O(1)
+                self.special_checkpoints.append(action.checkpoint) #O(1)
+        return False
+
+    def get_action(self, index: int) -> tuple[PaintAction, bool]:
+        """
+        Args:
+            index: int -- 0 <= index < action_count
+        Raises:
+            None
+        Returns:
+            tuple[PaintAction, bool] -- the recorded action and whether it was an undo
+        What it does:
+            Gets a recorded action, from memory or by decoding it from the journal.
+            The reader keeps its place, so reading actions in order decodes each one once.
+            Jumping backwards, or further forwards than the index stride, goes through the journal's index.
+        Complexity:
+            Best case complexity: O(1) in memory, O(n) reading the next action from a journal,
+            where n is the amount of steps in the action.
+            Worst case complexity: O(INDEX_STRIDE * n) jumping to an action in a journal,
+            as up to INDEX_STRIDE actions are decoded from the index entry before it.
+        """
+        if self.reader is None: #O(1)
+            return self.replay_actions[index] #O(1)
+        if self.read_records is None or index < self.read_index or index - self.read_index > self.index.stride: #O(1)
+            self.read_index, offset = self.index.locate(index) #O(1)
+            self.read_records = self.reader.records(offset) #O(1)
+        while self.read_index < index: #O(INDEX_STRIDE)
+            next(self.read_records) #O(n)
+            self.read_index += 1 #O(1)
+        record = next(self.read_records) #O(n)
+        self.read_index += 1 #O(1)
+        return record.action, record.is_undo
+
+    def position_at_time(self, timestamp: float) -> int:
+        """
+        Args:
+            timestamp: float -- a wall-clock time, as from time.time()
+        Raises:
+            ValueError: if the actions are not in a journal, as only journals record times
+        Returns:
+            int -- the first action recorded at or after the time (the number of actions, if none were),
+                ready to pass to start_replay or seek
+        Complexity:
+            Best case complexity == Worst case complexity == O(log e + INDEX_STRIDE),
+            where e is the number of index entries.
+        """
+        if self.index is None: #O(1)
+            raise ValueError("Only actions recorded to a journal have times; start a replay first to index it")
+        return self.index.find_time(self.reader, timestamp) #O(log e + INDEX_STRIDE)
+
+    def play_actions(self, grid: Grid, count: int|None = None) -> bool:
+        """
+        Args:
+            grid: Grid
+            count: int|None -- the maximum number of actions to play, or None to play all remaining actions
+        Raises:
+            TypeError: if grid isn't of Grid() type
+        Returns:
+            bool -- True if there are no more actions to play afterwards
+        What it does:
+            Plays up to `count` actions in one go, stopping early at the end of the replay.
+            With count None this catches up with the whole recording at full speed,
+            which is what headless verification wants.
+        Complexity:
+            Best case complexity == Worst case complexity == O(k * n)
+            Where k is the number of actions played, and n the amount of steps per action.
+        """
+        if not isinstance(grid, Grid): #O(1)
+            raise TypeError("grid input must be of Grid() type")
+        if count is None: #O(1)
+            count = self.action_count - self.position #O(1)
+        for _ in range(count): #O(k)
+            if self.play_next_action(grid): #O(n)
+                break
+        return self.position >= self.action_count #O(1)
+
+    def play_for(self, grid: Grid, budget: float, clock=time.perf_counter) -> bool:
+        """
+        Args:
+            grid: Grid
+            budget: float -- time allowed, in seconds
+            clock: function returning the current time in seconds
+        Raises:
+            TypeError: if grid isn't of Grid() type
+        Returns:
+            bool -- True if there are no more actions to play afterwards
+        What it does:
+            Plays as many actions as fit in the time budget (checking the clock after each one).
+            At least one action is always played, so a replay always makes progress.
+        Complexity:
+            Best case complexity == Worst case complexity == O(k * n)
+            Where k is the number of actions that fit in the budget, and n the amount of steps per action.
+        """
+        if not isinstance(grid, Grid): #O(1)
+            raise TypeError("grid input must be of Grid() type")
+        deadline = clock() + budget #O(1)
+        while not self.play_next_action(grid): #O(n)
+            if clock() >= deadline: #O(1)
+                break
+        return self.position >= self.action_count #O(1)
+
+    def seek(self, grid: Grid, position: int) -> None:
+        """
+        Args:
+            grid: Grid -- the grid being replayed onto
+            position: int -- number of actions that should have been played
+        Raises:
+            TypeError: if grid isn't of Grid() type, or position isn't an int
+        Returns:
+            None
+        What it does:
+            Puts the grid in the state it is in after `position` actions (clamped to the recording, from start),
+            so that the next play_next_action plays action `position`. Works forwards and backwards.
+
+            If the target is ahead of the current position in the same keyframe interval, we simply
+            play forward. Otherwise the grid is restored from the latest keyframe at or before the
+            target, and the remaining actions are played from there. If no keyframe has been taken that
+            far yet, we play forward from the last one, taking keyframes along the way.
+        Complexity:
+            Best case complexity: O(k * n) -- the target is just ahead of the current position, where
+            k is the number of actions played and n the steps per action.
+            Worst case complexity: O(xy * c + i * n) once the keyframes exist,
+            where xy * c is the cost of restoring a keyframe and i the keyframe interval
+            (KEYFRAME_INTERVAL, or O(a / MAX_KEYFRAMES) for a replay of a actions).
+            Seeking beyond the last keyframe taken so far must play every action up to the target once.
+        """
+        if not isinstance(grid, Grid): #O(1)
+            raise TypeError("grid input must be of Grid() type")
+        if not isinstance(position, int): #O(1)
+            raise TypeError("position must be an int")
+
+        position = max(self.start, min(position, self.action_count)) #O(1)
+        interval = self.KEYFRAME_INTERVAL * self.keyframe_spacing #O(1)
+        keyframe_index = min((position - self.start) // interval, len(self.keyframes) - 1) #O(1)
+        keyframe_position = self.start + keyframe_index * interval #O(1)
+
+        if not (keyframe_position <= self.position <= position) and keyframe_index >= 0: #O(1)
+            grid.restore(self.keyframes[keyframe_index]) #O(xy * c)
+            self.position = keyframe_position #O(1)
+            # The specials played before the keyframe, and not undone, can still be undone after it.
+            self.special_checkpoints = list(self.keyframe_checkpoints[keyframe_index]) #O(s)
+
+        while self.position < position: #O(i) once keyframes exist
+            self.play_next_action(grid) #O(n)
+
+    def play_previous_action(self, grid: Grid) -> bool:
+        """
+        Args:
+            grid: Grid
+        Raises:
+            TypeError: if grid isn't of Grid() type
+        Returns:
+            bool
+        What it does:
+            Steps the replay back by one action, so the grid is as it was before the last played action.
+            - If we are already at the start of the replay (or the action it started from), nothing happens and we return True.
+            - Otherwise, return False.
+        Complexity:
+            Same as seek.
+        """
+        if not isinstance(grid, Grid): #O(1)
+            raise TypeError("grid input must be of Grid() type")
+        if self.position == self.start: #O(1)
+            return True
+        self.seek(grid, self.position - 1) #O(xy * c + i * n)
+        return False
 
             
 if __name__ == "__main__":
@@ -0,0 +1,48 @@
+import unittest
+from ed_utils.decorators import number
+
+from data_structures.array_sorted_list import ArraySortedList
+from data_structures.sorted_list_adt import ListItem
+
+class TestArraySortedList(unittest.TestCase):
+
+    def items(self, l):
+        return [(l[i].value, l[i].key) for i in range(len(l))]
+
+    @number("14.2")
+    def test_search_and_merge(self):
+        l = ArraySortedList(1)
+        for value, key in [("c", 3), ("a", 1), ("b", 3), ("d", 7)]:
+            l.add(ListItem(value, key))
+
+        # Items with the same key are told apart by value.
+        self.assertIn(ListItem("b", 3), l)
+        self.assertIn(ListItem("c", 3), l)
+        self.assertNotIn(ListItem("e", 3), l)
+        self.assertNotIn(ListItem("a", 2), l)
+        self.assertEqual(l.index(ListItem("d", 7)), 3)
+        with self.assertRaises(ValueError):
+            l.index(ListItem("d", 8))
+
+        # Merged items go in order, after any with the same key already there.
+        l.merge([ListItem("z", 9), ListItem("y", 0), ListItem("x", 3), ListItem("w", 3)])
+        self.assertEqual([key for _, key in self.items(l)], [0, 1, 3, 3, 3, 3, 7, 9])
+        self.assertEqual(self.items(l)[4:6], [("x", 3), ("w", 3)])
+        self.assertGreaterEqual(len(l.array), 8)
+        l.merge([])
+        self.assertEqual(len(l), 8)
+
+        l.remove(ListItem("x", 3))
+        self.assertNotIn(ListItem("x", 3), l)
+        self.assertIsNone(l.array[len(l)])
+        l.add(ListItem("v", 5))
+        self.assertEqual(l.index(ListItem("v", 5)), 5)
+
+        empty = ArraySortedList(0)
+        self.assertNotIn(ListItem("a", 1), empty)
+        empty.merge(ListItem(str(k), k) for k in range(20, 0, -1))
+        self.assertEqual([key for _, key in self.items(empty)], list(range(1, 21)))
+
+
+if __name__ == '__main__':
+    unittest.main()
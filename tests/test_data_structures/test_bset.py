@@ -0,0 +1,34 @@
+import unittest
+from ed_utils.decorators import number
+
+from data_structures.bset import BSet
+
+class TestBSet(unittest.TestCase):
+
+    @number("14.3")
+    def test_bits(self):
+        s = BSet()
+        self.assertEqual((len(s), list(s), str(s)), (0, [], "{}"))
+        for item in (70, 3, 1, 9, 3):
+            s.add(item)
+        self.assertEqual(len(s), 4)
+        self.assertEqual(list(s), [1, 3, 9, 70])
+        self.assertEqual(str(s), "{1, 3, 9, 70}")
+
+        self.assertEqual([s.select(k) for k in range(len(s))], [1, 3, 9, 70])
+        self.assertEqual([s.rank(item) for item in (1, 2, 3, 4, 70, 71, 500)], [0, 1, 1, 2, 3, 4, 4])
+        for k in range(len(s)):
+            self.assertEqual(s.rank(s.select(k)), k)
+        with self.assertRaises(IndexError):
+            s.select(4)
+        with self.assertRaises(IndexError):
+            BSet().select(0)
+        with self.assertRaises(TypeError):
+            s.rank(0)
+
+        s.remove(3)
+        self.assertEqual((len(s), list(s), s.select(1)), (3, [1, 9, 70], 9))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import pickle
+import unittest
+from ed_utils.decorators import number
+
+from data_structures.referential_array import ArrayR
+
+class TestArrayR(unittest.TestCase):
+
+    @number("14.1")
+    def test_bulk(self):
+        a = ArrayR(8)
+        self.assertEqual(list(a), [None] * 8)
+        a[:] = range(8)
+        self.assertEqual(a[2:5], [2, 3, 4])
+        self.assertEqual(a[::3], [0, 3, 6])
+        with self.assertRaises(ValueError):
+            a[0:2] = [1]
+
+        # Shifts overlap like memmove, and leave the positions moved out of as they were.
+        a.shift(2, 6, 1)
+        self.assertEqual(list(a), [0, 1, 2, 2, 3, 4, 5, 7])
+        a.shift(3, 7, -1)
+        self.assertEqual(list(a), [0, 1, 2, 3, 4, 5, 5, 7])
+        with self.assertRaises(IndexError):
+            a.shift(5, 8, 1)
+
+        b = ArrayR(4)
+        b.copy_from(a)
+        self.assertEqual(list(b), [0, 1, 2, 3])
+        b.copy_from(a, start=1, source_start=6, count=2)
+        self.assertEqual(list(b), [0, 5, 7, 3])
+        with self.assertRaises(IndexError):
+            b.copy_from(a, start=2, count=3)
+        b.fill(9, 2)
+        self.assertEqual(list(b), [0, 5, 9, 9])
+        c = ArrayR(2)
+        c[:] = ["x", "y"]
+        b[1:3] = c
+        self.assertEqual(list(b), [0, "x", "y", 9])
+        b.fill(None)
+        self.assertEqual(list(b), [None] * 4)
+        with self.assertRaises(IndexError):
+            b.fill(0, 3, 5)
+
+        self.assertEqual(list(pickle.loads(pickle.dumps(a))), list(a))
+
+
+if __name__ == '__main__':
+    unittest.main()
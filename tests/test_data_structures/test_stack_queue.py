@@ -0,0 +1,70 @@
+import unittest
+from ed_utils.decorators import number
+
+from data_structures.queue_adt import CircularQueue, GrowableCircularQueue
+from data_structures.stack_adt import ArrayStack, GrowableArrayStack
+
+class TestStackQueue(unittest.TestCase):
+
+    @number("14.4")
+    def test_growable(self):
+        stack = GrowableArrayStack(2, shrink=True)
+        for item in range(9):
+            stack.push(item)
+        self.assertFalse(stack.is_full())
+        self.assertEqual((len(stack), len(stack.array)), (9, 16))
+        self.assertEqual(list(stack), [8, 7, 6, 5, 4, 3, 2, 1, 0])
+        self.assertEqual(list(reversed(stack)), list(range(9)))
+        self.assertEqual((stack.peek_at(0), stack.peek_at(8)), (8, 0))
+        with self.assertRaises(IndexError):
+            stack.peek_at(9)
+        # Halves once a quarter full, but never below where it started.
+        self.assertEqual([stack.pop() for _ in range(5)], [8, 7, 6, 5, 4])
+        self.assertEqual(len(stack.array), 8)
+        while not stack.is_empty():
+            stack.pop()
+        self.assertEqual(len(stack.array), 2)
+        # Grows up to max_capacity, and is then full.
+        limited = GrowableArrayStack(max_capacity=6)
+        for item in range(6):
+            limited.push(item)
+        self.assertTrue(limited.is_full())
+        self.assertEqual(len(limited.array), 6)
+        with self.assertRaises(Exception):
+            limited.push(6)
+
+        # Wrapped round before growing, so growing has to unwrap it.
+        queue = GrowableCircularQueue(4)
+        for item in range(4):
+            queue.append(item)
+        queue.serve()
+        queue.serve()
+        for item in range(4, 9):
+            queue.append(item)
+        self.assertEqual((len(queue), len(queue.array), queue.front), (7, 8, 0))
+        self.assertEqual(list(queue), [2, 3, 4, 5, 6, 7, 8])
+        self.assertEqual(list(reversed(queue)), [8, 7, 6, 5, 4, 3, 2])
+        self.assertEqual((queue.peek_at(0), queue.peek_at(6)), (2, 8))
+        copy = queue.copy()
+        self.assertEqual([queue.serve() for _ in range(7)], list(range(2, 9)))
+        self.assertEqual(list(copy), list(range(2, 9)))
+        with self.assertRaises(Exception):
+            queue.serve()
+
+        # The fixed versions iterate the same way, and still fill up.
+        fixed = CircularQueue(3)
+        for item in (1, 2, 3):
+            fixed.append(item)
+        fixed.serve()
+        fixed.append(4)
+        self.assertEqual((list(fixed), fixed.peek_at(2)), ([2, 3, 4], 4))
+        with self.assertRaises(Exception):
+            fixed.append(5)
+        fixed_stack = ArrayStack(2)
+        fixed_stack.push(1)
+        fixed_stack.push(2)
+        self.assertEqual((list(fixed_stack), fixed_stack.peek_at(1)), ([2, 1], 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
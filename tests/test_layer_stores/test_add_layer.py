@@ -63,5 +63,26 @@ class TestAddLayer(unittest.TestCase):
         s.add(invert)
         self.assertEqual(s.get_color((100, 100, 100), 7, 0, 0), (255-91, 255-214, 255-104))
 
+    @number("2.6")
+    def test_state_hash(self):
+        def store(*layers):
+            s = AdditiveLayerStore()
+            for layer in layers:
+                s.add(layer)
+            return s
+        self.assertEqual(store().state_hash, 0)
+        # Order matters.
+        self.assertNotEqual(store(black, lighten).state_hash, store(lighten, black).state_hash)
+        s = store(black, lighten, rainbow)
+        s.special()
+        self.assertEqual(s.state_hash, store(rainbow, lighten, black).state_hash)
+        s.erase(invert)
+        self.assertEqual(s.state_hash, store(lighten, black).state_hash)
+        s.erase(invert)
+        s.erase(invert)
+        self.assertEqual(s.state_hash, 0)
+        s = store(lighten, lighten, invert)
+        self.assertEqual(s.copy().state_hash, s.state_hash)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
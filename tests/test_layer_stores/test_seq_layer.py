@@ -70,5 +70,28 @@ class TestSeqLayer(unittest.TestCase):
         s.erase(black)
         self.assertEqual(s.get_color((100, 100, 100), 7, 0, 0), (91, 214, 104))
 
+    @number("3.6")
+    def test_state_hash(self):
+        def store(*layers):
+            s = SequenceLayerStore()
+            for layer in layers:
+                s.add(layer)
+            return s
+        self.assertEqual(store().state_hash, 0)
+        # Layers are applied by index, so the order they were added in doesn't matter.
+        self.assertEqual(store(black, lighten, rainbow).state_hash, store(rainbow, black, lighten).state_hash)
+        self.assertEqual(store(black, black).state_hash, store(black).state_hash)
+        # Erasing is remembered, so the store is not back to empty.
+        s = store(black)
+        s.erase(black)
+        self.assertNotEqual(s.state_hash, 0)
+        a = store(black, invert, rainbow)
+        b = store(rainbow, invert, black)
+        a.special()
+        self.assertNotEqual(a.state_hash, b.state_hash)
+        b.special()
+        self.assertEqual(a.state_hash, b.state_hash)
+        self.assertEqual(a.copy().state_hash, a.state_hash)
+
 if __name__ == '__main__':
     unittest.main()
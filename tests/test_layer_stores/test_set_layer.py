@@ -55,5 +55,27 @@ class TestSetLayer(unittest.TestCase):
         self.assertEqual(s.get_color((0, 0, 0), 7, 0, 0), (255, 255, 255))
 
 
+    @number("1.6")
+    def test_state_hash(self):
+        s = SetLayerStore()
+        self.assertEqual(s.state_hash, 0)
+        s.add(lighten)
+        lit = s.state_hash
+        s.add(black)
+        self.assertNotEqual(s.state_hash, lit)
+        s.add(lighten)
+        self.assertEqual(s.state_hash, lit)
+        s.erase(invert)
+        self.assertEqual(s.state_hash, 0)
+        # The frozen colour of special is part of the state.
+        s.add(lighten)
+        s.get_color((100, 100, 100), 0, 0, 0)
+        s.special()
+        once = s.state_hash
+        self.assertNotEqual(once, lit)
+        s.special()
+        self.assertNotIn(s.state_hash, (once, lit))
+        self.assertEqual(s.copy().state_hash, s.state_hash)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
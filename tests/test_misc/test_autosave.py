@@ -0,0 +1,140 @@
+import os
+import tempfile
+import threading
+import unittest
+from ed_utils.decorators import number
+
+import autosave
+from action import PaintAction, PaintStep
+from autosave import Autosaver, AutosaveError, load_autosave
+from grid import Grid
+from layers import blue, red
+from replay import ReplayTracker
+
+class TestAutosave(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".pas")
+        os.close(fd)
+        os.remove(self.path)
+        self.now = 0.0
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def clock(self):
+        return self.now
+
+    def paint(self, grid, tracker, squares, layer):
+        action = PaintAction([PaintStep(square, layer) for square in squares])
+        action.redo_apply(grid)
+        tracker.add_action(action)
+
+    @number("13.1")
+    def test_incremental(self):
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 40, 20)
+        tracker = ReplayTracker()
+        saver = Autosaver(self.path, grid, tracker, interval=5, clock=self.clock)
+        self.now = 1
+        self.assertFalse(saver.tick())
+
+        # The first save has the whole grid, as 3 x 2 chunks.
+        self.now = 5
+        self.assertTrue(saver.tick())
+        saver.flush()
+        self.assertEqual((saver.metrics.saves, saver.metrics.chunks_written), (1, 6))
+
+        # Later saves only have the chunks changed since, and the new history.
+        self.paint(grid, tracker, [(1, 2), (33, 19)], red)
+        self.paint(grid, tracker, [(1, 3)], blue)
+        self.now = 7
+        self.assertFalse(saver.tick())
+        self.now = 10
+        self.assertTrue(saver.tick())
+        saver.flush()
+        self.assertEqual((saver.metrics.saves, saver.metrics.chunks_written, saver.metrics.actions_written), (2, 8, 2))
+        self.assertEqual(saver.metrics.bytes_written, os.path.getsize(self.path))
+        self.now = 20
+        self.assertFalse(saver.tick())
+
+        loaded, actions = load_autosave(self.path)
+        self.assertEqual(loaded, grid)
+        self.assertEqual(loaded[1][2].stack(), [red])
+        self.assertEqual([[step.affected_grid_square for step in action.steps] for action, _ in actions], [[(1, 2), (33, 19)], [(1, 3)]])
+
+        # A save cut short is ignored.
+        grid.special()
+        saver.close()
+        with open(self.path, "r+b") as f:
+            f.truncate(saver.metrics.bytes_written - 3)
+        self.assertEqual(load_autosave(self.path)[0][1][2].stack(), [red])
+        saver.close()
+
+        with open(self.path, "wb") as f:
+            f.write(b"not an autosave")
+        with self.assertRaises(AutosaveError):
+            load_autosave(self.path)
+
+    @number("13.2")
+    def test_never_waits(self):
+        grid = Grid(Grid.DRAW_STYLE_SET, 20, 20)
+        tracker = ReplayTracker()
+        saver = Autosaver(self.path, grid, tracker, interval=1, clock=self.clock)
+        gate = threading.Event()
+        write = saver._write
+        saver._write = lambda buffer: (gate.wait(), write(buffer))
+
+        # While the writer is busy, saves are put off, and their changes go out with the next one.
+        self.now = 1
+        self.assertTrue(saver.tick())
+        self.paint(grid, tracker, [(19, 19)], red)
+        self.now = 2
+        self.assertFalse(saver.tick())
+        self.assertEqual(saver.metrics.busy_skips, 1)
+        gate.set()
+        saver.flush()
+        self.assertEqual(saver.metrics.saves, 2)
+        self.assertEqual(load_autosave(self.path)[0], grid)
+
+        # A new grid is saved in full.
+        replayed = Grid(Grid.DRAW_STYLE_SET, 20, 20)
+        saver.attach(replayed)
+        PaintStep((0, 0), blue).redo_apply(replayed)
+        saver.close()
+        self.assertEqual(saver.metrics.chunks_written, 1 + 4 + 4)
+        self.assertEqual(load_autosave(self.path)[0], replayed)
+        with self.assertRaises(ValueError):
+            saver.attach(Grid(Grid.DRAW_STYLE_ADD, 20, 20))
+
+
+    @number("13.3")
+    def test_write_error(self):
+        grid = Grid(Grid.DRAW_STYLE_SET, 20, 20)
+        tracker = ReplayTracker()
+        saver = Autosaver(self.path, grid, tracker, interval=1, clock=self.clock)
+        self.addCleanup(saver.close)
+        encode = autosave._encode
+        failures = [RuntimeError("can't encode")]
+
+        def failing_encode(*args):
+            if failures:
+                raise failures.pop()
+            return encode(*args)
+        autosave._encode = failing_encode
+        self.addCleanup(setattr, autosave, "_encode", encode)
+
+        # A save that fails in any way is recorded, and doesn't leave flush waiting for it.
+        self.paint(grid, tracker, [(3, 4)], red)
+        saver.flush()
+        self.assertIsInstance(saver.error, RuntimeError)
+        self.assertEqual(saver.metrics.errors, 1)
+        # The next save writes everything again.
+        self.paint(grid, tracker, [(19, 19)], blue)
+        saver.flush()
+        self.assertEqual(load_autosave(self.path)[0], grid)
+        self.assertEqual(len(load_autosave(self.path)[1]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
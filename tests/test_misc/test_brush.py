@@ -0,0 +1,64 @@
+import unittest
+from ed_utils.decorators import number
+
+from brush import BRUSH_DIAMOND, BRUSH_DISC, BRUSH_SHAPES, BRUSH_SQUARE, get_stencil
+from layers import red
+from grid import Grid
+from main import MyWindow
+
+class FakeWindow:
+    def __init__(self, grid: Grid):
+        self.grid = grid
+
+FakeWindow.on_init = MyWindow.on_init
+FakeWindow.on_paint = MyWindow.on_paint
+
+class TestBrush(unittest.TestCase):
+
+    def brute_force(self, shape, size, px, py, width, height):
+        cells = set()
+        for x in range(width):
+            for y in range(height):
+                dx, dy = abs(x - px), abs(y - py)
+                if shape == BRUSH_DIAMOND:
+                    inside = dx + dy <= size
+                elif shape == BRUSH_SQUARE:
+                    inside = max(dx, dy) <= size
+                else:
+                    inside = dx * dx + dy * dy <= size * size + size
+                if inside:
+                    cells.add((x, y))
+        return cells
+
+    @number("8.1")
+    def test_stencils(self):
+        for shape in BRUSH_SHAPES:
+            for size in range(8):
+                for px, py in [(5, 5), (0, 0), (1, 9), (9, 3), (20, 20)]:
+                    cells = list(get_stencil(shape, size).cells(px, py, 10, 10))
+                    self.assertEqual(len(cells), len(set(cells)))
+                    self.assertEqual(set(cells), self.brute_force(shape, size, px, py, 10, 10), (shape, size, px, py))
+
+    @number("8.2")
+    def test_cached(self):
+        self.assertIs(get_stencil(BRUSH_DISC, 3), get_stencil(BRUSH_DISC, 3))
+        with self.assertRaises(ValueError):
+            get_stencil("TRIANGLE", 3)
+
+    @number("8.3")
+    def test_large_brush(self):
+        grid = Grid(Grid.DRAW_STYLE_SET, 150, 150)
+        grid.set_brush_shape(BRUSH_SQUARE)
+        grid.brush_size = 100
+        fw = FakeWindow(grid)
+        fw.on_init()
+        fw.on_paint(red, 120, 30)
+        action = fw.undo_tracker.tree_of_actions.peek()
+        # Columns 20..149, rows 0..130
+        self.assertEqual(len(action.steps), 130 * 131)
+        self.assertEqual(grid[20][130].get_color((0, 0, 0), 0, 20, 130), (255, 0, 0))
+        self.assertEqual(grid[19][130].get_color((0, 0, 0), 0, 19, 130), (0, 0, 0))
+        self.assertEqual(grid[20][131].get_color((0, 0, 0), 0, 20, 131), (0, 0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
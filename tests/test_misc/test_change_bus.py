@@ -0,0 +1,70 @@
+import pickle
+import unittest
+from ed_utils.decorators import number
+
+from action import PaintAction, PaintStep
+from grid import Grid
+from layers import blue, red
+
+class TestChangeBus(unittest.TestCase):
+
+    @number("12.1")
+    def test_batches(self):
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 40, 20)
+        batches = []
+        grid.changes.subscribe(batches.append)
+        self.assertIsNone(grid.changes.publish())
+
+        # Changes are batched until published, and each square is reported once.
+        PaintAction([PaintStep((1, 2), red), PaintStep((1, 2), blue), PaintStep((17, 3), red)]).redo_apply(grid)
+        PaintStep((33, 19), red).undo_apply(grid)
+        self.assertEqual(batches, [])
+        changes = grid.changes.publish()
+        self.assertEqual(batches, [changes])
+        self.assertEqual(changes.squares, {(1, 2), (17, 3), (33, 19)})
+        self.assertEqual(len(changes), 3)
+        self.assertEqual(changes.bounds(), (1, 2, 34, 20))
+        self.assertEqual(changes.chunks(), {(0, 0): [(1, 2)], (1, 0): [(17, 3)], (2, 1): [(33, 19)]})
+        self.assertIsNone(grid.changes.publish())
+
+        # A change to the whole grid is a single change.
+        PaintStep((5, 5), red).redo_apply(grid)
+        grid.special()
+        PaintStep((6, 6), red).redo_apply(grid)
+        changes = grid.changes.publish()
+        self.assertTrue(changes.everything)
+        self.assertEqual(changes.squares, set())
+        self.assertEqual(len(changes), 800)
+        self.assertIn((39, 0), changes)
+        self.assertEqual(len(changes.chunks()), 6)
+
+        grid.restore(grid.copy())
+        self.assertTrue(grid.changes.publish().everything)
+        self.assertEqual(len(batches), 3)
+
+    @number("12.2")
+    def test_subscribers(self):
+        grid = Grid(Grid.DRAW_STYLE_SET, 5, 5)
+        first, second = [], []
+        grid.changes.subscribe(first.append)
+        callback = grid.changes.subscribe(second.append)
+        PaintStep((0, 0), red).redo_apply(grid)
+        grid.changes.publish()
+        grid.changes.unsubscribe(callback)
+        PaintStep((1, 0), red).redo_apply(grid)
+        grid.changes.publish()
+        self.assertEqual([changes.squares for changes in first], [{(0, 0)}, {(1, 0)}])
+        self.assertEqual([changes.squares for changes in second], [{(0, 0)}])
+        with self.assertRaises(ValueError):
+            grid.changes.unsubscribe(callback)
+
+        # Copies (and pickles) of a grid start without subscribers or changes.
+        for other in (grid.copy(), pickle.loads(pickle.dumps(grid))):
+            self.assertEqual(other.changes.subscribers, [])
+            PaintStep((2, 2), red).redo_apply(other)
+            self.assertEqual(other.changes.publish().squares, {(2, 2)})
+        self.assertEqual(len(first), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
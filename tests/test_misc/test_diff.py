@@ -0,0 +1,59 @@
+import unittest
+from ed_utils.decorators import number
+
+from action import PaintAction, PaintStep
+from diff import BLOCK, changed_squares, diff
+from grid import Grid
+from layers import black, blue, green, lighten, red
+
+class TestDiff(unittest.TestCase):
+
+    @number("11.1")
+    def test_changed_squares(self):
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 5, 3 * BLOCK)
+        snapshot = grid.copy()
+        self.assertEqual(changed_squares(grid, snapshot), [])
+
+        squares = [(0, 0), (0, BLOCK), (3, BLOCK - 1), (3, BLOCK), (4, 3 * BLOCK - 1)]
+        PaintAction([PaintStep(square, red) for square in squares]).redo_apply(grid)
+        self.assertEqual(changed_squares(snapshot, grid), squares)
+        self.assertEqual(changed_squares(grid, snapshot), squares)
+
+        # Squares in the same state are the same, however they got there.
+        PaintStep((0, 0), red).redo_apply(snapshot)
+        self.assertEqual(changed_squares(snapshot, grid), squares[1:])
+        grid.restore(snapshot)
+        self.assertEqual(changed_squares(snapshot, grid), [])
+
+        with self.assertRaises(ValueError):
+            changed_squares(grid, Grid(Grid.DRAW_STYLE_SET, 5, 3 * BLOCK))
+        with self.assertRaises(ValueError):
+            changed_squares(grid, Grid(Grid.DRAW_STYLE_SEQUENCE, 5, 10))
+        with self.assertRaises(TypeError):
+            changed_squares(grid, None)
+
+    @number("11.2")
+    def test_stack_deltas(self):
+        before = Grid(Grid.DRAW_STYLE_ADD, 4, 4)
+        for layer in (black, lighten, lighten):
+            PaintStep((1, 1), layer).redo_apply(before)
+        PaintStep((2, 3), green).redo_apply(before)
+
+        after = before.copy()
+        PaintStep((1, 1), red).redo_apply(after)
+        PaintStep((1, 1), red).undo_apply(after) # Erases the oldest layer, black.
+        PaintStep((2, 3), blue).redo_apply(after)
+        PaintStep((0, 2), red).redo_apply(after)
+
+        changes = {cell.position: cell for cell in diff(before, after)}
+        self.assertEqual(sorted(changes), [(0, 2), (1, 1), (2, 3)])
+        self.assertEqual(changes[(1, 1)].before, [black, lighten, lighten])
+        self.assertEqual(changes[(1, 1)].after, [lighten, lighten, red])
+        self.assertEqual(changes[(1, 1)].added, [red])
+        self.assertEqual(changes[(1, 1)].removed, [black])
+        self.assertEqual((changes[(2, 3)].added, changes[(2, 3)].removed), ([blue], []))
+        self.assertEqual((changes[(0, 2)].before, changes[(0, 2)].after), ([], [red]))
+
+
+if __name__ == '__main__':
+    unittest.main()
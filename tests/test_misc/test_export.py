@@ -0,0 +1,135 @@
+import os
+import tempfile
+import unittest
+from ed_utils.decorators import number
+
+from action import PaintAction, PaintStep
+from animation import FrameDiffer
+from export import FRAME_DURATION, export, frame_path, render
+from grid import Grid
+from journal import CODEC_ZLIB, JournalWriter
+from layers import blue, green, lighten, rainbow, red, sparkle
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "session.paj")
+        self.actions = []
+        for i in range(23):
+            layer = (red, green, blue, rainbow, lighten)[i % 5]
+            self.actions.append((PaintAction([PaintStep((i % 8, i % 6), layer), PaintStep(((i * 3) % 8, 2), layer)]), False))
+            if i == 12:
+                special = PaintAction([], is_special=True)
+                self.actions.append((special, False))
+            if i % 7 == 6:
+                self.actions.append((self.actions[-1][0], True))
+            if i == 13:
+                # Undone in a later chunk than it was applied in, when rendering in parallel.
+                self.actions.append((special, True))
+        with JournalWriter(self.path, Grid.DRAW_STYLE_SEQUENCE, 8, 6, codec=CODEC_ZLIB) as writer:
+            for action, is_undo in self.actions:
+                writer.append(action, is_undo)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    @number("10.1")
+    def test_png_sequence(self):
+        serial = os.path.join(self.dir.name, "serial")
+        parallel = os.path.join(self.dir.name, "parallel")
+        frames = export(self.path, serial, every=4, scale=2, workers=1)
+        self.assertEqual(frames, len(range(0, len(self.actions), 4)) + 1)
+        self.assertEqual(export(self.path, parallel, every=4, scale=2, workers=2), frames)
+
+        # Rendering in chunks from keyframes gives exactly the same frames.
+        for frame in range(frames):
+            with open(frame_path(serial, frame), "rb") as a, open(frame_path(parallel, frame), "rb") as b:
+                self.assertEqual(a.read(), b.read())
+
+        # The last frame shows the whole session.
+        from PIL import Image
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 8, 6)
+        for action, is_undo in self.actions:
+            if is_undo:
+                action.undo_apply(grid)
+            else:
+                action.redo_apply(grid)
+        with Image.open(frame_path(parallel, frames - 1)) as image:
+            self.assertEqual(image.size, (16, 12))
+            self.assertEqual(image.convert("RGB").resize((8, 6), getattr(Image, "Resampling", Image).NEAREST).tobytes(), render(grid, (frames - 1) * 0.05))
+
+    @number("10.2")
+    def test_gif(self):
+        out = os.path.join(self.dir.name, "gif")
+        frames = export(self.path, out, every=1, scale=3, gif=True, workers=2)
+        self.assertEqual(frames, len(self.actions) + 1)
+        from PIL import Image
+        with Image.open(os.path.join(out, "replay.gif")) as image:
+            self.assertEqual(image.size, (24, 18))
+            self.assertEqual(image.n_frames, frames)
+        with self.assertRaises(ValueError):
+            export(self.path, out, every=0)
+
+    @number("10.3")
+    def test_animations(self):
+        out = os.path.join(self.dir.name, "animations")
+        export(self.path, out, every=2, scale=2, apng=True, workers=1)
+        export(self.path, out, every=2, scale=2, gif=True, workers=1)
+        # Rendered in parallel, and compared frame by frame, the animations come out the same.
+        parallel = os.path.join(self.dir.name, "parallel")
+        export(self.path, parallel, every=2, scale=2, apng=True, workers=2)
+        export(self.path, parallel, every=2, scale=2, gif=True, workers=2)
+        for name in ("replay.png", "replay.gif"):
+            with open(os.path.join(out, name), "rb") as a, open(os.path.join(parallel, name), "rb") as b:
+                self.assertEqual(a.read(), b.read(), name)
+        from PIL import Image
+        for name in ("replay.png", "replay.gif"):
+            # Drawing each differenced frame over the last gives the whole canvas at every frame.
+            grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 8, 6)
+            played = 0
+            with Image.open(os.path.join(out, name)) as image:
+                self.assertEqual(image.n_frames, len(range(0, len(self.actions), 2)) + 1)
+                for frame in range(image.n_frames):
+                    for action, is_undo in self.actions[played:frame * 2]:
+                        if is_undo:
+                            action.undo_apply(grid)
+                        else:
+                            action.redo_apply(grid)
+                    played = frame * 2
+                    image.seek(frame)
+                    pixels = image.convert("RGB").resize((8, 6), getattr(Image, "Resampling", Image).NEAREST).tobytes()
+                    self.assertEqual(pixels, render(grid, frame * FRAME_DURATION), f"{name} frame {frame}")
+
+    @number("10.4")
+    def test_frame_differ(self):
+        grid = Grid(Grid.DRAW_STYLE_ADD, 20, 10)
+        differ = FrameDiffer(grid)
+        self.assertEqual(differ.update(grid, 0), (0, 0, 20, 10))
+        self.assertIsNone(differ.update(grid, 0.05))
+
+        # Only the painted square changes (rows count down from the top, the highest y).
+        PaintStep((3, 2), red).redo_apply(grid)
+        grid.changes.publish()
+        self.assertEqual(differ.update(grid, 0.1), (3, 7, 4, 8))
+        self.assertEqual(differ.crop((2, 7, 4, 8)), bytes(4) + bytes((255, 0, 0, 255)))
+        self.assertIsNone(differ.update(grid, 0.15))
+
+        # Animated squares keep changing after they were painted, static ones don't.
+        PaintStep((15, 0), sparkle).redo_apply(grid)
+        PaintStep((12, 4), rainbow).redo_apply(grid)
+        self.assertTrue(grid[12][4].is_animated())
+        self.assertFalse(grid[3][2].is_animated())
+        grid.changes.publish()
+        differ.update(grid, 0.2)
+        self.assertEqual(differ.update(grid, 5), (12, 5, 16, 10))
+        PaintStep((15, 0), sparkle).undo_apply(grid)
+        grid.changes.publish()
+        differ.update(grid, 5.05)
+        self.assertEqual(differ.update(grid, 10), (12, 5, 13, 6))
+
+        # Once closed, changes are no longer followed.
+        differ.close()
+        PaintStep((0, 0), red).redo_apply(grid)
+        grid.changes.publish()
+        self.assertEqual(differ.update(grid, 15), (12, 5, 13, 6))
@@ -0,0 +1,92 @@
+import unittest
+from ed_utils.decorators import number
+
+from clock import VirtualClock
+from headless import HeadlessWindow, find_script, run_headless
+from layers import black
+from main import MyWindow
+
+class TestHeadless(unittest.TestCase):
+
+    @number("16.1")
+    def test_virtual_clock(self):
+        clock = VirtualClock(0.25, start=10)
+        deltas = []
+        clock.on_frame.append(deltas.append)
+        self.assertEqual(clock(), 10)
+        clock.sleep(1)
+        self.assertEqual(clock.frames, 4)
+        self.assertEqual(clock(), 11)
+        # Less than a frame is kept until the next sleep.
+        clock.sleep(0.2)
+        self.assertEqual(clock.frames, 4)
+        clock.sleep(0.05)
+        self.assertEqual(clock.frames, 5)
+        self.assertEqual(deltas, [0.25] * 5)
+
+        clock = VirtualClock()
+        for _ in range(6):
+            clock.sleep(0.1)
+        self.assertEqual(clock.frames, 36)
+
+    @number("16.2")
+    def test_run_headless(self):
+        basics = find_script("visuals.basic")
+        first, second = run_headless(basics), run_headless(basics)
+        # The script sleeps 4 seconds in all: 240 frames at 60 frames a second.
+        self.assertEqual(len(first.frame_hashes), 240)
+        self.assertEqual(first.frame_hashes, second.frame_hashes)
+        self.assertEqual(first.digest(), second.digest())
+        self.assertEqual(len(run_headless(basics, fps=10).frame_hashes), 40)
+
+        def script(window: HeadlessWindow):
+            window.on_paint(black, 0, 0)
+            window.clock.sleep(0.5)
+            window.on_paint(black, 5, 5)
+            window.start_replay()
+            # The replay plays an action every REPLAY_TIMER_DELTA seconds, frame by frame, then ends.
+            self.assertFalse(window.enable_ui)
+            window.clock.sleep(1)
+            self.assertTrue(window.enable_ui)
+
+        window = run_headless(script, width=8, height=8)
+        self.assertEqual(len(window.frame_hashes), 90)
+        # The replay starts with the first paint played, and plays the second 3 frames later.
+        self.assertEqual(window.frame_hashes[:33], window.frame_hashes[:1] * 33)
+        self.assertEqual(window.frame_hashes[33:], window.frame_hashes[-1:] * 57)
+        self.assertNotEqual(window.frame_hashes[0], window.frame_hashes[-1])
+        # The window's time is the clock's, and its settings are MyWindow's.
+        self.assertEqual(window.timestamp, window.clock() - window.reset_time)
+        self.assertEqual(window.REPLAY_TIMER_DELTA, MyWindow.REPLAY_TIMER_DELTA)
+        self.assertEqual((window.GRID_SIZE_X, window.JOURNAL_PATH), (8, None))
+
+
+    @number("16.3")
+    def test_budget_replay(self):
+        class CostlyClock(VirtualClock):
+            """A virtual clock that also moves on 3ms every time it is read, as if that was what each action took."""
+            reads = 0
+
+            def __call__(self):
+                self.reads += 1
+                return VirtualClock.__call__(self) + self.reads * 0.003
+
+        def script(window: HeadlessWindow):
+            for x in range(8):
+                for y in range(3):
+                    window.on_paint(black, x, y)
+            window.replay_mode = window.REPLAY_MODE_BUDGET
+            window.start_replay()
+            played = [window.replay_tracker.position]
+            while not window.enable_ui:
+                window.clock.sleep(window.clock.frame_time)
+                played.append(window.replay_tracker.position)
+            # The budget is timed by the window's clock: it is used up by the third action of 3ms each frame.
+            self.assertEqual(window.REPLAY_FRAME_BUDGET, 0.008)
+            self.assertEqual(played, [1, 4, 7, 10, 13, 16, 19, 22, 24])
+
+        run_headless(script, width=8, height=8, clock=CostlyClock())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,350 @@
+import os
+import tempfile
+import unittest
+from ed_utils.decorators import number
+
+from action import PaintAction, PaintStep
+from action_codec import pack_actions, unpack_actions
+from brush import BRUSH_DIAMOND, BRUSH_DISC, get_stencil
+from grid import Grid
+from journal import CODEC_RAW, CODEC_ZLIB, HEADER, INDEX_ENTRY, INDEX_HEADER, JournalError, JournalIndex, JournalReader, JournalWriter, index_path
+from layers import black, blue, green, red
+from replay import ReplayTracker
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".paj")
+        os.close(fd)
+        os.remove(self.path)
+
+    def tearDown(self):
+        for path in (self.path, index_path(self.path)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def make_actions(self, n):
+        actions = []
+        for i in range(n):
+            if i % 9 == 8:
+                actions.append((PaintAction([], is_special=True), False))
+            else:
+                layer = (red, green, blue, black)[i % 4]
+                actions.append((PaintAction([PaintStep((i % 7, i % 5), layer), PaintStep((3, 3), layer)]), False))
+            if i % 6 == 5:
+                actions.append((actions[-2][0], True))
+        return actions
+
+    def make_stamps(self, n):
+        """Brush stamps wandering over a 32x32 grid, as painted one at a time."""
+        actions = []
+        x, y = 16, 16
+        for i in range(n):
+            x = max(0, min(31, x + (i * 7) % 3 - 1))
+            y = max(0, min(31, y + (i * 5) % 3 - 1))
+            stencil = get_stencil(BRUSH_DISC if i % 10 == 0 else BRUSH_DIAMOND, 2)
+            layer = (red, green, blue)[i // 40 % 3]
+            steps = [PaintStep(cell, layer) for cell in stencil.cells(x, y, 32, 32)]
+            stamps = [(stencil, x, y)]
+            if i % 50 == 49:
+                steps.append(PaintStep((0, 0), black))
+            if i % 30 == 29:
+                # A stroke: stamps that overlap only paint each square once.
+                x2, y2 = min(31, x + 1), min(31, y + 1)
+                stamps.append((stencil, x2, y2))
+                steps += [PaintStep(cell, layer) for cell in stencil.cells(x2, y2, 32, 32) if PaintStep(cell, layer) not in steps]
+            actions.append((PaintAction(steps, False, stamps), i % 17 == 16))
+        return actions
+
+    def make_strokes(self, n):
+        """Drags of 40 brush stamps each, as painted in stroke mode."""
+        actions = []
+        stencil = get_stencil(BRUSH_DIAMOND, 2)
+        for i in range(n):
+            x, y = (i * 11) % 32, (i * 7) % 32
+            layer = (red, green, blue)[i % 3]
+            steps, stamps, painted = [], [], set()
+            for j in range(40):
+                x = max(0, min(31, x + (i + j * j) % 3 - 1))
+                y = max(0, min(31, y + (i * j + 1) % 3 - 1))
+                stamps.append((stencil, x, y))
+                for cell in stencil.cells(x, y, 32, 32):
+                    if cell not in painted:
+                        painted.add(cell)
+                        steps.append(PaintStep(cell, layer))
+            actions.append((PaintAction(steps, False, stamps), False))
+        return actions
+
+    @number("9.1")
+    def test_round_trip(self):
+        actions = self.make_actions(30)
+        ticks = iter(range(1000))
+        with JournalWriter(self.path, Grid.DRAW_STYLE_SEQUENCE, 7, 5, fsync_every=8, clock=lambda: next(ticks)) as writer:
+            for action, is_undo in actions:
+                writer.append(action, is_undo)
+
+        with JournalReader(self.path) as reader:
+            self.assertEqual((reader.draw_style, reader.x, reader.y), (Grid.DRAW_STYLE_SEQUENCE, 7, 5))
+            self.assertEqual(reader.count(), len(actions))
+            records = list(reader.records())
+        for i, (record, (action, is_undo)) in enumerate(zip(records, actions)):
+            self.assertEqual(record.action, action)
+            self.assertEqual(record.is_undo, is_undo)
+            self.assertEqual(record.timestamp, i)
+
+    @number("9.2")
+    def test_recovery(self):
+        actions = self.make_actions(10)
+        with JournalWriter(self.path, Grid.DRAW_STYLE_SET, 7, 5) as writer:
+            for action, is_undo in actions:
+                writer.append(action, is_undo)
+        size = os.path.getsize(self.path)
+
+        # A crash part way through writing a record.
+        with open(self.path, "ab") as f:
+            f.write(b"\x30\x00\x00\x00\x12")
+        with JournalReader(self.path) as reader:
+            self.assertEqual(reader.count(), len(actions))
+
+        # Reopening drops the partial record and carries on after the last complete one.
+        with JournalWriter(self.path, Grid.DRAW_STYLE_SET, 7, 5) as writer:
+            self.assertEqual(writer.count, len(actions))
+            self.assertEqual(os.path.getsize(self.path), size)
+            writer.append(*actions[0])
+        with JournalReader(self.path) as reader:
+            self.assertEqual(reader.count(), len(actions) + 1)
+
+        # A corrupted record ends the journal.
+        with open(self.path, "r+b") as f:
+            f.seek(size - 1)
+            f.write(b"\xff")
+        with JournalReader(self.path) as reader:
+            self.assertEqual(reader.count(), len(actions) - 1)
+
+        with self.assertRaises(JournalError):
+            JournalWriter(self.path, Grid.DRAW_STYLE_ADD, 7, 5)
+        with open(self.path, "wb") as f:
+            f.write(b"not a journal at all")
+        with self.assertRaises(JournalError):
+            JournalReader(self.path)
+
+    @number("9.3")
+    def test_replay_from_journal(self):
+        actions = self.make_actions(40)
+        replay = ReplayTracker(JournalWriter(self.path, Grid.DRAW_STYLE_SEQUENCE, 7, 5))
+        replay.MAX_ACTIONS = 10
+        replay.KEYFRAME_INTERVAL = 8
+        for action, is_undo in actions:
+            replay.add_action(action, is_undo)
+        self.assertEqual(len(replay), len(actions))
+
+        def control(n):
+            control_grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 7, 5)
+            for action, is_undo in actions[:n]:
+                if is_undo:
+                    action.undo_apply(control_grid)
+                else:
+                    action.redo_apply(control_grid)
+            return control_grid
+
+        # Streamed playback, seeking both ways.
+        replay.start_replay()
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 7, 5)
+        self.assertEqual(replay.play_actions(grid), True)
+        self.assertGridEqual(grid.copy(), control(len(actions)))
+        for target in [13, 2, 30, 29]:
+            replay.seek(grid, target)
+            self.assertGridEqual(grid.copy(), control(target))
+
+        # Recording carries on after the replay, and a new tracker resumes the journal.
+        replay.seek(grid, len(actions))
+        replay.stop_replay()
+        replay.add_action(*actions[0])
+        replay.close()
+        actions.append(actions[0])
+
+        replay = ReplayTracker.from_journal(self.path)
+        self.assertEqual(len(replay), len(actions))
+        self.assertEqual(replay.read_index, 0)
+        replay.start_replay()
+        grid = replay.reader.new_grid()
+        replay.play_actions(grid)
+        self.assertGridEqual(grid.copy(), control(len(actions)))
+        replay.add_action(*actions[0])
+        self.assertEqual(len(replay), len(actions))
+        replay.close()
+
+    @number("9.4")
+    def test_index(self):
+        actions = self.make_actions(100)
+        ticks = iter(range(0, 10000, 10))
+        writer = JournalWriter(self.path, Grid.DRAW_STYLE_SEQUENCE, 7, 5, clock=lambda: next(ticks))
+        for action, is_undo in actions[:50]:
+            writer.append(action, is_undo)
+
+        with JournalReader(self.path) as reader:
+            offsets = [record.offset for record in reader.records()]
+            index = JournalIndex(self.path, stride=8)
+            self.assertEqual(index.update(reader), 50)
+            self.assertEqual(index.offsets, offsets[::8])
+            self.assertEqual(os.path.getsize(index_path(self.path)), INDEX_HEADER.size + 7 * INDEX_ENTRY.size)
+            for n in [0, 7, 8, 33, 49]:
+                self.assertEqual(index.offset_of(reader, n), offsets[n])
+            self.assertEqual(index.find_time(reader, 125), 13)
+            self.assertEqual(index.find_time(reader, 130), 13)
+            self.assertEqual(index.find_time(reader, -5), 0)
+            self.assertEqual(index.find_time(reader, 10000), 50)
+
+        # The index is reloaded from disk and only extended with the new records.
+        for action, is_undo in actions[50:]:
+            writer.append(action, is_undo)
+        writer.close()
+        with JournalReader(self.path) as reader:
+            offsets = [record.offset for record in reader.records()]
+            index = JournalIndex(self.path, stride=8)
+            self.assertEqual(len(index.offsets), 7)
+            self.assertEqual(index.update(reader), len(actions))
+            self.assertEqual(index.offsets, offsets[::8])
+            self.assertEqual(JournalIndex(self.path, stride=8).offsets, offsets[::8])
+
+        # Truncating the journal drops the index, and a different stride rebuilds it.
+        with open(self.path, "ab") as f:
+            f.write(b"\x01")
+        with JournalWriter(self.path, Grid.DRAW_STYLE_SEQUENCE, 7, 5):
+            pass
+        self.assertFalse(os.path.exists(index_path(self.path)))
+        with JournalReader(self.path) as reader:
+            index = JournalIndex(self.path, stride=16)
+            index.update(reader)
+            self.assertEqual(JournalIndex(self.path, stride=16).offsets, offsets[::16])
+
+        # Playback from part way through, without the actions before it.
+        start = 77
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 7, 5)
+        for action, is_undo in actions[:start]:
+            if is_undo:
+                action.undo_apply(grid)
+            else:
+                action.redo_apply(grid)
+        control_grid = grid.copy()
+        for action, is_undo in actions[start:]:
+            if is_undo:
+                action.undo_apply(control_grid)
+            else:
+                action.redo_apply(control_grid)
+
+        replay = ReplayTracker.from_journal(self.path)
+        self.assertEqual(replay.position_at_time(start * 10), start)
+        replay.start_replay(start)
+        self.assertEqual(replay.play_actions(grid), True)
+        self.assertGridEqual(grid.copy(), control_grid)
+        replay.seek(grid, 0)
+        self.assertEqual(replay.position, start)
+        self.assertEqual(replay.play_previous_action(grid), True)
+        replay.close()
+
+    @number("9.5")
+    def test_compressed(self):
+        actions = self.make_actions(60) + self.make_stamps(100)
+        ticks = iter(range(1000))
+        with JournalWriter(self.path, Grid.DRAW_STYLE_SEQUENCE, 32, 32, clock=lambda: next(ticks), codec=CODEC_ZLIB) as writer:
+            for action, is_undo in actions[:100]:
+                writer.append(action, is_undo)
+        # Appending again, part way through a block, carries on coding from the same state.
+        with JournalWriter(self.path, Grid.DRAW_STYLE_SEQUENCE, 32, 32, clock=lambda: next(ticks), codec=CODEC_ZLIB) as writer:
+            for action, is_undo in actions[100:]:
+                writer.append(action, is_undo)
+        with self.assertRaises(JournalError):
+            JournalWriter(self.path, Grid.DRAW_STYLE_SEQUENCE, 32, 32, codec=CODEC_RAW)
+
+        with JournalReader(self.path) as reader:
+            records = list(reader.records())
+        self.assertEqual([(record.action, record.is_undo) for record in records], actions)
+        self.assertEqual([record.timestamp for record in records], list(range(len(actions))))
+
+        replay = ReplayTracker.from_journal(self.path)
+        self.assertEqual(replay.position_at_time(130.5), 131)
+        replay.start_replay()
+        for target in [150, 70, 3, 128, 129, 64]:
+            replay.seek(Grid(Grid.DRAW_STYLE_SEQUENCE, 32, 32), target)
+            self.assertEqual(replay.get_action(target), actions[target])
+        replay.close()
+
+    @number("9.6")
+    def test_compression_ratio(self):
+        def journal_size(actions, codec):
+            with JournalWriter(self.path, Grid.DRAW_STYLE_SET, 32, 32, clock=lambda: 1700000000.25, codec=codec) as writer:
+                for action, is_undo in actions:
+                    writer.append(action, is_undo)
+            size = os.path.getsize(self.path)
+            os.remove(self.path)
+            return size
+
+        # Stroke mode sessions shrink by 10x as they are written.
+        strokes = self.make_strokes(500)
+        self.assertGreaterEqual(journal_size(strokes, CODEC_RAW) / journal_size(strokes, CODEC_ZLIB), 10)
+
+        # One stamp per action has more overhead per record, but packs down well.
+        actions = self.make_stamps(2000)
+        raw_size = journal_size(actions, CODEC_RAW)
+        self.assertGreaterEqual(raw_size / journal_size(actions, CODEC_ZLIB), 5)
+        for codec in ("zlib", "lzma"):
+            packed = pack_actions(actions, 32, 32, codec)
+            self.assertGreaterEqual(raw_size / len(packed), 10)
+            unpacked = list(unpack_actions(packed, chunk_size=64))
+            self.assertEqual([(action, is_undo) for action, is_undo, _ in unpacked], actions)
+            with self.assertRaises(ValueError):
+                list(unpack_actions(packed[:len(packed) // 2]))
+        with self.assertRaises(ValueError):
+            pack_actions(actions, 32, 32, "bz2")
+
+    @number("9.7")
+    def test_undo_special_from_journal(self):
+        # Actions decoded from the journal are new objects, but an undone special still restores exactly.
+        paint = PaintAction([PaintStep((x, y), layer) for x in range(7) for y in range(5) for layer in (red, black, blue)])
+        special = PaintAction([], is_special=True)
+        replay = ReplayTracker(JournalWriter(self.path, Grid.DRAW_STYLE_SEQUENCE, 7, 5))
+        self.addCleanup(replay.close)
+        for action, is_undo in [(paint, False), (special, False), (special, False), (special, True), (special, True)]:
+            replay.add_action(action, is_undo)
+        control_grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 7, 5)
+        paint.redo_apply(control_grid)
+
+        replay.start_replay()
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 7, 5)
+        replay.play_actions(grid)
+        self.assertEqual(grid, control_grid)
+        self.assertEqual(len(grid[6][4].stack()), 3)
+
+    @number("9.8")
+    def test_seek_undo_special_from_journal(self):
+        # After seeking back to a keyframe, a special played before it can still be undone exactly.
+        paint = PaintAction([PaintStep((x, y), layer) for x in range(7) for y in range(5) for layer in (red, black, blue)])
+        special = PaintAction([], is_special=True)
+        other = PaintAction([PaintStep((3, 3), green)])
+        recorded = [(paint, False), (special, False), (other, False), (other, True), (special, True)]
+        replay = ReplayTracker(JournalWriter(self.path, Grid.DRAW_STYLE_SEQUENCE, 7, 5))
+        self.addCleanup(replay.close)
+        replay.KEYFRAME_INTERVAL = 2
+        for action, is_undo in recorded:
+            replay.add_action(action, is_undo)
+        control_grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 7, 5)
+        paint.redo_apply(control_grid)
+
+        replay.start_replay()
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 7, 5)
+        replay.play_actions(grid)
+        self.assertEqual(len(replay.keyframes), 3)
+        replay.seek(grid, 3)
+        replay.play_actions(grid)
+        self.assertGridEqual(grid, control_grid)
+        self.assertEqual(grid[6][4].stack(), control_grid[6][4].stack())
+
+    def assertGridEqual(self, grid1: Grid, grid2: Grid):
+        for x in range(len(grid1.grid)):
+            for y in range(len(grid1[x])):
+                self.assertEqual(
+                    grid1[x][y].get_color((0, 0, 0), 0, x, y),
+                    grid2[x][y].get_color((0, 0, 0), 0, x, y),
+                    "Grid not the same after the journal was played back."
+                )
@@ -0,0 +1,76 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+from ed_utils.decorators import number
+
+import layer_util
+from layer_util import count_calls, layer_costs, reset_costs, time_calls, write_costs
+from layers import black, darken, lighten, sparkle
+
+class TestLayerCosts(unittest.TestCase):
+
+    def setUp(self):
+        reset_costs()
+
+    def tearDown(self):
+        time_calls(False)
+        count_calls(False)
+        reset_costs()
+
+    @number("18.1")
+    def test_costs(self):
+        apply = sparkle.apply
+        time_calls()
+        for x in range(50):
+            sparkle.apply((100, 100, 100), 0, x, 0)
+        black.apply((100, 100, 100), 0, 0, 0)
+        self.assertEqual(sparkle.calls, 50)
+        # sparkle lightens or darkens every square, and those calls are theirs.
+        self.assertEqual(lighten.calls + darken.calls, 50)
+        self.assertGreater(sparkle.seconds, 0)
+
+        costs = layer_costs()
+        self.assertEqual({cost.name for cost in costs}, {"sparkle", "black"} | {l.name for l in (lighten, darken) if l.calls})
+        self.assertEqual(costs[0].name, "sparkle")
+        self.assertEqual([cost.seconds for cost in costs], sorted((cost.seconds for cost in costs), reverse=True))
+        self.assertAlmostEqual(sum(cost.share for cost in costs), 1)
+        self.assertAlmostEqual(costs[0].mean, sparkle.seconds / 50)
+
+        # Counting as well as timing (as the profiler does) keeps timing; stopping both unwraps the layers.
+        count_calls()
+        count_calls(False)
+        sparkle.apply((100, 100, 100), 0, 0, 0)
+        self.assertEqual(sparkle.calls, 51)
+        time_calls(False)
+        self.assertIs(sparkle.apply, apply)
+        sparkle.apply((100, 100, 100), 0, 0, 0)
+        self.assertEqual(sparkle.calls, 51)
+        reset_costs()
+        self.assertEqual(layer_costs(), [])
+
+    @number("18.2")
+    def test_export(self):
+        time_calls()
+        black.apply((1, 2, 3), 0, 0, 0)
+        lighten.apply((1, 2, 3), 0, 0, 0)
+        lighten.apply((1, 2, 3), 0, 0, 0)
+        costs = layer_costs()
+        self.assertIn("lighten", layer_util.format_costs(costs))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "costs.csv")
+            write_costs(path, costs)
+            with open(path, newline="") as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual({row["name"]: int(row["calls"]) for row in rows}, {"black": 1, "lighten": 2})
+            path = os.path.join(directory, "costs.json")
+            write_costs(path, costs)
+            with open(path) as f:
+                rows = json.load(f)
+            self.assertEqual({row["name"]: row["calls"] for row in rows}, {"black": 1, "lighten": 2})
+            self.assertEqual([row["seconds"] for row in rows], [cost.seconds for cost in costs])
+
+
+if __name__ == '__main__':
+    unittest.main()
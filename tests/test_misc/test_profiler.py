@@ -0,0 +1,86 @@
+import unittest
+from ed_utils.decorators import number
+
+import layer_util
+from clock import VirtualClock
+from headless import HeadlessWindow
+from layers import black, lighten, rainbow
+from profiler import (COUNT_APPLY, COUNT_GET_COLOR, HISTOGRAM_BUCKET, SECTION_GRID, SECTION_UI, SECTION_UPDATE,
+                      FrameProfiler, percentile)
+
+class TestProfiler(unittest.TestCase):
+
+    def tearDown(self):
+        layer_util.count_calls(False)
+
+    @number("17.1")
+    def test_frames(self):
+        now = [0.0]
+        profiler = FrameProfiler(history=100, budget=0.010, clock=lambda: now[0])
+        # Disabled, nothing is kept.
+        with profiler.section(SECTION_GRID):
+            now[0] += 1
+        profiler.end_frame()
+        self.assertIsNone(profiler.stats())
+
+        profiler.enable()
+        for frame in range(120):
+            with profiler.section(SECTION_UPDATE):
+                now[0] += 0.001
+            with profiler.section(SECTION_GRID):
+                # Every tenth frame is slow.
+                now[0] += 0.020 if frame % 10 == 9 else 0.0025
+            profiler.count(COUNT_GET_COLOR, 5)
+            profiler.end_frame()
+        stats = profiler.stats()
+        # Only the last 100 frames are kept.
+        self.assertEqual(stats.frames, 100)
+        self.assertAlmostEqual(stats.sections[SECTION_UPDATE], 0.001)
+        self.assertAlmostEqual(stats.sections[SECTION_GRID], 0.00425)
+        self.assertEqual(stats.sections[SECTION_UI], 0)
+        self.assertAlmostEqual(stats.last[SECTION_GRID], 0.020)
+        self.assertEqual(stats.counts[COUNT_GET_COLOR], 5)
+        self.assertAlmostEqual(stats.p50, 0.0035)
+        self.assertAlmostEqual(stats.p95, 0.021)
+        self.assertEqual(stats.over_budget, 10)
+        self.assertEqual(sum(stats.histogram), 100)
+        self.assertEqual(stats.histogram[int(0.0035 / HISTOGRAM_BUCKET)], 90)
+        self.assertEqual(stats.histogram[-1], 0)
+        self.assertEqual(len(profiler.report()), 4)
+
+        self.assertEqual(percentile([1, 2, 3, 4], 0.5), 2)
+        self.assertEqual(percentile([1, 2, 3, 4], 0.99), 4)
+        self.assertEqual(percentile([7], 0), 7)
+
+    @number("17.2")
+    def test_calls(self):
+        apply = black.apply
+        layer_util.count_calls()
+        calls = layer_util.total_calls()
+        black.apply((1, 2, 3), 0, 0, 0)
+        lighten.apply((1, 2, 3), 0, 0, 0)
+        lighten.apply((1, 2, 3), 0, 0, 0)
+        self.assertEqual(layer_util.total_calls(), calls + 3)
+        layer_util.count_calls(False)
+        # Not counting, layers call their own functions again.
+        self.assertIs(black.apply, apply)
+        black.apply((1, 2, 3), 0, 0, 0)
+        self.assertEqual(layer_util.total_calls(), calls + 3)
+
+        # A headless window times its updates and colouring, and counts the squares and layers coloured.
+        window = HeadlessWindow(width=8, height=8, clock=VirtualClock())
+        window.profiler.enable()
+        window.on_paint(rainbow, 4, 4)
+        window.clock.sleep(0.5)
+        stats = window.profiler.stats()
+        self.assertEqual(stats.frames, 30)
+        self.assertGreater(stats.sections[SECTION_GRID], 0)
+        # The 13 rainbow squares under the brush are recoloured every frame, each with one call of rainbow
+        # (and the draw before the paint colours every square, blank).
+        self.assertEqual(stats.counts[COUNT_APPLY], 13)
+        self.assertAlmostEqual(stats.counts[COUNT_GET_COLOR], 13 + 64 / 30)
+        window.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import random
+import unittest
+from ed_utils.decorators import number
+
+from raster import sampled_line, supercover_line
+
+class TestRaster(unittest.TestCase):
+
+    @number("7.1")
+    def test_single_square(self):
+        self.assertEqual(list(supercover_line(3.5, 4.5, 3.7, 4.1)), [(3, 4)])
+
+    @number("7.2")
+    def test_straight_lines(self):
+        self.assertEqual(list(supercover_line(0.5, 0.5, 3.5, 0.5)), [(0, 0), (1, 0), (2, 0), (3, 0)])
+        self.assertEqual(list(supercover_line(0.5, 2.5, 0.5, -0.5)), [(0, 2), (0, 1), (0, 0), (0, -1)])
+
+    @number("7.3")
+    def test_corner(self):
+        # Passing exactly through a corner covers both sides of it.
+        self.assertEqual(
+            list(supercover_line(0.5, 0.5, 2.5, 2.5)),
+            [(0, 0), (1, 0), (0, 1), (1, 1), (2, 1), (1, 2), (2, 2)],
+        )
+
+    @number("7.4")
+    def test_covers_sampler(self):
+        rng = random.Random(7)
+        width, height = 700 / 32, 700 / 32
+        for _ in range(500):
+            x0, y0, x1, y1 = (rng.randint(0, 700) for _ in range(4))
+            cells = list(supercover_line(x0, y0, x1, y1, width, height))
+            self.assertEqual(len(cells), len(set(cells)), "Square yielded more than once")
+            self.assertEqual(cells[0], (int(x0 // width), int(y0 // height)))
+            self.assertEqual(cells[-1], (int(x1 // width), int(y1 // height)))
+            if (x0, y0) != (x1, y1):
+                self.assertTrue(set(sampled_line(x0, y0, x1, y1, width, height)) <= set(cells))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,10 @@
+import pickle
 import unittest
 from ed_utils.decorators import number
 
 from action import PaintAction, PaintStep
 from replay import ReplayTracker
-from layers import blue, green, red, invert
+from layers import blue, green, red, invert, black
 from grid import Grid
 
 class TestReplay(unittest.TestCase):
@@ -102,6 +103,177 @@ class TestReplay(unittest.TestCase):
         self.assertGridEqual(grid, control_grid)
         self.assertEqual(replay.play_next_action(grid), True) # Finished.
 
+    @number("5.4")
+    def test_seek(self):
+        actions = []
+        for i in range(23):
+            if i % 7 == 6:
+                actions.append((PaintAction([], is_special=True), False))
+            else:
+                layer = (red, green, blue, black)[i % 4]
+                actions.append((PaintAction([PaintStep((i % 5, i % 3), layer), PaintStep((4, 4), layer)]), False))
+            if i % 5 == 4:
+                actions.append((actions[-2][0], True))
+
+        replay = ReplayTracker()
+        replay.KEYFRAME_INTERVAL = 4
+        for action, is_undo in actions:
+            replay.add_action(action, is_undo)
+        replay.start_replay()
+
+        def control(n):
+            control_grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 5, 5)
+            for action, is_undo in actions[:n]:
+                if is_undo:
+                    action.undo_apply(control_grid)
+                else:
+                    action.redo_apply(control_grid)
+            return control_grid
+
+        # get_color caches colours in the layer stores, so only ever read copies of the replayed grid.
+        grid = Grid(Grid.DRAW_STYLE_SEQUENCE, 5, 5)
+        for target in [10, 3, 27, 0, 12, 11, 9, len(actions), 17, 1000]:
+            replay.seek(grid, target)
+            self.assertEqual(replay.position, min(target, len(actions)))
+            self.assertGridEqual(grid.copy(), control(target))
+
+        # Step backwards to the start.
+        replay.seek(grid, 6)
+        for n in range(5, -1, -1):
+            self.assertEqual(replay.play_previous_action(grid), False)
+            self.assertGridEqual(grid.copy(), control(n))
+        self.assertEqual(replay.play_previous_action(grid), True)
+
+        # And forwards again.
+        for n in range(1, len(actions) + 1):
+            self.assertEqual(replay.play_next_action(grid), False)
+            self.assertGridEqual(grid.copy(), control(n))
+        self.assertEqual(replay.play_next_action(grid), True)
+
+    @number("5.5")
+    def test_play_many(self):
+        grid = Grid(Grid.DRAW_STYLE_SET, 10, 10)
+        control_grid = Grid(Grid.DRAW_STYLE_SET, 10, 10)
+
+        replay = ReplayTracker()
+        actions = [PaintAction([PaintStep((i, i), (red, green, blue)[i % 3])]) for i in range(10)]
+        for action in actions:
+            replay.add_action(action)
+        replay.start_replay()
+
+        # A fixed number of actions.
+        self.assertEqual(replay.play_actions(grid, 3), False)
+        self.assertEqual(replay.position, 3)
+
+        # As many as fit in the budget: this clock advances by one second per call.
+        ticks = iter(range(100))
+        self.assertEqual(replay.play_for(grid, 2, clock=lambda: next(ticks)), False)
+        self.assertEqual(replay.position, 5)
+
+        # Catch up with everything left.
+        self.assertEqual(replay.play_actions(grid), True)
+        self.assertEqual(replay.position, 10)
+        for action in actions:
+            action.redo_apply(control_grid)
+        self.assertGridEqual(grid, control_grid)
+        self.assertEqual(replay.play_next_action(grid), True)
+
+    @number("5.6")
+    def test_state_hash(self):
+        grid = Grid(Grid.DRAW_STYLE_ADD, 10, 10)
+        control_grid = Grid(Grid.DRAW_STYLE_ADD, 10, 10)
+        self.assertEqual(grid.state_hash(), 0)
+        self.assertEqual(grid, control_grid)
+        self.assertNotEqual(grid, Grid(Grid.DRAW_STYLE_SEQUENCE, 10, 10))
+
+        PaintStep((1, 2), red).redo_apply(grid)
+        self.assertNotEqual(grid, control_grid)
+        # The same store at another square makes a different grid.
+        PaintStep((2, 1), red).redo_apply(control_grid)
+        self.assertNotEqual(grid, control_grid)
+        PaintStep((2, 1), red).undo_apply(control_grid)
+        PaintStep((1, 2), red).redo_apply(control_grid)
+        self.assertEqual(grid, control_grid)
+        snapshot = grid.copy()
+        grid.special()
+        grid.special()
+        self.assertEqual(grid, snapshot)
+
+        # Keyframes of unchanged grids are shared.
+        replay = ReplayTracker()
+        replay.KEYFRAME_INTERVAL = 2
+        action = PaintAction([PaintStep((0, 0), blue)])
+        for is_undo in (False, True, False, True, False):
+            replay.add_action(action, is_undo)
+        replay.start_replay()
+        grid = Grid(Grid.DRAW_STYLE_SET, 10, 10)
+        replay.play_actions(grid)
+        self.assertEqual(len(replay.keyframes), 3)
+        self.assertIs(replay.keyframes[0], replay.keyframes[1])
+        self.assertIs(replay.keyframes[1], replay.keyframes[2])
+        replay.seek(grid, 2)
+        self.assertEqual(grid.state_hash(), 0)
+        replay.seek(grid, 5)
+        control_grid = Grid(Grid.DRAW_STYLE_SET, 10, 10)
+        action.redo_apply(control_grid)
+        self.assertEqual(grid, control_grid)
+
+    @number("5.7")
+    def test_keyframe_limit(self):
+        actions = [PaintAction([PaintStep((i % 5, i // 5 % 5), (red, green, blue, black)[i % 4])]) for i in range(200)]
+        replay = ReplayTracker()
+        replay.KEYFRAME_INTERVAL = 4
+        replay.MAX_KEYFRAMES = 5
+        for action in actions:
+            replay.add_action(action)
+        replay.start_replay()
+
+        def control(n):
+            control_grid = Grid(Grid.DRAW_STYLE_ADD, 5, 5)
+            for action in actions[:n]:
+                action.redo_apply(control_grid)
+            return control_grid
+
+        grid = Grid(Grid.DRAW_STYLE_ADD, 5, 5)
+        replay.play_actions(grid)
+        # 200 actions would take 50 keyframes 4 apart: instead there are never more than 5, further apart.
+        self.assertLessEqual(len(replay.keyframes), replay.MAX_KEYFRAMES)
+        self.assertEqual(replay.keyframe_spacing, 16)
+        for target in [150, 3, 199, 64, 0, 65, 130]:
+            replay.seek(grid, target)
+            self.assertEqual(grid, control(target))
+            self.assertGridEqual(grid.copy(), control(target))
+        # Every keyframe is the grid as it was where it was taken.
+        interval = replay.KEYFRAME_INTERVAL * replay.keyframe_spacing
+        for k, keyframe in enumerate(replay.keyframes):
+            self.assertEqual(keyframe, control(k * interval))
+
+    @number("5.8")
+    def test_state_hash_direct_changes(self):
+        # Stores changed through grid[x][y] rather than a PaintStep still change the grid's hash.
+        for style in Grid.DRAW_STYLE_OPTIONS:
+            grid = Grid(style, 4, 4)
+            empty = Grid(style, 4, 4)
+            self.assertEqual(grid, empty)
+            grid[0][0].add(red)
+            self.assertNotEqual(grid, empty)
+            grid[0][0].erase(red)
+            if style != Grid.DRAW_STYLE_SEQUENCE:
+                self.assertEqual(grid, empty)
+            grid[1][2].add(blue)
+            grid[1][2].add(green)
+            # So do the stores of copies, unpickled grids and squares a store was placed in.
+            for other in (grid.copy(), pickle.loads(pickle.dumps(grid))):
+                self.assertEqual(other, grid)
+                other[1][2].get_color((0, 0, 0), 0, 1, 2)  # a set store's special inverts the colour last drawn
+                other[1][2].special()
+                self.assertNotEqual(other, grid)
+            store = grid.new_store()
+            grid.place(3, 3, store)
+            before = grid.state_hash()
+            store.add(black)
+            self.assertNotEqual(grid.state_hash(), before)
+
     def assertGridEqual(self, grid1: Grid, grid2: Grid):
         for x in range(len(grid1.grid)):
             for y in range(len(grid1[x])):
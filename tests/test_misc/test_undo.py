@@ -3,7 +3,7 @@ from ed_utils.decorators import number
 
 from action import PaintAction, PaintStep
 from undo import UndoTracker
-from layers import green, red, blue
+from layers import black, green, lighten, red, blue, rainbow
 from grid import Grid
 
 class TestUndo(unittest.TestCase):
@@ -65,6 +65,97 @@ class TestUndo(unittest.TestCase):
         action = undo.undo(grid)
         self.assertEqual(action, None)
 
+    @number("4.2")
+    def test_special_checkpoint(self):
+        for style in (Grid.DRAW_STYLE_ADD, Grid.DRAW_STYLE_SEQUENCE):
+            grid = Grid(style, 30, 30)
+            undo = UndoTracker()
+            paint = PaintAction([PaintStep((x, x), layer) for x in range(10) for layer in (red, black, lighten)])
+            paint.redo_apply(grid)
+            undo.add_action(paint)
+            before = grid.copy()
+
+            # A sequence store's special deletes a layer, so only the checkpoint can put it back.
+            special = PaintAction([], is_special=True)
+            special.redo_apply(grid)
+            undo.add_action(special)
+            self.assertEqual(len(special.checkpoint.squares), 10)
+            after = grid.copy()
+            self.assertNotEqual(grid, before)
+            undo.undo(grid)
+            self.assertEqual(grid, before)
+            self.assertEqual(grid[3][3].stack(), before[3][3].stack())
+            undo.redo(grid)
+            self.assertEqual(grid, after)
+            undo.undo(grid)
+            undo.undo(grid)
+            control_grid = Grid(style, 30, 30)
+            paint.redo_apply(control_grid)
+            paint.undo_apply(control_grid)
+            self.assertEqual(grid, control_grid)
+
+    @number("4.3")
+    def test_special_checkpoint_set(self):
+        grid = Grid(Grid.DRAW_STYLE_SET, 10, 10)
+        for x in range(5):
+            PaintStep((x, x), rainbow if x % 2 else green).redo_apply(grid)
+        for x in range(10):
+            for y in range(10):
+                grid[x][y].get_color((0, 0, 0), 0, x, y)
+        before = grid.copy()
+
+        special = PaintAction([], is_special=True)
+        special.redo_apply(grid)
+        self.assertEqual(len(special.checkpoint.squares), 100)
+        after = grid.copy()
+        special.undo_apply(grid)
+        self.assertEqual(grid, before)
+        self.assertGridEqual(grid, before)
+        # The colour a set store's special inverts is the one last drawn: redoing puts back the one inverted then.
+        for x in range(10):
+            for y in range(10):
+                grid[x][y].get_color((0, 0, 0), 50, x, y)
+        special.redo_apply(grid)
+        self.assertEqual(grid, after)
+        self.assertGridEqual(grid, after)
+
+    @number("4.4")
+    def test_max_actions(self):
+        grid = Grid(Grid.DRAW_STYLE_SET, 5, 5)
+        undo = UndoTracker()
+        for _ in range(UndoTracker.MAX_ACTIONS):
+            undo.add_action(PaintAction([PaintStep((0, 0), red)]))
+        # Once full, new actions are dropped.
+        undo.add_action(PaintAction([PaintStep((1, 1), blue)]))
+        self.assertEqual(len(undo.tree_of_actions), UndoTracker.MAX_ACTIONS)
+        self.assertEqual(len(undo.tree_of_actions.array), UndoTracker.MAX_ACTIONS)
+        self.assertEqual(undo.undo(grid).steps[0].affected_layer, red)
+
+    @number("4.5")
+    def test_special_undone_after_other_undos(self):
+        # Undoing a paint made after a special doesn't always put the grid's hash back (a sequence store keeps
+        # the layer as not applying), but the special is still undone exactly, from its checkpoint.
+        for style in Grid.DRAW_STYLE_OPTIONS:
+            grid = Grid(style, 10, 10)
+            undo = UndoTracker()
+            for action in (PaintAction([PaintStep((0, 0), layer) for layer in (red, black, lighten)]),
+                           PaintAction([], is_special=True),
+                           PaintAction([PaintStep((9, 9), blue)])):
+                if action.is_special:
+                    for x in range(10):  # a set store's special inverts the colour last drawn
+                        for y in range(10):
+                            grid[x][y].get_color((0, 0, 0), 0, x, y)
+                    before = grid.copy()
+                action.redo_apply(grid)
+                undo.add_action(action)
+            undo.undo(grid)
+            undo.undo(grid)
+            self.assertEqual(grid[0][0].stack(), before[0][0].stack())
+            self.assertGridEqual(grid, before)
+            undo.redo(grid)
+            undo.undo(grid)
+            self.assertGridEqual(grid, before)
+
     def assertGridEqual(self, grid1: Grid, grid2: Grid):
         for x in range(len(grid1.grid)):
             for y in range(len(grid1[x])):
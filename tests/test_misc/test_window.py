@@ -11,9 +11,14 @@ class FakeWindow:
 
 FakeWindow.on_init = MyWindow.on_init
 FakeWindow.on_reset = MyWindow.on_reset
+FakeWindow.JOURNAL_PATH = MyWindow.JOURNAL_PATH
+FakeWindow.AUTOSAVE_PATH = MyWindow.AUTOSAVE_PATH
 FakeWindow.on_paint = MyWindow.on_paint
 FakeWindow.on_increase_brush_size = MyWindow.on_increase_brush_size
 FakeWindow.on_decrease_brush_size = MyWindow.on_decrease_brush_size
+FakeWindow.on_stroke_start = MyWindow.on_stroke_start
+FakeWindow.on_stroke_end = MyWindow.on_stroke_end
+FakeWindow.on_undo = MyWindow.on_undo
 
 class TestGrid(unittest.TestCase):
 
@@ -83,6 +88,42 @@ class TestGrid(unittest.TestCase):
 
         self.assertGridEqual(grid, control_grid)
 
+    @number("6.3")
+    def test_stroke(self):
+        grid = Grid(Grid.DRAW_STYLE_ADD, 7, 7)
+        control_grid = Grid(Grid.DRAW_STYLE_ADD, 7, 7)
+
+        fw = FakeWindow(grid)
+        fw.on_init()
+        fw.on_reset()
+        fw.on_decrease_brush_size()
+        # Brush size of 1, overlapping stamps.
+        fw.on_stroke_start()
+        fw.on_paint(red, 2, 2)
+        fw.on_paint(red, 2, 3)
+        fw.on_paint(red, 3, 3)
+        fw.on_stroke_end()
+
+        expected_change = {
+            (2, 2), (1, 2), (3, 2), (2, 1), (2, 3),
+            (2, 4), (1, 3), (3, 3),
+            (4, 3), (3, 4),
+        }
+        # Each square is painted exactly once, so additive stores only hold a single red.
+        for x, y in expected_change:
+            control_grid[x][y].add(red)
+        self.assertGridEqual(grid, control_grid)
+
+        # The whole stroke is a single action.
+        self.assertEqual(len(fw.undo_tracker.tree_of_actions), 1)
+        action = fw.undo_tracker.tree_of_actions.peek()
+        self.assertEqual({step.affected_grid_square for step in action.steps}, expected_change)
+        self.assertEqual(len(action.steps), len(expected_change))
+
+        # And undoing it removes everything at once.
+        fw.on_undo()
+        self.assertGridEqual(grid, Grid(Grid.DRAW_STYLE_ADD, 7, 7))
+
     def assertGridEqual(self, grid1: Grid, grid2: Grid):
         for x in range(len(grid1.grid)):
             for y in range(len(grid1[x])):
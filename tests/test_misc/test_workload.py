@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from ed_utils.decorators import number
+
+from animation import FrameDiffer
+from grid import Grid
+from headless import HeadlessWindow
+from replay import ReplayTracker
+from workload import (MODE, PAINT, SPECIAL, STROKE_END, STROKE_START, UNDO, WorkloadProfile, drive,
+                      generate_workload, record_journal)
+
+class TestWorkload(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".paj")
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    @number("15.1")
+    def test_generate(self):
+        events = generate_workload(3, 200, 16, 12)
+        self.assertEqual(events, generate_workload(3, 200, 16, 12))
+        self.assertNotEqual(events, generate_workload(4, 200, 16, 12))
+        kinds = {event.kind for event in events}
+        self.assertTrue({PAINT, STROKE_START, STROKE_END, UNDO, SPECIAL} <= kinds)
+        self.assertTrue(all(0 <= e.x < 16 and 0 <= e.y < 12 for e in events if e.kind == PAINT))
+        self.assertEqual(sum(e.kind == STROKE_START for e in events), sum(e.kind == STROKE_END for e in events))
+
+        stamps = generate_workload(3, 50, profile=WorkloadProfile(stamps=True, undo=0, special=0, mode=0))
+        self.assertFalse({STROKE_START, STROKE_END, UNDO, SPECIAL, MODE} & {event.kind for event in stamps})
+
+        # Driving the same events gives the same canvas, every time.
+        first, second = HeadlessWindow(Grid.DRAW_STYLE_SET, 16, 12), HeadlessWindow(Grid.DRAW_STYLE_SET, 16, 12)
+        drive(first, events)
+        drive(second, events)
+        self.assertEqual(first.grid, second.grid)
+        self.assertEqual(first.draw_style, second.draw_style)
+        self.assertGreater(len(first.replay_tracker), 0)
+
+    @number("15.2")
+    def test_journal(self):
+        profile = WorkloadProfile(special=10, mode=0)
+        for style in Grid.DRAW_STYLE_OPTIONS:
+            events = generate_workload(5, 40, 16, 16, profile)
+            window = record_journal(events, self.path, style, 16, 16)
+
+            # Played back a frame at a time, as the window does, the journal paints the same canvas.
+            tracker = ReplayTracker.from_journal(self.path)
+            self.assertEqual(len(tracker), len(window.replay_tracker))
+            grid = tracker.reader.new_grid()
+            canvas = FrameDiffer(grid)
+            tracker.start_replay()
+            finished = False
+            while not finished:
+                grid.changes.publish()
+                canvas.update(grid, 0)
+                finished = tracker.play_next_action(grid)
+            tracker.close()
+            self.assertEqual(grid, window.grid, style)
+
+        # A switch of draw style starts the journal over.
+        window = record_journal(generate_workload(5, 40, 16, 16, WorkloadProfile(mode=20)), self.path, width=16, height=16)
+        tracker = ReplayTracker.from_journal(self.path)
+        self.assertEqual(tracker.reader.draw_style, window.draw_style)
+        self.assertEqual(len(tracker), len(window.replay_tracker))
+        tracker.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
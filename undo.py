@@ -7,6 +7,8 @@ from data_structures.stack_adt import *
 
 class UndoTracker:
 
+    MAX_ACTIONS = 10000
+
     def __init__(self) -> None:
         """
         Args:
@@ -18,11 +20,14 @@ class UndoTracker:
         What it does:
             self.tree_of_actions: Stack that acts as the tree of actions.
             self.redo_branch: Stack that holds the undone actions, to redo if needed.
+            Both start small and double as actions are pushed, up to MAX_ACTIONS actions, so a short session
+            doesn't take room for the most a long one can keep.
+            The redo branch empties as actions are redone, so it also halves once it is a quarter full.
         Complexity:
             Best case complexity == Worst case complexity == O(1)
         """
-        self.tree_of_actions = ArrayStack(10000) #O(1)
-        self.redo_branch = ArrayStack(10000) #O(1)       
+        self.tree_of_actions = GrowableArrayStack(max_capacity=self.MAX_ACTIONS) #O(1)
+        self.redo_branch = GrowableArrayStack(shrink=True, max_capacity=self.MAX_ACTIONS) #O(1)
         
     def add_action(self, action: PaintAction) -> None:
         """
@@ -37,13 +42,16 @@ class UndoTracker:
             If your collection is already full,
             feel free to exit early and not add the action.
         Complexity:
-            Best case complexity == Worst case complexity == O(1)
-            Pushing an item onto a stack is O(1), as if it's full we exit out of the
-            program instead of resizing. 
+            Best case complexity == Worst case complexity == O(1) amortised
+            Pushing an item onto the stack is O(1), except when its array is full and doubles, which is
+            O(n) but happens only once every n pushes. Once it holds MAX_ACTIONS actions, we exit early.
         """
         if not isinstance(action, PaintAction): #O(1)
             raise TypeError("action added must be of PaintAction type")
         
+        if self.tree_of_actions.is_full(): #O(1)
+            return
+
         self.tree_of_actions.push(action) #O(1)
 
 
@@ -0,0 +1,182 @@
+"""
+Seeded synthetic painting sessions, for load testing.
+
+generate_workload turns a seed into a list of WorkloadEvents that look like
+someone painting. Most of the events are strokes: a drag that wanders
+across the canvas with some momentum, painting one layer, usually the same
+one as the stroke before. Between strokes come brush size and shape
+changes, bursts of undos (sometimes followed by some redos), specials, and
+the odd switch of draw style, which starts the canvas over as the window's
+mode button does. The same seed and profile always give the same events.
+
+drive plays the events through a window's methods (on_stroke_start,
+on_paint, on_undo, on_special, ...), so a HeadlessWindow (or a MyWindow)
+takes them as if they came from the mouse, with no time spent waiting
+between them. record_journal drives a HeadlessWindow that records to a
+journal, which replays the session (from its last switch of draw style,
+as a journal only holds one).
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+import math
+import random
+
+from brush import BRUSH_SHAPES
+from grid import Grid
+from headless import HeadlessWindow
+from main import MyWindow
+from layer_util import Layer, get_layers
+
+PAINT = "paint"
+STROKE_START = "stroke_start"
+STROKE_END = "stroke_end"
+UNDO = "undo"
+REDO = "redo"
+SPECIAL = "special"
+BRUSH_UP = "brush_up"
+BRUSH_DOWN = "brush_down"
+BRUSH_SHAPE = "brush_shape"
+MODE = "mode"
+
+# The window method each kind of event calls.
+HANDLERS = {
+    PAINT: "on_paint",
+    STROKE_START: "on_stroke_start",
+    STROKE_END: "on_stroke_end",
+    UNDO: "on_undo",
+    REDO: "on_redo",
+    SPECIAL: "on_special",
+    BRUSH_UP: "on_increase_brush_size",
+    BRUSH_DOWN: "on_decrease_brush_size",
+    BRUSH_SHAPE: "on_change_brush_shape",
+    MODE: "change_draw_mode",
+}
+
+
+@dataclass(frozen=True)
+class WorkloadEvent:
+    """One call to a window: kind is one of the constants above; only paints have a layer and a square."""
+
+    kind: str
+    layer: Layer|None = None
+    x: int = 0
+    y: int = 0
+
+
+@dataclass
+class WorkloadProfile:
+    """How often each kind of gesture comes up (as relative weights), and how big gestures are."""
+
+    stroke: float = 70
+    brush_size: float = 8
+    brush_shape: float = 2
+    undo: float = 10
+    special: float = 3
+    mode: float = 0.5
+    # Squares a stroke moves through, at least and at most.
+    stroke_length: tuple[int, int] = (3, 40)
+    # How much a stroke's direction wanders from one square to the next (radians, standard deviation).
+    stroke_wander: float = 0.35
+    # Chance a stroke starts where the last one ended, rather than anywhere.
+    continue_stroke: float = 0.5
+    # Chance a stroke uses the same layer as the one before.
+    same_layer: float = 0.7
+    # Undos in a burst, at least and at most; and the chance some of them are then redone.
+    undo_burst: tuple[int, int] = (1, 6)
+    redo_after_undo: float = 0.4
+    # Paint each square of a stroke as its own action (as with MyWindow.STROKE_MODE off), rather than as one.
+    stamps: bool = False
+
+
+def generate_workload(seed: int, gestures: int, width: int = MyWindow.GRID_SIZE_X,
+                      height: int = MyWindow.GRID_SIZE_Y, profile: WorkloadProfile|None = None) -> list[WorkloadEvent]:
+    """
+    A session of the given number of gestures (strokes, undo bursts, specials, ...) on a width x height canvas.
+
+    :complexity: O(g * l), where g is the number of gestures and l the longest stroke.
+    """
+    profile = profile or WorkloadProfile()
+    rng = random.Random(seed)
+    layers = [layer for layer in get_layers() if layer is not None]
+    kinds = ["stroke", "brush_size", "brush_shape", "undo", "special", "mode"]
+    weights = [getattr(profile, kind) for kind in kinds]
+    events: list[WorkloadEvent] = []
+    x, y = rng.randrange(width), rng.randrange(height)
+    layer = rng.choice(layers)
+    for _ in range(gestures):
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "stroke":
+            if rng.random() >= profile.continue_stroke:
+                x, y = rng.randrange(width), rng.randrange(height)
+            if rng.random() >= profile.same_layer:
+                layer = rng.choice(layers)
+            x, y = _stroke(events, rng, profile, layer, x, y, width, height)
+        elif kind == "brush_size":
+            events.append(WorkloadEvent(rng.choice((BRUSH_UP, BRUSH_DOWN))))
+        elif kind == "brush_shape":
+            events.extend(WorkloadEvent(BRUSH_SHAPE) for _ in range(rng.randrange(1, len(BRUSH_SHAPES))))
+        elif kind == "undo":
+            undos = rng.randint(*profile.undo_burst)
+            events.extend(WorkloadEvent(UNDO) for _ in range(undos))
+            if rng.random() < profile.redo_after_undo:
+                events.extend(WorkloadEvent(REDO) for _ in range(rng.randint(1, undos)))
+        elif kind == "special":
+            events.append(WorkloadEvent(SPECIAL))
+        else:
+            events.append(WorkloadEvent(MODE))
+    return events
+
+
+def _stroke(events: list[WorkloadEvent], rng: random.Random, profile: WorkloadProfile, layer: Layer,
+            x: int, y: int, width: int, height: int) -> tuple[int, int]:
+    """Add a stroke from (x, y) to events; returns where it ended."""
+    if not profile.stamps:
+        events.append(WorkloadEvent(STROKE_START))
+    angle = rng.uniform(0, 2 * math.pi)
+    fx, fy = float(x), float(y)
+    events.append(WorkloadEvent(PAINT, layer, x, y))
+    for _ in range(rng.randint(*profile.stroke_length) - 1):
+        angle += rng.gauss(0, profile.stroke_wander)
+        fx += math.cos(angle)
+        fy += math.sin(angle)
+        # Bounce off the edges of the canvas.
+        if not 0 <= fx <= width - 1:
+            fx = min(max(fx, 0), width - 1)
+            angle = math.pi - angle
+        if not 0 <= fy <= height - 1:
+            fy = min(max(fy, 0), height - 1)
+            angle = -angle
+        nx, ny = round(fx), round(fy)
+        if (nx, ny) != (x, y):
+            x, y = nx, ny
+            events.append(WorkloadEvent(PAINT, layer, x, y))
+    if not profile.stamps:
+        events.append(WorkloadEvent(STROKE_END))
+    return x, y
+
+
+def drive(window, events: list[WorkloadEvent]) -> None:
+    """
+    Play events through window's methods (see HANDLERS), one after the other, without waiting.
+
+    :complexity: that of the methods called.
+    """
+    for event in events:
+        handler = getattr(window, HANDLERS[event.kind])
+        if event.kind == PAINT:
+            handler(event.layer, event.x, event.y)
+        else:
+            handler()
+
+
+def record_journal(events: list[WorkloadEvent], path: str, draw_style: str = Grid.DRAW_STYLE_SET,
+                   width: int = MyWindow.GRID_SIZE_X, height: int = MyWindow.GRID_SIZE_Y) -> HeadlessWindow:
+    """
+    Drive a headless window through events, recording to a (new) journal at path, and close it.
+    Returns the window, whose grid is what the journal replays to.
+    """
+    window = HeadlessWindow(draw_style, width, height, journal_path=path)
+    drive(window, events)
+    window.close()
+    return window
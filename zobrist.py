@@ -0,0 +1,64 @@
+"""
+Keys for incremental (Zobrist-style) hashes of layer stores and grids.
+
+Every part of a store's state (a layer in some role, a frozen colour) has a
+fixed pseudo-random 64 bit key, and the hash of a set of parts is the XOR of
+their keys, so adding or removing one part is a single XOR. Keys are derived
+with the splitmix64 finaliser rather than Python's hash(), so they are the
+same in every process (and can be used as cache keys across runs).
+
+Ordered contents (the additive store's queue) use a polynomial hash modulo a
+Mersenne prime instead, which can also be updated in O(1) at either end.
+"""
+
+from __future__ import annotations
+
+MASK = (1 << 64) - 1
+
+# Roles a layer can have in a store, each with its own keys.
+ROLE_SET = 1
+ROLE_LIST = 2
+ROLE_APPLYING = 3
+ROLE_NOT_APPLYING = 4
+ROLE_SPECIAL = 5
+
+POLY_PRIME = (1 << 61) - 1
+POLY_BASE = 0x1F3D5B79A2C4E687 % POLY_PRIME
+POLY_BASE_INV = pow(POLY_BASE, -1, POLY_PRIME)
+
+
+def mix(value: int) -> int:
+    """The splitmix64 finaliser: scrambles a 64 bit integer into a well spread 64 bit integer."""
+    value = (value + 0x9E3779B97F4A7C15) & MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK
+    return value ^ (value >> 31)
+
+
+# LAYER_KEYS[role][index]: the key of the layer with that index, in that role.
+LAYER_KEYS = [[mix(role << 32 | index) for index in range(64)] for role in range(ROLE_SPECIAL + 1)]
+
+
+def layer_key(role: int, layer) -> int:
+    """The key of a layer (or None, which has key 0) in a role."""
+    if layer is None:
+        return 0
+    return LAYER_KEYS[role][layer.index]
+
+
+def color_key(color) -> int:
+    """The key of an (r, g, b) colour, or 0 for None."""
+    if color is None:
+        return 0
+    r, g, b = color
+    return mix(ROLE_SPECIAL << 48 | (int(r) & 0xFFFF) << 32 | (int(g) & 0xFFFF) << 16 | (int(b) & 0xFFFF))
+
+
+def square_hash(state_hash: int, x: int, y: int) -> int:
+    """
+    The contribution of a store with state_hash at square (x, y) to the hash of a grid.
+    Mixed with the position, so the same store at two squares doesn't cancel out; an empty store contributes 0.
+    """
+    if state_hash == 0:
+        return 0
+    return mix(state_hash ^ mix(x << 32 | y))